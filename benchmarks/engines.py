@@ -0,0 +1,121 @@
+"""
+Engines.py
+
+Benchmark of the engines of Steganography against the pixel-by-pixel
+"loop" reference: encode and decode time of each available backend, its
+speedup over the reference, and a check that its output is identical.
+The fastest engine is the value to set in STEGANOGRAPHY_ENGINE on the
+host, which "auto" already selects unless told otherwise.
+
+Usage:
+    python benchmarks/engines.py
+    python benchmarks/engines.py -cover_size 1024 -secret_size 256 -output engines.json
+
+"""
+import argparse
+import json
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'src'))
+import backends  # noqa: E402
+from steganography import Steganography  # noqa: E402
+from run import DEFAULT_REPEAT, get_image, measure  # noqa: E402
+
+# The reference takes seconds per call beyond these sizes
+DEFAULT_COVER_SIZE = 256
+DEFAULT_SECRET_SIZE = 64
+
+
+def run(cover_size: int, secret_size: int, bits_per_sample: int = 1,
+        repeat: int = DEFAULT_REPEAT) -> dict:
+    """
+    Times encode and decode with each engine, printing the median times
+    and the speedups over the loop engine.
+
+    Parameters:
+    - cover_size: Width and height of the cover image.
+    - secret_size: Width and height of the secret image.
+    - bits_per_sample: Bits per sample of the Steganography instances.
+    - repeat: Number of runs of each measure.
+
+    Returns:
+    - The encode and decode timings (as from run.measure) and speedups,
+      by engine.
+
+    Raises:
+    - ValueError: If an engine does not match the reference.
+    """
+    cover_image = get_image(cover_size, seed=cover_size)
+    secret_image = get_image(secret_size, seed=secret_size + 1)
+    reference = Steganography(engine=backends.REFERENCE_ENGINE,
+                              bits_per_sample=bits_per_sample)
+    encoded_image = reference.encode(cover_image, secret_image)
+
+    results = {}
+    print(f"{'engine':<10} {'encode ms':>12} {'speedup':>9} "
+          f"{'decode ms':>12} {'speedup':>9}")
+    for engine in (backends.REFERENCE_ENGINE, *backends.get_backends()):
+        model = Steganography(engine=engine,
+                              bits_per_sample=bits_per_sample)
+        if not ((model.encode(cover_image, secret_image) ==
+                 encoded_image).all() and
+                (model.decode(encoded_image) == secret_image).all()):
+            raise ValueError(f"The engine {engine} does not match the "
+                             "reference.")
+        results[engine] = {
+            "encode": measure(lambda: model.encode(cover_image,
+                                                   secret_image), repeat),
+            "decode": measure(lambda: model.decode(encoded_image), repeat)}
+        for operation in ("encode", "decode"):
+            results[engine][operation]["speedup"] = (
+                results[backends.REFERENCE_ENGINE][operation]["median"] /
+                results[engine][operation]["median"])
+        print(f"{engine:<10} "
+              f"{results[engine]['encode']['median'] * 1e3:12.2f} "
+              f"{results[engine]['encode']['speedup']:8.1f}x "
+              f"{results[engine]['decode']['median'] * 1e3:12.2f} "
+              f"{results[engine]['decode']['speedup']:8.1f}x")
+    return results
+
+
+def main(args) -> int:
+    """
+    Benchmarks the engines and prints the fastest one.
+
+    Returns:
+    - The exit code.
+    """
+    results = run(args.cover_size, args.secret_size, args.bits_per_sample,
+                  args.repeat)
+    fastest = min(results, key=lambda engine: results[engine]["encode"]
+                  ["median"] + results[engine]["decode"]["median"])
+    print(f"Fastest engine: {fastest} "
+          f"({backends.ENGINE_VARIABLE}={fastest}); "
+          f"auto selects {backends.resolve_engine()}")
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"cover_size": args.cover_size,
+                       "secret_size": args.secret_size,
+                       "bits_per_sample": args.bits_per_sample,
+                       "fastest": fastest,
+                       "engines": results}, file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks the engines "
+                                                 "against the reference.")
+    parser.add_argument("-cover_size", type=int, default=DEFAULT_COVER_SIZE,
+                        help="Width and height of the cover image.")
+    parser.add_argument("-secret_size", type=int,
+                        default=DEFAULT_SECRET_SIZE,
+                        help="Width and height of the secret image.")
+    parser.add_argument("-bits_per_sample", type=int, default=1,
+                        choices=[1, 2, 3, 4],
+                        help="Bits per sample of the encoded image.")
+    parser.add_argument("-output", type=str,
+                        help="JSON file where the results are saved.")
+    parser.add_argument("-repeat", type=int, default=DEFAULT_REPEAT,
+                        help="Number of runs of each measure.")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,120 @@
+"""
+Image_formats.py
+
+Benchmark of the lossless output settings of image_io: write time, read
+time and file size of an encoded image for each PNG compression level
+and strategy, lossless WebP and TIFF compressions, so the speed/size
+trade-off of the stego outputs can be chosen.
+
+Usage:
+    python benchmarks/image_formats.py
+    python benchmarks/image_formats.py -cover_image data/Monalisa.png -output formats.json
+
+"""
+import argparse
+import json
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'src'))
+import image_io  # noqa: E402
+from steganography import Steganography  # noqa: E402
+from run import DEFAULT_REPEAT, measure  # noqa: E402
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+DEFAULT_COVER_IMAGE = os.path.join(ROOT, "data", "Monalisa.png")
+DEFAULT_SECRET_IMAGE = os.path.join(ROOT, "data", "secret-image.jpg")
+PNG_LEVELS = (0, 1, 3, 6, 9)
+PNG_STRATEGIES = ("filtered", "huffman_only", "rle")
+
+
+def get_settings():
+    """
+    Lists the output settings to be compared.
+
+    Yields:
+    - Tuples (name, extension, options of image_io.image_to_bytes).
+    """
+    for level in PNG_LEVELS:
+        yield f"png[level={level}]", ".png", {"png_compression": level}
+    for strategy in PNG_STRATEGIES:
+        yield (f"png[level=1,strategy={strategy}]", ".png",
+               {"png_compression": 1, "png_strategy": strategy})
+    yield "webp[lossless]", ".webp", {}
+    for compression in image_io.TIFF_COMPRESSIONS:
+        yield (f"tiff[{compression}]", ".tiff",
+               {"tiff_compression": compression})
+    yield "bmp", ".bmp", {}
+
+
+def run(image, repeat: int = DEFAULT_REPEAT) -> dict:
+    """
+    Writes and reads the image in memory with each setting, printing the
+    median write time, read time and size.
+
+    Parameters:
+    - image: The encoded image, in BGR order.
+    - repeat: Number of runs of each measure.
+
+    Returns:
+    - The write and read timings (as from run.measure), the size in bytes
+      and the size relative to the raw pixels, by setting name.
+    """
+    results = {}
+    print(f"{'setting':<36} {'write ms':>10} {'read ms':>10} "
+          f"{'size KiB':>10} {'ratio':>7}")
+    for name, extension, options in get_settings():
+        data = image_io.image_to_bytes(image, extension, **options)
+        # Check the setting keeps every bit of the payload
+        if not (image_io.read_image(data) == image).all():
+            raise ValueError(f"The setting {name} is lossy.")
+        results[name] = {
+            "write": measure(lambda: image_io.image_to_bytes(
+                image, extension, **options), repeat),
+            "read": measure(lambda: image_io.read_image(data), repeat),
+            "bytes": len(data),
+            "ratio": len(data) / image.nbytes}
+        print(f"{name:<36} {results[name]['write']['median'] * 1e3:10.2f} "
+              f"{results[name]['read']['median'] * 1e3:10.2f} "
+              f"{len(data) / 1024:10.1f} {results[name]['ratio']:7.3f}")
+    return results
+
+
+def main(args) -> int:
+    """
+    Encodes the secret image into the cover image and benchmarks the
+    output settings on the result.
+
+    Returns:
+    - The exit code.
+    """
+    model = Steganography(bits_per_sample=args.bits_per_sample)
+    encoded_image = model.encode(image_io.read_image(args.cover_image),
+                                 image_io.read_image(args.secret_image),
+                                 inplace=True)
+    print(f"Encoded image of shape {encoded_image.shape}")
+    results = run(encoded_image, args.repeat)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"shape": encoded_image.shape, "settings": results},
+                      file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks the lossless "
+                                                 "output settings.")
+    parser.add_argument("-cover_image", type=str,
+                        default=DEFAULT_COVER_IMAGE,
+                        help="Cover image of the encoded image.")
+    parser.add_argument("-secret_image", type=str,
+                        default=DEFAULT_SECRET_IMAGE,
+                        help="Secret image of the encoded image.")
+    parser.add_argument("-bits_per_sample", type=int, default=1,
+                        choices=[1, 2, 3, 4],
+                        help="Bits per sample of the encoded image.")
+    parser.add_argument("-output", type=str,
+                        help="JSON file where the results are saved.")
+    parser.add_argument("-repeat", type=int, default=DEFAULT_REPEAT,
+                        help="Number of runs of each measure.")
+    sys.exit(main(parser.parse_args()))
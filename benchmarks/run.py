@@ -0,0 +1,224 @@
+"""
+Run.py
+
+Benchmark suite for the hot paths of the Steganography class: encode,
+decode, embed_header, resize_embedded_image and compute_psnr, over a
+matrix of cover resolutions, secret resolutions and bits per sample.
+Results are stored as JSON and compared against a saved baseline, so that
+performance regressions are caught.
+
+Usage:
+    python benchmarks/run.py -output results.json
+    python benchmarks/run.py -output results.json -baseline baseline.json
+
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import timeit
+import cv2
+import numpy as np
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'src'))
+import backends  # noqa: E402
+from steganography import Steganography  # noqa: E402
+from psnr import compute_psnr  # noqa: E402
+
+COVER_SIZES = (512, 1024, 2048)
+SECRET_SIZES = (128, 256, 512)
+BITS_PER_SAMPLE = (1, 2, 4)
+QUICK_COVER_SIZES = (256,)
+QUICK_SECRET_SIZES = (64,)
+QUICK_BITS_PER_SAMPLE = (1, 4)
+DEFAULT_REPEAT = 5
+DEFAULT_TOLERANCE = 0.25
+
+
+def get_image(size: int, seed: int) -> np.ndarray:
+    """
+    Creates a reproducible random square image.
+
+    Parameters:
+    - size: Width and height of the image.
+    - seed: Seed of the random generator.
+
+    Returns:
+    - A uint8 image of shape (size, size, 3).
+    """
+    generator = np.random.default_rng(seed)
+    return generator.integers(0, 256, (size, size, 3), dtype=np.uint8)
+
+
+def get_benchmarks(cover_sizes: tuple, secret_sizes: tuple,
+                   bits_per_sample: tuple):
+    """
+    Lists the benchmarks of the matrix.
+
+    Parameters:
+    - cover_sizes: Widths (and heights) of the cover images.
+    - secret_sizes: Widths (and heights) of the secret images.
+    - bits_per_sample: Bits per sample of the Steganography instances.
+
+    Yields:
+    - Tuples (name, function), where function takes no argument.
+    """
+    for cover_size in cover_sizes:
+        cover_image = get_image(cover_size, seed=cover_size)
+        noisy_image = cover_image ^ get_image(cover_size, seed=0) & 1
+        yield (f"compute_psnr[cover={cover_size}]",
+               lambda a=cover_image, b=noisy_image: compute_psnr(a, b))
+
+        for secret_size in secret_sizes:
+            secret_image = get_image(secret_size, seed=secret_size + 1)
+            header_image = cover_image.copy()
+            for bits in bits_per_sample:
+                model = Steganography(bits_per_sample=bits)
+                encoded_image = model.encode(cover_image, secret_image)
+                suffix = f"[cover={cover_size},secret={secret_size},k={bits}]"
+                yield ("encode" + suffix,
+                       lambda m=model, a=cover_image, b=secret_image:
+                       m.encode(a, b))
+                yield ("decode" + suffix,
+                       lambda m=model, a=encoded_image: m.decode(a))
+                yield ("embed_header" + suffix,
+                       lambda m=model, a=header_image, b=secret_image:
+                       m.embed_header(a, b, inplace=True))
+                yield ("resize_embedded_image" + suffix,
+                       lambda m=model, a=cover_image, b=secret_image:
+                       m.resize_embedded_image(a, b))
+
+
+def measure(function, repeat: int = DEFAULT_REPEAT) -> dict:
+    """
+    Times a function, calling it enough times per run to last at least
+    0.2 seconds.
+
+    Parameters:
+    - function: The function to be timed, without arguments.
+    - repeat: Number of runs.
+
+    Returns:
+    - The number of calls per run and the min, median and mean time of a
+      call in seconds.
+    """
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    times = [elapsed / number for elapsed in timer.repeat(repeat, number)]
+    return {"number": number,
+            "repeat": repeat,
+            "min": min(times),
+            "median": statistics.median(times),
+            "mean": statistics.mean(times)}
+
+
+def run(benchmarks, repeat: int = DEFAULT_REPEAT,
+        pattern: str = None) -> dict:
+    """
+    Runs the benchmarks, printing the median time of each one.
+
+    Parameters:
+    - benchmarks: Tuples (name, function), from get_benchmarks.
+    - repeat: Number of runs of each benchmark.
+    - pattern: Only the benchmarks whose name contains it are run.
+
+    Returns:
+    - The results, with the environment under "machine" and the timings
+      by name under "benchmarks".
+    """
+    results = {}
+    for name, function in benchmarks:
+        if pattern and pattern not in name:
+            continue
+        results[name] = measure(function, repeat)
+        print(f"{name:<60} {results[name]['median'] * 1e3:10.3f} ms")
+    return {"machine": {"python": platform.python_version(),
+                        "numpy": np.__version__,
+                        "opencv": cv2.__version__,
+                        "engine": backends.resolve_engine(),
+                        "platform": platform.platform(),
+                        "processor": platform.processor(),
+                        "date": time.strftime("%Y-%m-%dT%H:%M:%S")},
+            "benchmarks": results}
+
+
+def compare(results: dict, baseline: dict,
+            tolerance: float = DEFAULT_TOLERANCE) -> list:
+    """
+    Compares the median times of the results against a baseline.
+
+    Parameters:
+    - results: The results, from run.
+    - baseline: Results saved by a previous run.
+    - tolerance: Largest accepted slowdown, as a fraction of the baseline.
+
+    Returns:
+    - The names of the benchmarks slower than the baseline by more than
+      the tolerance.
+    """
+    regressions = []
+    for name, result in results["benchmarks"].items():
+        reference = baseline["benchmarks"].get(name)
+        if reference is None:
+            continue
+        ratio = result["median"] / reference["median"]
+        status = "ok"
+        if ratio > 1 + tolerance:
+            status = "REGRESSION"
+            regressions.append(name)
+        elif ratio < 1 - tolerance:
+            status = "faster"
+        print(f"{name:<60} {ratio:6.2f}x {status}")
+    return regressions
+
+
+def main(args) -> int:
+    """
+    Runs the benchmark suite from the command-line arguments.
+
+    Returns:
+    - The exit code, 1 when a regression was found.
+    """
+    if args.quick:
+        matrix = (QUICK_COVER_SIZES, QUICK_SECRET_SIZES,
+                  QUICK_BITS_PER_SAMPLE)
+    else:
+        matrix = (COVER_SIZES, SECRET_SIZES, BITS_PER_SAMPLE)
+    results = run(get_benchmarks(*matrix), args.repeat, args.filter)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} benchmarks regressed.")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks the "
+                                                 "Steganography hot paths.")
+    parser.add_argument("-output", type=str,
+                        help="JSON file where the results are saved.")
+    parser.add_argument("-baseline", type=str,
+                        help="JSON results of a previous run to compare "
+                             "against.")
+    parser.add_argument("-tolerance", type=float,
+                        default=DEFAULT_TOLERANCE,
+                        help="Largest accepted slowdown against the "
+                             "baseline, as a fraction.")
+    parser.add_argument("-repeat", type=int, default=DEFAULT_REPEAT,
+                        help="Number of runs of each benchmark.")
+    parser.add_argument("-filter", type=str,
+                        help="Only run the benchmarks whose name contains "
+                             "this text, e.g. 'decode'.")
+    parser.add_argument("-quick", action="store_true",
+                        help="Run a small matrix, as a smoke test.")
+    sys.exit(main(parser.parse_args()))
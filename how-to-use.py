@@ -1,17 +1,95 @@
-import cv2
+import os
+import sys
+import json
+import glob
+import shutil
 import argparse
-from src.steganography import Steganography
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'src'))
+from steganography import Steganography
+import image_io
+import batch
+import video
+import service
+import cover_index
+import scan
+import instrumentation
+from instrumentation import stage
 
 # Create an ArgumentParser object
 parser = argparse.ArgumentParser(description='Steganography - Hide and ' \
                                  'Extract Secret Messages in Images.')
 
-# Add subparsers for encode and decode modes
+# Add subparsers for encode, decode and batch modes
 subparsers = parser.add_subparsers(dest='mode',
-                                   help='Choose encode or decode mode.')
+                                   help='Choose encode, decode, batch, '
+                                        'video, serve or cover mode.')
+
+# Options shared by the encode and batch modes
+options_parser = argparse.ArgumentParser(add_help=False)
+options_parser.add_argument('-resize_mode',
+                            type=str,
+                            choices=['square', 'capacity'],
+                            help='How the cover image grows when it is too '
+                                 'small to hold the secret image.',
+                            default='square')
+options_parser.add_argument('-bits_per_sample',
+                            type=int,
+                            choices=[1, 2, 3, 4],
+                            help='Number of least significant bits of each '
+                                 'cover sample used by the secret image.',
+                            default=1)
+options_parser.add_argument('-layout',
+                            type=str,
+                            choices=['planar', 'interleaved'],
+                            help='How the secret image is spread over the '
+                                 'cover image samples.',
+                            default='planar')
+
+# Options shared by the encode and decode modes
+profile_parser = argparse.ArgumentParser(add_help=False)
+profile_parser.add_argument('-profile',
+                            type=str,
+                            choices=['dict', 'log', 'prometheus'],
+                            help='Print the time, bytes and peak memory of '
+                                 'each stage (resize, header, payload, '
+                                 'image I/O) in this format.')
+profile_parser.add_argument('-threads',
+                            type=int,
+                            help='Number of threads embedding or extracting '
+                                 'the payload of the image in parallel.',
+                            default=1)
+profile_parser.add_argument('-key',
+                            type=str,
+                            help='Password scattering the secret over the '
+                                 'whole cover; needed again to decode.')
+profile_parser.add_argument('-password',
+                            type=str,
+                            help='Password encrypting the secret while it '
+                                 'is embedded; needed again to decode.')
+
+# Options of the written images, shared by the encode and decode modes
+write_parser = argparse.ArgumentParser(add_help=False)
+write_parser.add_argument('-png_compression',
+                          type=int,
+                          choices=range(10),
+                          help='PNG zlib level, from 0 (fastest, largest '
+                               'file) to 9 (slowest, smallest file).')
+write_parser.add_argument('-png_strategy',
+                          type=str,
+                          choices=list(image_io.PNG_STRATEGIES),
+                          help='PNG zlib strategy; huffman_only and rle '
+                               'are faster but larger.')
+write_parser.add_argument('-tiff_compression',
+                          type=str,
+                          choices=list(image_io.TIFF_COMPRESSIONS),
+                          help='TIFF compression, for .tif/.tiff outputs.')
 
 # Subparser for encode mode
 encode_parser = subparsers.add_parser('encode',
+                                      parents=[options_parser,
+                                               profile_parser,
+                                               write_parser],
                                       help='Encode a message into an image')
 encode_parser.add_argument('-secret_image',
                            type=str,
@@ -23,11 +101,36 @@ encode_parser.add_argument('-cover_image',
                            default='data/Monalisa.png')
 encode_parser.add_argument('-output_image',
                            type=str,
-                           help='Output image file with secret image.',
+                           help='Output image file with secret image, in '
+                                'a lossless format (.png, .webp, .tiff, '
+                                '.bmp, .ppm or .npy).',
                            default='data/steganography-image.png')
+encode_parser.add_argument('-secret_file',
+                           type=str,
+                           help='Any file (e.g. the original JPEG) to be '
+                                'hidden as bytes, instead of the decoded '
+                                'secret image.')
+encode_parser.add_argument('-codec',
+                           type=str,
+                           choices=['none', 'zlib', 'lzma'],
+                           help='Compression of the secret file before it '
+                                'is hidden.',
+                           default='none')
+encode_parser.add_argument('-band_rows',
+                           type=int,
+                           help='Encode PPM/NPY cover images band by band, '
+                                'holding at most this many rows in memory.',
+                           default=0)
+encode_parser.add_argument('-inplace',
+                           action='store_true',
+                           help='Copy a PPM/NPY cover image to the output '
+                                'file and embed the secret image directly '
+                                'into it, without loading or resizing it.')
 
 # Subparser for decode mode
 decode_parser = subparsers.add_parser('decode',
+                                      parents=[profile_parser,
+                                               write_parser],
                                       help='Decode a hidden message ' \
                                            'from an image.')
 decode_parser.add_argument('-steganography_image',
@@ -36,33 +139,375 @@ decode_parser.add_argument('-steganography_image',
                            default='data/steganography-image.png')
 decode_parser.add_argument('-secret_image',
                            type=str,
-                           help='Secret image retrieved from input image.',
+                           help='Secret image (or file, for hidden bytes) '
+                                'retrieved from input image.',
                            default='data/retrieved-image.png')
+decode_parser.add_argument('-band_rows',
+                           type=int,
+                           help='Decode PPM/NPY images band by band, '
+                                'holding at most this many rows in memory.',
+                           default=0)
+
+# Subparser for batch mode
+batch_parser = subparsers.add_parser('batch',
+                                     parents=[options_parser],
+                                     help='Encode or decode many images in '
+                                          'parallel.')
+batch_parser.add_argument('batch_mode',
+                          choices=['encode', 'decode'],
+                          help='Choose encode or decode mode.')
+batch_parser.add_argument('-manifest',
+                          type=str,
+                          help='CSV/JSONL file listing the jobs, with the '
+                               'columns cover, secret and output (encode) '
+                               'or image and output (decode).')
+batch_parser.add_argument('-inputs',
+                          type=str,
+                          help='Glob of the cover images (encode) or of '
+                               'the steganography images (decode), used '
+                               'when no manifest is given.')
+batch_parser.add_argument('-secrets',
+                          type=str,
+                          help='Glob of the secret images (encode).')
+batch_parser.add_argument('-output_dir',
+                          type=str,
+                          help='Directory of the output images.',
+                          default='data')
+batch_parser.add_argument('-workers',
+                          type=int,
+                          help='Number of worker processes.',
+                          default=os.cpu_count())
+batch_parser.add_argument('-chunksize',
+                          type=int,
+                          help='Number of jobs sent to a worker at once.',
+                          default=1)
+batch_parser.add_argument('-results',
+                          type=str,
+                          help='CSV/JSONL file with the time and PSNR of '
+                               'each job.',
+                          default='data/batch-results.csv')
+batch_parser.add_argument('-cache_dir',
+                          type=str,
+                          help='Directory of a result cache, so jobs '
+                               'repeated across batches are not computed '
+                               'again.',
+                          default=None)
+batch_parser.add_argument('-key',
+                          type=str,
+                          help='Password scattering the secrets over the '
+                               'whole covers; needed again to decode.')
+batch_parser.add_argument('-password',
+                          type=str,
+                          help='Password encrypting the secrets while they '
+                               'are embedded; needed again to decode.')
+
+# Subparser for video mode
+video_parser = subparsers.add_parser('video',
+                                     help='Hide an image or a file across '
+                                          'the frames of a lossless video.')
+video_parser.add_argument('video_mode',
+                          choices=['encode', 'decode'],
+                          help='Choose encode or decode mode.')
+video_parser.add_argument('-input_video',
+                          type=str,
+                          help='Cover video (encode) or steganography video '
+                               '(decode), or a pattern of PNG frames such '
+                               'as frames/%%05d.png.')
+video_parser.add_argument('-output_video',
+                          type=str,
+                          help='Lossless (FFV1) .avi/.mkv video or pattern '
+                               'of PNG frames written by the encode mode.')
+video_parser.add_argument('-secret',
+                          type=str,
+                          help='Secret image (told by its extension) or '
+                               'other file to be hidden (encode) or '
+                               'retrieved (decode).')
+video_parser.add_argument('-bits_per_sample',
+                          type=int,
+                          choices=[1, 2, 3, 4],
+                          help='Number of least significant bits of each '
+                               'frame sample used by the secret.',
+                          default=1)
+
+# Subparser for serve mode
+serve_parser = subparsers.add_parser('serve',
+                                     parents=[options_parser],
+                                     help='Run an HTTP service encoding and '
+                                          'decoding uploaded PNG images.')
+serve_parser.add_argument('-host',
+                          type=str,
+                          help='Address to listen on.',
+                          default='127.0.0.1')
+serve_parser.add_argument('-port',
+                          type=int,
+                          help='Port to listen on.',
+                          default=8000)
+serve_parser.add_argument('-workers',
+                          type=int,
+                          help='Number of worker threads or processes.',
+                          default=os.cpu_count())
+serve_parser.add_argument('-max_pending',
+                          type=int,
+                          help='Requests admitted at once; further '
+                               'requests are answered with 503.',
+                          default=service.DEFAULT_MAX_PENDING)
+serve_parser.add_argument('-executor',
+                          type=str,
+                          choices=['thread', 'process'],
+                          help='Run the requests in threads or processes.',
+                          default='thread')
+
+# Subparser for cover mode
+cover_parser = subparsers.add_parser('cover',
+                                     parents=[options_parser],
+                                     help='Index a library of cover images '
+                                          'and pick the smallest one that '
+                                          'fits a secret image.')
+cover_parser.add_argument('cover_mode',
+                          choices=['build', 'select'],
+                          help='Build the index or select a cover.')
+cover_parser.add_argument('-index',
+                          type=str,
+                          help='SQLite file of the index.',
+                          default='data/covers.db')
+cover_parser.add_argument('-covers',
+                          type=str,
+                          help='Directory of the cover images (build).',
+                          default='data')
+cover_parser.add_argument('-no_texture',
+                          action='store_true',
+                          help='Skip the texture scores, reading only the '
+                               'image headers (build).')
+cover_parser.add_argument('-secret_image',
+                          type=str,
+                          help='Secret image to be hidden (select).',
+                          default='data/secret-image.jpg')
+cover_parser.add_argument('-min_texture',
+                          type=float,
+                          help='Minimum texture score of the cover '
+                               '(select).')
+
+# Subparser for scan mode
+scan_parser = subparsers.add_parser('scan',
+                                    help='List the images holding a hidden '
+                                         'payload, reading only their '
+                                         'headers.')
+scan_parser.add_argument('inputs',
+                         type=str,
+                         help='Glob of the images to be scanned.')
+scan_parser.add_argument('-workers',
+                         type=int,
+                         help='Number of threads.',
+                         default=os.cpu_count())
+scan_parser.add_argument('-all',
+                         action='store_true',
+                         help='Also list the images without payload, with '
+                              'the reason.')
+
+
+def print_profile(profiler, output_format):
+    """
+    Prints the stages recorded by the profiler in the chosen format.
+    """
+    if output_format == 'dict':
+        print(json.dumps(profiler.to_dict(), indent=2))
+    elif output_format == 'log':
+        print('\n'.join(profiler.to_log_lines()))
+    else:
+        print(profiler.to_prometheus(), end='')
+
+
+def main(args):
+    """
+    Runs the mode chosen in the command-line arguments.
+    """
+    profiler = None
+    if getattr(args, 'profile', None):
+        profiler = instrumentation.Profiler()
+    model = Steganography(profiler=profiler,
+                          workers=getattr(args, 'threads', 1),
+                          key=getattr(args, 'key', None),
+                          password=getattr(args, 'password', None))
+    write_options = {option: getattr(args, option, None)
+                     for option in ('png_compression', 'png_strategy',
+                                    'tiff_compression')}
+
+    # Access the values of the parameters
+    if args.mode == 'encode':
+        model = Steganography(resize_mode=args.resize_mode,
+                              bits_per_sample=args.bits_per_sample,
+                              layout=args.layout,
+                              profiler=profiler,
+                              workers=args.threads,
+                              key=args.key,
+                              password=args.password)
+        cover_image = args.cover_image
+        secret_image = args.secret_image
+        output_image = args.output_image
+
+        secret_img = None
+        if not args.secret_file:
+            with stage(profiler, 'imread'):
+                secret_img = image_io.read_image(secret_image)
+
+        if args.secret_file:
+            with open(args.secret_file, 'rb') as file:
+                secret_data = file.read()
+            with stage(profiler, 'imread'):
+                cover_img = image_io.read_image(cover_image)
+            encoded_img, report = model.encode_bytes(cover_img, secret_data,
+                                                     codec=args.codec,
+                                                     report=True,
+                                                     inplace=True)
+            with stage(profiler, 'imwrite', encoded_img.nbytes):
+                image_io.write_image(output_image, encoded_img,
+                                     **write_options)
+            print(f'PSNR: {report["psnr"]:.2f} dB')
+        elif args.inplace:
+            with stage(profiler, 'copy_cover'):
+                shutil.copyfile(cover_image, output_image)
+            output_img = image_io.map_image(output_image, mode='r+')
+            with stage(profiler, 'encode_inplace', secret_img.nbytes):
+                model.encode_inplace(output_img, secret_img)
+        elif args.band_rows > 0:
+            with stage(profiler, 'encode_file', secret_img.nbytes):
+                image_io.encode_file(model, cover_image, secret_img,
+                                     output_image, band_rows=args.band_rows)
+        else:
+            with stage(profiler, 'imread'):
+                cover_img = image_io.read_image(cover_image)
+
+            # The cover is not used afterwards, so no copy is made
+            encoded_img, report = model.encode(cover_img, secret_img,
+                                               report=True, inplace=True)
+
+            with stage(profiler, 'imwrite', encoded_img.nbytes):
+                image_io.write_image(output_image, encoded_img,
+                                     **write_options)
+
+            # Counted while embedding, no second pass over the images
+            print(f'PSNR: {report["psnr"]:.2f} dB, '
+                  f'{report["flipped_bits"]} bits flipped')
+            if report['resize']['resized']:
+                print(f'Cover resized from {report["resize"]["cover_shape"]} '
+                      f'to {report["resize"]["shape"]}')
+
+    elif args.mode == 'decode':
+        steganography_image = args.steganography_image
+        secret_image = args.secret_image
+
+        if args.band_rows > 0:
+            with stage(profiler, 'decode_file'):
+                retrieved_img = image_io.decode_file(
+                    model, steganography_image, band_rows=args.band_rows)
+        elif steganography_image.lower().endswith('.png'):
+            with stage(profiler, 'decode_png'):
+                retrieved_img = image_io.decode_png(model,
+                                                    steganography_image)
+        elif steganography_image.lower().endswith(image_io.STREAM_FORMATS):
+            steganography_img = image_io.map_image(steganography_image)
+
+            retrieved_img = model.decode(steganography_img)
+        else:
+            with stage(profiler, 'imread'):
+                steganography_img = image_io.read_image(
+                    steganography_image)
+
+            retrieved_img = model.decode(steganography_img)
+
+        if isinstance(retrieved_img, bytes):
+            with open(secret_image, 'wb') as file:
+                file.write(retrieved_img)
+        else:
+            with stage(profiler, 'imwrite', retrieved_img.nbytes):
+                image_io.write_image(secret_image, retrieved_img,
+                                     **write_options)
 
-# Parse the command-line arguments
-args = parser.parse_args()
+    elif args.mode == 'batch':
+        options = {'resize_mode': args.resize_mode,
+                   'bits_per_sample': args.bits_per_sample,
+                   'layout': args.layout,
+                   'key': args.key,
+                   'password': args.password}
+        if args.manifest:
+            jobs = batch.load_manifest(args.manifest)
+        else:
+            jobs = batch.glob_jobs(args.batch_mode, args.inputs,
+                                   args.output_dir, args.secrets)
+        os.makedirs(args.output_dir, exist_ok=True)
+        results = batch.run_batch(jobs, args.batch_mode, options,
+                                  workers=args.workers,
+                                  chunksize=args.chunksize,
+                                  cache_dir=args.cache_dir)
+        results = batch.write_results(results, args.results)
+        failed = sum(result['status'] != 'ok' for result in results)
+        print(f'{len(results) - failed} jobs done, {failed} failed.')
 
-model = Steganography()
+    elif args.mode == 'video':
+        model = Steganography(bits_per_sample=args.bits_per_sample)
+        if args.video_mode == 'encode':
+            if args.secret.lower().endswith(image_io.IMAGE_FORMATS):
+                secret = image_io.read_image(args.secret)
+            else:
+                # Not an image, hidden as bytes
+                with open(args.secret, 'rb') as file:
+                    secret = file.read()
+            frames = video.encode_video(model, args.input_video,
+                                        args.output_video, secret)
+            print(f'Secret hidden in {frames} frames.')
+        else:
+            secret = video.decode_video(model, args.input_video)
+            if isinstance(secret, bytes):
+                with open(args.secret, 'wb') as file:
+                    file.write(secret)
+            else:
+                image_io.write_image(args.secret, secret)
 
-# Access the values of the parameters
-if args.mode == 'encode':
-    cover_image = args.cover_image
-    secret_image = args.secret_image
-    output_image = args.output_image
+    elif args.mode == 'serve':
+        options = {'resize_mode': args.resize_mode,
+                   'bits_per_sample': args.bits_per_sample,
+                   'layout': args.layout}
+        print(f'Listening on http://{args.host}:{args.port}')
+        service.run_server(args.host, args.port, options=options,
+                           workers=args.workers,
+                           max_pending=args.max_pending,
+                           executor=args.executor)
 
-    cover_img = cv2.imread(cover_image)
-    secret_img = cv2.imread(secret_image)
+    elif args.mode == 'cover':
+        model = Steganography(bits_per_sample=args.bits_per_sample,
+                              layout=args.layout)
+        with cover_index.CoverIndex(args.index, model) as index:
+            if args.cover_mode == 'build':
+                count = index.build(args.covers,
+                                    texture=not args.no_texture)
+                for path, error in index.skipped:
+                    print(f'Skipped {path}: {error}')
+                print(f'{count} covers indexed, {len(index)} in total.')
+            else:
+                cover = index.select_cover(args.secret_image,
+                                           args.min_texture)
+                if cover is None:
+                    print('No cover fits without resizing.')
+                else:
+                    print(json.dumps(cover, indent=2))
 
-    encoded_img = model.encode(cover_img, secret_img)
-    
-    cv2.imwrite(output_image, encoded_img)
-    
-elif args.mode == 'decode':
-    steganography_image = args.steganography_image
-    secret_image = args.secret_image
+    elif args.mode == 'scan':
+        results = scan.scan(sorted(glob.glob(args.inputs, recursive=True)),
+                            workers=args.workers)
+        for result in results:
+            if result['status'] == 'payload':
+                print(f"{result['path']}: {result['kind']} "
+                      f"(version {result['version']})")
+            elif args.all:
+                print(f"{result['path']}: {result['status']} "
+                      f"({result['error']})")
+        found = sum(result['status'] == 'payload' for result in results)
+        print(f'{found} of {len(results)} images hold a payload.')
 
-    steganography_img = cv2.imread(steganography_image)
+    if profiler is not None:
+        print_profile(profiler, args.profile)
 
-    retrieved_img = model.decode(steganography_img)
 
-    cv2.imwrite(secret_image, retrieved_img)
+if __name__ == '__main__':
+    # Parse the command-line arguments
+    main(parser.parse_args())
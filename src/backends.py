@@ -0,0 +1,167 @@
+"""
+Backends.py
+
+This module provides the registry of the kernels writing and reading the
+low bits of cover samples. Steganography dispatches its vectorized paths
+to one backend: "numpy", always available, or "numba", a compiled
+backend registered when numba is importable. The pixel-by-pixel "loop"
+engine of Steganography stays the reference implementation and uses no
+backend.
+
+The engine "auto" selects the STEGANOGRAPHY_ENGINE environment variable
+when it is set, and otherwise the available backend with the highest
+priority.
+
+"""
+import os
+import numpy as np
+
+ENGINE_VARIABLE = "STEGANOGRAPHY_ENGINE"
+REFERENCE_ENGINE = "loop"
+
+# Registered backends by name
+_backends = {}
+
+
+class Backend:
+    """
+    A pair of kernels over 1-D views of cover samples, possibly strided.
+    """
+    def __init__(self, name: str, embed_values, extract_values,
+                 priority: int = 0):
+        """
+        Describes a backend.
+
+        Parameters:
+        - name: Name of the backend, used as a Steganography engine.
+        - embed_values: Function (window, values, bits_per_sample) writing
+          values (uint8, below 2 ** bits_per_sample) into the low bits of
+          the samples of window, in place.
+        - extract_values: Function (window, bits_per_sample) returning the
+          low bits of the samples of window as uint8.
+        - priority: Rank of the backend in the automatic selection.
+        """
+        self.name = name
+        self.embed_values = embed_values
+        self.extract_values = extract_values
+        self.priority = priority
+
+    def __repr__(self) -> str:
+        return f"Backend({self.name!r}, priority={self.priority})"
+
+
+def register_backend(backend: Backend) -> None:
+    """
+    Adds a backend to the registry, replacing one of the same name.
+
+    Parameters:
+    - backend: The backend.
+
+    Raises:
+    - ValueError: If the backend is named after an engine keyword.
+    """
+    if backend.name in (REFERENCE_ENGINE, "auto"):
+        raise ValueError(f"'{backend.name}' is reserved.")
+    _backends[backend.name] = backend
+
+
+def get_backends() -> list:
+    """
+    Lists the available backends.
+
+    Returns:
+    - The names of the backends, by decreasing priority.
+    """
+    return sorted(_backends, key=lambda name: -_backends[name].priority)
+
+
+def get_backend(name: str) -> Backend:
+    """
+    Returns a registered backend.
+
+    Parameters:
+    - name: Name of the backend.
+
+    Returns:
+    - The backend.
+
+    Raises:
+    - ValueError: If no backend has this name.
+    """
+    if name not in _backends:
+        raise ValueError(f"Unknown or unavailable engine '{name}', "
+                         f"expected one of {get_engines()}.")
+    return _backends[name]
+
+
+def get_engines() -> tuple:
+    """
+    Lists the engines Steganography accepts.
+
+    Returns:
+    - "auto", the reference "loop" engine and the available backends.
+    """
+    return ("auto", REFERENCE_ENGINE, *get_backends())
+
+
+def resolve_engine(engine: str = "auto") -> str:
+    """
+    Resolves the "auto" engine.
+
+    Parameters:
+    - engine: An engine from get_engines.
+
+    Returns:
+    - The engine itself, or for "auto" the STEGANOGRAPHY_ENGINE
+      environment variable if set, else the backend with the highest
+      priority.
+
+    Raises:
+    - ValueError: If the engine (or the variable) names no engine.
+    """
+    if engine == "auto":
+        engine = os.environ.get(ENGINE_VARIABLE) or get_backends()[0]
+    if engine != REFERENCE_ENGINE:
+        get_backend(engine)
+    return engine
+
+
+def _numpy_embed_values(window: np.ndarray, values: np.ndarray,
+                        bits_per_sample: int) -> None:
+    mask = (1 << bits_per_sample) - 1
+    window &= ~window.dtype.type(mask)
+    window |= values
+
+
+def _numpy_extract_values(window: np.ndarray,
+                          bits_per_sample: int) -> np.ndarray:
+    return (window & ((1 << bits_per_sample) - 1)).astype(np.uint8)
+
+
+register_backend(Backend("numpy", _numpy_embed_values,
+                         _numpy_extract_values, priority=10))
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+if numba is not None:
+    # Compiled loops touch each sample once, without temporaries, and
+    # release the GIL
+    @numba.njit(cache=True, nogil=True)
+    def _numba_embed_values(window, values, bits_per_sample):
+        keep = ~((1 << bits_per_sample) - 1)
+        for index in range(values.size):
+            window[index] = (window[index] & keep) | values[index]
+
+    @numba.njit(cache=True, nogil=True)
+    def _numba_extract_values(window, bits_per_sample):
+        mask = (1 << bits_per_sample) - 1
+        values = np.empty(window.size, dtype=np.uint8)
+        for index in range(window.size):
+            values[index] = window[index] & mask
+        return values
+
+    register_backend(Backend("numba", _numba_embed_values,
+                             _numba_extract_values, priority=20))
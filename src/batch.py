@@ -0,0 +1,214 @@
+"""
+Batch.py
+
+This module encodes or decodes many images in parallel, using a pool of
+worker processes that each keep a single Steganography instance.
+
+"""
+import csv
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import image_io
+from steganography import Steganography
+from cache import CachedSteganography, ResultCache
+from psnr import compute_psnr
+
+RESULT_FIELDS = ("index", "mode", "cover", "secret", "image", "output",
+                 "status", "seconds", "psnr", "error")
+
+# Steganography instance of the current worker process
+_model = None
+
+
+def load_manifest(path: str) -> list:
+    """
+    Loads the jobs of a batch from a CSV or JSONL manifest.
+
+    Encode jobs have the keys "cover", "secret" and "output". Decode jobs
+    have the keys "image" and "output", and optionally "secret", the
+    original secret image used to compute the PSNR.
+
+    Parameters:
+    - path: Path of the .csv or .jsonl manifest.
+
+    Returns:
+    - A list of jobs, as dictionaries.
+    """
+    with open(path, newline="") as file:
+        if path.lower().endswith(".jsonl"):
+            return [json.loads(line) for line in file if line.strip()]
+        return list(csv.DictReader(file))
+
+
+def glob_jobs(mode: str, inputs: str,
+              output_dir: str,
+              secrets: str = None) -> list:
+    """
+    Builds the jobs of a batch from glob patterns.
+
+    Parameters:
+    - mode: "encode" or "decode".
+    - inputs: Glob of the cover images (encode) or of the steganography
+      images (decode).
+    - output_dir: Directory of the output images, named after the secret
+      images (encode) or the steganography images (decode). Decode
+      outputs have no extension yet: the worker adds ".png" for hidden
+      images and ".bin" for hidden bytes.
+    - secrets: Glob of the secret images, for the encode mode. A single
+      cover image is used for all of them, otherwise covers and secrets
+      are paired in sorted order.
+
+    Returns:
+    - A list of jobs, as dictionaries.
+
+    Raises:
+    - ValueError: If the numbers of covers and secrets differ, unless
+      there is a single cover.
+    """
+    paths = sorted(glob.glob(inputs))
+    if mode == "decode":
+        return [{"image": path,
+                 "output": _get_output_path(output_dir, path, "")}
+                for path in paths]
+
+    secret_paths = sorted(glob.glob(secrets or ""))
+    if len(paths) == 1:
+        paths = paths * len(secret_paths)
+    if len(paths) != len(secret_paths):
+        raise ValueError(f"{len(paths)} cover images match '{inputs}' but "
+                         f"{len(secret_paths)} secret images match "
+                         f"'{secrets}'.")
+    return [{"cover": cover, "secret": secret,
+             "output": _get_output_path(output_dir, secret)}
+            for cover, secret in zip(paths, secret_paths)]
+
+
+def _get_output_path(output_dir: str, path: str,
+                     extension: str = ".png") -> str:
+    """
+    Names an output file after an input image.
+
+    Parameters:
+    - output_dir: Directory of the output file.
+    - path: Path of the input image.
+    - extension: Extension of the output file. Default is ".png".
+
+    Returns:
+    - The path of the output file.
+    """
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(output_dir, name + extension)
+
+
+def _init_worker(options: dict, cache_dir: str = None) -> None:
+    """
+    Creates the Steganography instance of a worker process.
+
+    Parameters:
+    - options: Keyword arguments of the Steganography constructor.
+    - cache_dir: Directory of a result cache shared by the workers.
+      Default is no cache.
+    """
+    global _model
+    _model = Steganography(**options)
+    if cache_dir is not None:
+        _model = CachedSteganography(_model, ResultCache(directory=cache_dir))
+
+
+def _run_job(job: dict) -> dict:
+    """
+    Runs one job in a worker process. Images are loaded and saved by the
+    worker, so only paths are sent between processes.
+
+    Parameters:
+    - job: The job, with its "index" and "mode".
+
+    Returns:
+    - The result, with the status, the time spent and the PSNR.
+    """
+    result = {field: job.get(field) for field in RESULT_FIELDS}
+    start = time.perf_counter()
+    try:
+        if job["mode"] == "encode":
+            cover_image = image_io.read_image(job["cover"])
+            secret_image = image_io.read_image(job["secret"])
+            encoded_image, report = _model.encode(cover_image, secret_image,
+                                                  report=True, inplace=True)
+            image_io.write_image(job["output"], encoded_image)
+            result["psnr"] = report["psnr"]
+        else:
+            secret_image = _model.decode(image_io.read_image(job["image"]))
+            if not os.path.splitext(job["output"])[1]:
+                result["output"] = job["output"] + (
+                    ".bin" if isinstance(secret_image, bytes) else ".png")
+            if isinstance(secret_image, bytes):
+                # Bytes payloads are written back as the original file
+                with open(result["output"], "wb") as file:
+                    file.write(secret_image)
+            else:
+                image_io.write_image(result["output"], secret_image)
+            if job.get("secret") and not isinstance(secret_image, bytes):
+                result["psnr"] = compute_psnr(
+                    image_io.read_image(job["secret"]), secret_image)
+        result["status"] = "ok"
+    except Exception as error:
+        result["status"] = "error"
+        result["error"] = f"{type(error).__name__}: {error}"
+    result["seconds"] = time.perf_counter() - start
+    if result["psnr"] is not None:
+        result["psnr"] = float(result["psnr"])
+    return result
+
+
+def run_batch(jobs: list, mode: str,
+              options: dict = None,
+              workers: int = None,
+              chunksize: int = 1,
+              cache_dir: str = None):
+    """
+    Runs the jobs of a batch in a pool of worker processes.
+
+    Parameters:
+    - jobs: The jobs, from load_manifest or glob_jobs.
+    - mode: "encode" or "decode".
+    - options: Keyword arguments of the Steganography constructor.
+    - workers: Number of worker processes. Default is the number of CPUs.
+    - chunksize: Number of jobs sent to a worker at once.
+    - cache_dir: Directory of a result cache shared by the workers, so
+      repeated jobs are not computed again. Default is no cache.
+
+    Yields:
+    - The result of each job, in the order of the jobs.
+    """
+    jobs = [{**job, "index": index, "mode": mode}
+            for index, job in enumerate(jobs)]
+    with ProcessPoolExecutor(max_workers=workers,
+                             initializer=_init_worker,
+                             initargs=(options or {}, cache_dir)) as executor:
+        yield from executor.map(_run_job, jobs, chunksize=chunksize)
+
+
+def write_results(results, path: str) -> list:
+    """
+    Writes the results of a batch as a CSV or JSONL manifest.
+
+    Parameters:
+    - results: The results, from run_batch.
+    - path: Path of the .csv or .jsonl results manifest.
+
+    Returns:
+    - The results, as a list.
+    """
+    results = list(results)
+    with open(path, "w", newline="") as file:
+        if path.lower().endswith(".jsonl"):
+            for result in results:
+                file.write(json.dumps(result) + "\n")
+        else:
+            writer = csv.DictWriter(file, fieldnames=RESULT_FIELDS)
+            writer.writeheader()
+            writer.writerows(results)
+    return results
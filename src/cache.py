@@ -0,0 +1,399 @@
+"""
+Cache.py
+
+This module provides a content-addressed result cache for repeated
+encode and decode jobs. Results are keyed by a BLAKE2 hash of the input
+images and of the options of the Steganography instance, and kept in a
+size-bounded in-memory tier backed by an optional on-disk tier, both
+evicting the least recently used entries.
+
+"""
+import hashlib
+import json
+import os
+import tempfile
+import zipfile
+from collections import OrderedDict
+import numpy as np
+from steganography import Steganography
+
+DEFAULT_MAX_BYTES = 256 << 20
+DEFAULT_MAX_DISK_BYTES = 1 << 30
+# Options changing the output of encode or decode (legacy_headers decides
+# whether headers without magic value are decoded); the engine and the
+# number of workers do not, and the key is only known by its fingerprint
+CACHED_OPTIONS = ("header_size", "depth", "pixel_size", "resize_mode",
+                  "bits_per_sample", "layout", "key_id", "legacy_headers")
+ENTRY_SUFFIX = ".npz"
+
+
+def get_key(operation: str, images: tuple, options: dict) -> str:
+    """
+    Hashes the inputs of an operation.
+
+    Parameters:
+    - operation: Name of the operation, e.g. "encode".
+    - images: The input images, hashed with their shape and data type.
+    - options: Parameters changing the result of the operation.
+
+    Returns:
+    - A hexadecimal digest identifying the inputs.
+    """
+    hasher = hashlib.blake2b(digest_size=20)
+    hasher.update(json.dumps([operation, sorted(options.items())]).encode())
+    for image in images:
+        image = np.ascontiguousarray(image)
+        hasher.update(f"{image.shape}{image.dtype.str}".encode())
+        hasher.update(image.data)
+    return hasher.hexdigest()
+
+
+def _get_size(value) -> int:
+    """
+    Returns the number of bytes held by a cached result.
+
+    Parameters:
+    - value: An image, bytes, or an (image, report) tuple.
+
+    Returns:
+    - The size of the result.
+    """
+    if isinstance(value, tuple):
+        return value[0].nbytes
+    if isinstance(value, bytes):
+        return len(value)
+    return value.nbytes
+
+
+def _copy(value):
+    """
+    Copies a cached result, so callers cannot alter the cache.
+
+    Parameters:
+    - value: An image, bytes, or an (image, report) tuple.
+
+    Returns:
+    - The copy.
+    """
+    if isinstance(value, tuple):
+        return value[0].copy(), json.loads(json.dumps(value[1]))
+    if isinstance(value, bytes):
+        return value
+    return value.copy()
+
+
+def _store(image: np.ndarray, embedded_image: np.ndarray,
+           inplace: bool, out: np.ndarray) -> np.ndarray:
+    """
+    Copies a cached image into the buffer the caller asked for.
+
+    Parameters:
+    - image: The cached image.
+    - embedded_image: The cover of an encode.
+    - inplace: Whether the cover receives the image, when it has its
+      shape (an encode resizing the cover leaves it unchanged).
+    - out: Optional preallocated buffer receiving the image.
+
+    Returns:
+    - The buffer holding the image.
+    """
+    if out is not None:
+        np.copyto(out, image)
+        return out
+    if inplace and embedded_image.shape == image.shape:
+        np.copyto(embedded_image, image)
+        return embedded_image
+    return image
+
+
+class ResultCache:
+    """
+    Two-tier LRU cache of encode and decode results.
+
+    The memory tier holds at most max_bytes of results. With a directory,
+    results are also written there as .npz files, at most max_disk_bytes
+    in total, so they survive the process and can be shared by the worker
+    processes of a batch. Disk entries are ordered by modification time,
+    which is refreshed on each hit. Each process bounds the entries it
+    knows of, so a shared directory may briefly exceed max_disk_bytes.
+
+    Reports are stored as JSON, so cached reports hold lists where the
+    original ones hold tuples.
+    """
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES,
+                 directory: str = None,
+                 max_disk_bytes: int = DEFAULT_MAX_DISK_BYTES):
+        """
+        Creates an empty cache, indexing the entries already on disk.
+
+        Parameters:
+        - max_bytes: Size of the memory tier, 0 to disable it.
+        - directory: Directory of the disk tier. Default is no disk tier.
+        - max_disk_bytes: Size of the disk tier.
+        """
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk = OrderedDict()
+        self._disk_bytes = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            entries = []
+            for entry in os.scandir(directory):
+                if entry.name.endswith(ENTRY_SUFFIX):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, entry.name, stat.st_size))
+            for _, name, size in sorted(entries):
+                self._disk[name[:-len(ENTRY_SUFFIX)]] = size
+                self._disk_bytes += size
+
+    def _get_path(self, key: str) -> str:
+        """
+        Returns the path of a disk entry.
+        """
+        return os.path.join(self.directory, key + ENTRY_SUFFIX)
+
+    def get(self, key: str):
+        """
+        Looks a result up, memory tier first.
+
+        Parameters:
+        - key: Key of the result, from get_key.
+
+        Returns:
+        - A copy of the result, or None on a miss.
+        """
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            return _copy(self._memory[key])
+        if self.directory is not None:
+            value = self._read(key)
+            if value is not None:
+                self.disk_hits += 1
+                self._put_memory(key, value)
+                return _copy(value)
+        self.misses += 1
+        return None
+
+    def put(self, key: str, value) -> None:
+        """
+        Stores a result in both tiers.
+
+        Parameters:
+        - key: Key of the result, from get_key.
+        - value: An image, bytes, or an (image, report) tuple.
+        """
+        value = _copy(value)
+        self._put_memory(key, value)
+        if self.directory is not None:
+            self._write(key, value)
+
+    def _put_memory(self, key: str, value) -> None:
+        """
+        Stores a result in the memory tier, evicting older results.
+        """
+        size = _get_size(value)
+        if size > self.max_bytes:
+            return
+        if key in self._memory:
+            self._memory_bytes -= _get_size(self._memory.pop(key))
+        self._memory[key] = value
+        self._memory_bytes += size
+        while self._memory_bytes > self.max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= _get_size(evicted)
+            self.evictions += 1
+
+    def _read(self, key: str):
+        """
+        Loads a result from the disk tier.
+
+        Returns:
+        - The result, or None if it is not on disk.
+        """
+        path = self._get_path(key)
+        try:
+            with np.load(path, allow_pickle=False) as entry:
+                if "data" in entry:
+                    value = entry["data"].tobytes()
+                else:
+                    value = entry["image"]
+                    if "report" in entry:
+                        value = value, json.loads(str(entry["report"]))
+            os.utime(path)
+        except (OSError, ValueError, zipfile.BadZipFile):
+            # Missing, evicted by another process, or corrupt
+            self._forget(key)
+            return None
+        if key in self._disk:
+            self._disk.move_to_end(key)
+        else:
+            self._disk[key] = os.path.getsize(path)
+            self._disk_bytes += self._disk[key]
+        return value
+
+    def _write(self, key: str, value) -> None:
+        """
+        Writes a result to the disk tier, evicting older results.
+        """
+        if isinstance(value, bytes):
+            arrays = {"data": np.frombuffer(value, dtype=np.uint8)}
+        elif isinstance(value, tuple):
+            arrays = {"image": value[0],
+                      "report": np.array(json.dumps(value[1]))}
+        else:
+            arrays = {"image": value}
+        # Written aside then renamed, so readers never see a partial entry
+        descriptor, temporary = tempfile.mkstemp(dir=self.directory,
+                                                 suffix=".tmp")
+        with os.fdopen(descriptor, "wb") as file:
+            np.savez(file, **arrays)
+        os.replace(temporary, self._get_path(key))
+        self._forget(key)
+        self._disk[key] = os.path.getsize(self._get_path(key))
+        self._disk_bytes += self._disk[key]
+        while self._disk_bytes > self.max_disk_bytes and len(self._disk) > 1:
+            evicted = next(iter(self._disk))
+            self._forget(evicted)
+            try:
+                os.remove(self._get_path(evicted))
+            except FileNotFoundError:
+                pass
+            self.evictions += 1
+
+    def _forget(self, key: str) -> None:
+        """
+        Drops a disk entry from the index.
+        """
+        if key in self._disk:
+            self._disk_bytes -= self._disk.pop(key)
+
+    def clear(self) -> None:
+        """
+        Empties both tiers and resets the counters.
+        """
+        for key in list(self._disk):
+            try:
+                os.remove(self._get_path(key))
+            except FileNotFoundError:
+                pass
+        self._memory.clear()
+        self._disk.clear()
+        self._memory_bytes = self._disk_bytes = 0
+        self.memory_hits = self.disk_hits = self.misses = self.evictions = 0
+
+    def get_stats(self) -> dict:
+        """
+        Describes the use of the cache.
+
+        Returns:
+        - The hits of each tier, the misses, the evictions, and the number
+          of entries and bytes of each tier.
+        """
+        return {"memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_bytes}
+
+
+class CachedSteganography:
+    """
+    Wraps a Steganography instance so encode and decode look their
+    results up in a ResultCache before computing them. Models with a
+    password bypass the cache, which would otherwise keep the secrets in
+    clear. Other attributes are those of the wrapped instance.
+    """
+    def __init__(self, model: Steganography = None,
+                 cache: ResultCache = None):
+        """
+        Creates the wrapper.
+
+        Parameters:
+        - model: The Steganography instance. Default is a new one.
+        - cache: The cache, possibly shared. Default is a new memory cache.
+        """
+        self.model = model if model is not None else Steganography()
+        self.cache = cache if cache is not None else ResultCache()
+
+    def __getattr__(self, name: str):
+        return getattr(self.model, name)
+
+    def _get_options(self) -> dict:
+        """
+        Returns the options of the model changing its results.
+        """
+        return {option: getattr(self.model, option)
+                for option in CACHED_OPTIONS}
+
+    def encode(self, embedded_image: np.ndarray,
+               hidden_image: np.ndarray,
+               report: bool = False,
+               inplace: bool = False,
+               out: np.ndarray = None):
+        """
+        Encodes the hidden image, or returns the cached result.
+
+        Parameters:
+        - embedded_image: The cover image.
+        - hidden_image: The image to be hidden.
+        - report: Whether to return the embedding report too.
+        - inplace: Whether to write the encoded image into the cover, as
+          in Steganography.encode.
+        - out: Optional preallocated buffer receiving the encoded image.
+
+        Returns:
+        - The encoded image, and the report if requested.
+        """
+        if self.model.password is not None:
+            return self.model.encode(embedded_image, hidden_image,
+                                     report=report, inplace=inplace,
+                                     out=out)
+        # Hashed before an in-place encode changes the cover
+        key = get_key("encode" if not report else "encode_report",
+                      (embedded_image, hidden_image), self._get_options())
+        result = self.cache.get(key)
+        if result is None:
+            result = self.model.encode(embedded_image, hidden_image,
+                                       report=report, inplace=inplace,
+                                       out=out)
+            self.cache.put(key, result)
+            return result
+        if report:
+            image, report = result
+            return _store(image, embedded_image, inplace, out), report
+        return _store(result, embedded_image, inplace, out)
+
+    def decode(self, encoded_image: np.ndarray,
+               out: np.ndarray = None):
+        """
+        Decodes the secret image or bytes, or returns the cached result.
+
+        Parameters:
+        - encoded_image: The encoded image.
+        - out: Optional preallocated buffer receiving the secret image.
+
+        Returns:
+        - The secret image, or the hidden bytes.
+        """
+        if self.model.password is not None:
+            return self.model.decode(encoded_image, out=out)
+        key = get_key("decode", (encoded_image,), self._get_options())
+        result = self.cache.get(key)
+        if result is None:
+            result = self.model.decode(encoded_image, out=out)
+            self.cache.put(key, result)
+            return result
+        if isinstance(result, bytes):
+            return result
+        return _store(result, None, False, out)
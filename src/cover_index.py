@@ -0,0 +1,251 @@
+"""
+Cover_index.py
+
+This module keeps a persistent SQLite index of a library of cover
+images: dimensions, channels, payload capacity at each number of bits
+per sample and a texture score. Shapes are read from the file headers,
+and a cover fitting a secret without resizing is found with an indexed
+query, without decoding any image.
+
+"""
+import os
+import sqlite3
+import struct
+import cv2
+import numpy as np
+from PIL import Image
+import image_io
+from steganography import MAX_BITS_PER_SAMPLE, Steganography
+
+IMAGE_EXTENSIONS = image_io.IMAGE_FORMATS
+HEADER_FORMATS = (".png", ".ppm", ".npy")
+CAPACITY_COLUMNS = tuple(f"capacity_{bits}"
+                         for bits in range(1, MAX_BITS_PER_SAMPLE + 1))
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS covers (
+    path TEXT PRIMARY KEY,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    channels INTEGER NOT NULL,
+    pixels INTEGER NOT NULL,
+    {", ".join(f"{column} INTEGER NOT NULL" for column in CAPACITY_COLUMNS)},
+    texture REAL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS covers_by_pixels ON covers (channels, pixels);
+"""
+
+
+def read_shape(path: str) -> tuple:
+    """
+    Reads the shape of an image from its header.
+
+    Parameters:
+    - path: Path of the image.
+
+    Returns:
+    - The image shape (height, width, channels), with 3 channels for
+      compressed images as read by cv2.imread.
+    """
+    if path.lower().endswith(HEADER_FORMATS):
+        return image_io.get_image_shape(path)
+    # Pillow only parses the header until the pixels are accessed
+    with Image.open(path) as image:
+        width, height = image.size
+    return height, width, 3
+
+
+def get_texture_score(path: str) -> float:
+    """
+    Scores how busy an image is, from a preview reduced by 4: the mean
+    absolute Laplacian of its luminance. Changes of the least significant
+    bits are harder to notice in covers with a high score.
+
+    Parameters:
+    - path: Path of the image.
+
+    Returns:
+    - The score, 0 for flat images.
+
+    Raises:
+    - ValueError: If the image cannot be read.
+    """
+    if path.lower().endswith(".npy"):
+        preview = np.load(path, mmap_mode="r")[::4, ::4]
+        if preview.ndim == 3:
+            preview = preview.mean(axis=2)
+    else:
+        preview = cv2.imread(path, cv2.IMREAD_REDUCED_GRAYSCALE_4)
+        if preview is None:
+            raise ValueError(f"Cannot read image '{path}'.")
+    laplacian = cv2.Laplacian(np.asarray(preview, dtype=np.float32),
+                              cv2.CV_32F)
+    return float(np.abs(laplacian).mean())
+
+
+class CoverIndex:
+    """
+    SQLite index of cover images, queried for the smallest cover that
+    holds a secret without resizing.
+    """
+    def __init__(self, path: str = ":memory:",
+                 model: Steganography = None):
+        """
+        Opens or creates an index.
+
+        Parameters:
+        - path: Path of the SQLite database.
+        - model: Steganography instance whose header size and pixel size
+          define the capacities. Default is a new one.
+        """
+        self.path = path
+        self.model = model if model is not None else Steganography()
+        self.connection = sqlite3.connect(path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(SCHEMA)
+        # (path, error) of the images the last build could not read
+        self.skipped = []
+
+    def get_capacities(self, pixels: int, channels: int) -> list:
+        """
+        Calculates the payload capacity of a cover.
+
+        Parameters:
+        - pixels: Number of pixels of the cover.
+        - channels: Number of channels of the cover.
+
+        Returns:
+        - The number of payload bits the cover holds at each number of
+          bits per sample, from 1 to MAX_BITS_PER_SAMPLE.
+        """
+        samples = max(pixels - self.model.header_size, 0) * channels
+        return [samples * bits
+                for bits in range(1, MAX_BITS_PER_SAMPLE + 1)]
+
+    def add(self, path: str, texture: bool = True) -> bool:
+        """
+        Indexes a cover image, unless it is indexed and unchanged.
+
+        Parameters:
+        - path: Path of the image.
+        - texture: Whether to compute the texture score, which decodes a
+          reduced preview of the image.
+
+        Returns:
+        - True if the image was (re)indexed.
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        row = self.connection.execute(
+            "SELECT size, mtime FROM covers WHERE path = ?",
+            (path,)).fetchone()
+        if row is not None and (row["size"], row["mtime"]) == \
+                (stat.st_size, stat.st_mtime):
+            return False
+        height, width, channels = read_shape(path)
+        pixels = width * height
+        score = get_texture_score(path) if texture else None
+        self.connection.execute(
+            "INSERT OR REPLACE INTO covers VALUES "
+            f"({', '.join('?' * (8 + MAX_BITS_PER_SAMPLE))})",
+            (path, width, height, channels, pixels,
+             *self.get_capacities(pixels, channels), score,
+             stat.st_size, stat.st_mtime))
+        return True
+
+    def build(self, directory: str, texture: bool = True) -> int:
+        """
+        Indexes the images of a directory and its subdirectories, and
+        forgets the indexed images that no longer exist. Images that cannot
+        be read are skipped (and forgotten), and listed in self.skipped.
+
+        Parameters:
+        - directory: The cover library.
+        - texture: Whether to compute the texture scores.
+
+        Returns:
+        - The number of images (re)indexed.
+        """
+        count = 0
+        self.skipped = []
+        with self.connection:
+            for root, _, names in os.walk(directory):
+                for name in sorted(names):
+                    if not name.lower().endswith(IMAGE_EXTENSIONS):
+                        continue
+                    path = os.path.join(root, name)
+                    try:
+                        count += self.add(path, texture)
+                    except (OSError, ValueError, SyntaxError, struct.error,
+                            cv2.error) as error:
+                        # Pillow raises OSError for unidentified images
+                        self.skipped.append((path, str(error)))
+                        self.connection.execute(
+                            "DELETE FROM covers WHERE path = ?",
+                            (os.path.abspath(path),))
+            missing = [(row["path"],) for row in self.connection.execute(
+                "SELECT path FROM covers") if not os.path.exists(row["path"])]
+            self.connection.executemany("DELETE FROM covers WHERE path = ?",
+                                        missing)
+        return count
+
+    def select_cover(self, secret, min_texture: float = None) -> dict:
+        """
+        Finds the smallest cover holding a secret image without resizing,
+        with the bits per sample and layout of the model. Each channel
+        count is one lookup in the (channels, pixels) index. The header
+        must fit in the first row, so narrower covers are skipped.
+
+        Parameters:
+        - secret: The secret image, its shape, or its path (read from the
+          header when possible).
+        - min_texture: Minimum texture score of the cover. Default is any.
+
+        Returns:
+        - The indexed cover (path, width, height, channels, pixels,
+          capacities, texture, size and mtime), or None if none fits.
+        """
+        if isinstance(secret, str):
+            shape = read_shape(secret)
+        else:
+            shape = getattr(secret, "shape", secret)
+        payload_bits = shape[0] * shape[1] * self.model.pixel_size
+        condition, parameters = "", ()
+        if min_texture is not None:
+            condition, parameters = "AND texture >= ?", (min_texture,)
+        best = None
+        for (channels,) in self.connection.execute(
+                "SELECT DISTINCT channels FROM covers WHERE channels >= ?",
+                (self.model.depth,)).fetchall():
+            required = self.model.count_pixels(payload_bits,
+                                               self.model.bits_per_sample,
+                                               self.model.layout, channels,
+                                               self.model.password
+                                               is not None)
+            row = self.connection.execute(
+                "SELECT * FROM covers WHERE channels = ? AND pixels >= ? "
+                f"AND width >= ? {condition} ORDER BY pixels LIMIT 1",
+                (channels, required, self.model.header_size,
+                 *parameters)).fetchone()
+            if row is not None and (best is None or
+                                    row["pixels"] < best["pixels"]):
+                best = row
+        return dict(best) if best is not None else None
+
+    def __len__(self) -> int:
+        return self.connection.execute(
+            "SELECT COUNT(*) FROM covers").fetchone()[0]
+
+    def close(self) -> None:
+        """
+        Commits and closes the database.
+        """
+        self.connection.commit()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
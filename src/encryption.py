@@ -0,0 +1,191 @@
+"""
+Encryption.py
+
+This module provides the optional password encryption of payloads, with
+the standard library only: a key derived from the password and a random
+salt by scrypt, a SHAKE-256 keystream XORed with the payload bytes, and a
+keyed BLAKE2b tag authenticating them. The keystream of any byte range is
+computed on its own, so a payload is encrypted and decrypted slice by
+slice while its bits are written to or read from the cover, without a
+full-size copy of the plaintext or of the ciphertext.
+
+Each encrypted payload stream starts with a prefix holding the salt and
+the tag, followed by the ciphertext.
+
+"""
+import hashlib
+import hmac
+import os
+import numpy as np
+
+SALT_SIZE = 16
+TAG_SIZE = 16
+PREFIX_SIZE = SALT_SIZE + TAG_SIZE
+# Bytes of keystream derived by each call to SHAKE-256
+KEYSTREAM_BLOCK = 1 << 14
+# Bytes of a payload stream hashed at once by the tag
+TAG_BLOCK = 1 << 16
+SCRYPT_PARAMETERS = {"n": 1 << 14, "r": 8, "p": 1}
+
+
+def normalize_password(password) -> bytes:
+    """
+    Converts a password to bytes.
+
+    Parameters:
+    - password: The password, as text (encoded in UTF-8) or bytes.
+
+    Returns:
+    - The password as bytes.
+
+    Raises:
+    - ValueError: If the password is empty.
+    - TypeError: If the password is neither text nor bytes.
+    """
+    if isinstance(password, str):
+        password = password.encode("utf-8")
+    if not isinstance(password, (bytes, bytearray)):
+        raise TypeError("The password must be text or bytes.")
+    if not password:
+        raise ValueError("The password must not be empty.")
+    return bytes(password)
+
+
+class PayloadCipher:
+    """
+    Keystream and tag of the payload streams of one encoded image.
+    """
+    def __init__(self, password: bytes, salt: bytes = None):
+        """
+        Derives the keys from the password.
+
+        Parameters:
+        - password: The password, from normalize_password.
+        - salt: Salt read from an encoded image. Default is a new random
+          one, for encoding.
+        """
+        self.salt = salt if salt is not None else os.urandom(SALT_SIZE)
+        keys = hashlib.scrypt(password, salt=self.salt, dklen=64,
+                              **SCRYPT_PARAMETERS)
+        self._stream_key, self._tag_key = keys[:32], keys[32:]
+
+    def get_keystream(self, stream: int, start: int,
+                      stop: int) -> np.ndarray:
+        """
+        Derives the keystream of a range of bytes of a payload stream.
+
+        Parameters:
+        - stream: Index of the payload stream.
+        - start: First byte of the range.
+        - stop: End (exclusive) of the range.
+
+        Returns:
+        - The keystream, as a 1-D uint8 array of stop - start bytes.
+        """
+        first_block = start // KEYSTREAM_BLOCK
+        blocks = []
+        for block in range(first_block, -(-stop // KEYSTREAM_BLOCK)):
+            size = min((block + 1) * KEYSTREAM_BLOCK, stop) - \
+                block * KEYSTREAM_BLOCK
+            blocks.append(hashlib.shake_256(
+                self._stream_key + stream.to_bytes(4, "little") +
+                block.to_bytes(8, "little")).digest(size))
+        keystream = np.frombuffer(b"".join(blocks), dtype=np.uint8)
+        return keystream[start - first_block * KEYSTREAM_BLOCK:]
+
+    def get_tag(self, streams: list) -> bytes:
+        """
+        Authenticates the plaintext payload streams, block by block.
+
+        Parameters:
+        - streams: The payload streams, as 1-D uint8 arrays (possibly
+          strided views).
+
+        Returns:
+        - The tag, of TAG_SIZE bytes.
+        """
+        hasher = hashlib.blake2b(key=self._tag_key, digest_size=TAG_SIZE,
+                                 salt=self.salt)
+        for stream in streams:
+            hasher.update(stream.size.to_bytes(8, "little"))
+            for start in range(0, stream.size, TAG_BLOCK):
+                hasher.update(np.ascontiguousarray(
+                    stream[start:start + TAG_BLOCK]).data)
+        return hasher.digest()
+
+    def verify(self, streams: list, tag: bytes) -> None:
+        """
+        Checks the tag of decrypted payload streams.
+
+        Parameters:
+        - streams: The decrypted payload streams.
+        - tag: The tag read from the encoded image.
+
+        Raises:
+        - ValueError: If the tag does not match.
+        """
+        if not hmac.compare_digest(self.get_tag(streams), tag):
+            raise ValueError("Wrong password, or the hidden data is "
+                             "corrupted.")
+
+
+class EncryptedStream:
+    """
+    Read-only view of a payload stream as embedded: the prefix, then the
+    ciphertext, encrypted when a slice is read.
+    """
+    def __init__(self, cipher: PayloadCipher, data: np.ndarray,
+                 index: int, tag: bytes):
+        """
+        Wraps a plaintext payload stream.
+
+        Parameters:
+        - cipher: The cipher of the encoded image.
+        - data: The plaintext stream, as a 1-D uint8 array.
+        - index: Index of the payload stream, selecting its keystream.
+        - tag: Tag of all the payload streams, from cipher.get_tag.
+        """
+        self.cipher = cipher
+        self.data = data
+        self.index = index
+        self.prefix = np.frombuffer(cipher.salt + tag, dtype=np.uint8)
+        self.size = PREFIX_SIZE + data.size
+
+    def __getitem__(self, key: slice) -> np.ndarray:
+        start, stop, _ = key.indices(self.size)
+        parts = [self.prefix[start:max(start, min(stop, PREFIX_SIZE))]]
+        first, last = max(start - PREFIX_SIZE, 0), stop - PREFIX_SIZE
+        if first < last:
+            parts.append(self.data[first:last] ^
+                         self.cipher.get_keystream(self.index, first, last))
+        return np.concatenate(parts)
+
+
+class DecryptedOutput:
+    """
+    Write-only view of a payload stream being extracted: the prefix is
+    skipped and the ciphertext is decrypted into the output as it is
+    written.
+    """
+    def __init__(self, cipher: PayloadCipher, output: np.ndarray,
+                 index: int):
+        """
+        Wraps the buffer receiving a plaintext payload stream.
+
+        Parameters:
+        - cipher: The cipher, created with the salt of the encoded image.
+        - output: The buffer, as a 1-D uint8 array (possibly a view).
+        - index: Index of the payload stream.
+        """
+        self.cipher = cipher
+        self.output = output
+        self.index = index
+        self.size = PREFIX_SIZE + output.size
+
+    def __setitem__(self, key: slice, values: np.ndarray) -> None:
+        start, stop, _ = key.indices(self.size)
+        first, last = max(start - PREFIX_SIZE, 0), stop - PREFIX_SIZE
+        if first < last:
+            self.output[first:last] = \
+                values[first + PREFIX_SIZE - start:] ^ \
+                self.cipher.get_keystream(self.index, first, last)
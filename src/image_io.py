@@ -0,0 +1,567 @@
+"""
+Image_io.py
+
+This module provides functions to read and write uncompressed images
+(binary PPM, NumPy .npy and raw files) band by band or memory-mapped, and
+to read only the first rows of PNG images, so that large images can be
+encoded or decoded without loading them entirely in memory.
+
+It is also the single entry point for whole images, from files or
+in-memory buffers, always in BGR order so no color conversion is needed,
+with control over the PNG compression level and strategy and lossless
+WebP and TIFF output.
+
+"""
+import os
+import struct
+import zlib
+import cv2
+import numpy as np
+
+STREAM_FORMATS = (".ppm", ".npy")
+MAP_FORMATS = (".ppm", ".npy", ".raw")
+DEFAULT_BAND_ROWS = 256
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+PNG_CHUNK_SIZE = 1 << 20
+# zlib strategies of PNG writing; "huffman_only" and "rle" trade size for
+# speed
+PNG_STRATEGIES = {"default": cv2.IMWRITE_PNG_STRATEGY_DEFAULT,
+                  "filtered": cv2.IMWRITE_PNG_STRATEGY_FILTERED,
+                  "huffman_only": cv2.IMWRITE_PNG_STRATEGY_HUFFMAN_ONLY,
+                  "rle": cv2.IMWRITE_PNG_STRATEGY_RLE,
+                  "fixed": cv2.IMWRITE_PNG_STRATEGY_FIXED}
+# libtiff compression schemes
+TIFF_COMPRESSIONS = {"none": 1, "lzw": 5, "deflate": 8}
+# Formats read as images, by extension; other files are hidden as bytes
+IMAGE_FORMATS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".webp",
+                 ".ppm", ".npy")
+# Formats keeping every bit of the encoded image
+LOSSLESS_FORMATS = (".png", ".webp", ".tif", ".tiff", ".bmp", ".ppm",
+                    ".npy")
+# WebP quality above 100 selects the lossless mode
+WEBP_LOSSLESS_QUALITY = 101
+
+
+def _get_format(path: str, formats: tuple = STREAM_FORMATS) -> str:
+    """
+    Returns the format of a file from its extension.
+
+    Parameters:
+    - path: Path of the image file.
+    - formats: The supported extensions.
+
+    Returns:
+    - The lower case extension of the file.
+
+    Raises:
+    - ValueError: If the format is not supported.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in formats:
+        raise ValueError(f"Unsupported format '{extension}', "
+                         f"expected one of {formats}.")
+    return extension
+
+
+def _read_ppm_header(file) -> tuple:
+    """
+    Reads the header of a binary (P6) PPM file.
+
+    Parameters:
+    - file: A binary file object positioned at the start of the file.
+
+    Returns:
+    - The image shape (height, width, 3). The file is left positioned at
+      the first pixel.
+
+    Raises:
+    - ValueError: If the file is not an 8 bits binary PPM.
+    """
+    tokens = []
+    token = b""
+    while len(tokens) < 4:
+        char = file.read(1)
+        if not char:
+            raise ValueError("Truncated PPM header.")
+        if char == b"#" and not token:
+            file.readline()
+            continue
+        if char.isspace():
+            if token:
+                tokens.append(token)
+                token = b""
+            continue
+        token += char
+
+    if tokens[0] != b"P6":
+        raise ValueError("Only binary (P6) PPM images are supported.")
+    width, height, max_value = (int(token) for token in tokens[1:])
+    if max_value != 255:
+        raise ValueError("Only 8 bits PPM images are supported.")
+    return height, width, 3
+
+
+def _read_png_chunk(file) -> tuple:
+    """
+    Reads the next chunk of a PNG file.
+
+    Parameters:
+    - file: A binary file object positioned at the start of a chunk.
+
+    Returns:
+    - The chunk type and data.
+    """
+    length, chunk_type = struct.unpack(">I4s", file.read(8))
+    data = file.read(length)
+    file.read(4)
+    return chunk_type, data
+
+
+def _write_png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    """
+    Serializes a PNG chunk.
+
+    Parameters:
+    - chunk_type: The four letters chunk type.
+    - data: The chunk data.
+
+    Returns:
+    - The chunk with its length and CRC.
+    """
+    crc = zlib.crc32(chunk_type + data)
+    return struct.pack(">I", len(data)) + chunk_type + data + \
+        struct.pack(">I", crc)
+
+
+def _read_png_header(file) -> tuple:
+    """
+    Reads the signature and the IHDR chunk of a PNG file.
+
+    Parameters:
+    - file: A binary file object positioned at the start of the file.
+
+    Returns:
+    - The IHDR data and the fields (width, height, bit depth, color type,
+      interlace method).
+
+    Raises:
+    - ValueError: If the file is not a PNG image.
+    """
+    if file.read(8) != PNG_SIGNATURE:
+        raise ValueError("Not a PNG image.")
+    chunk_type, data = _read_png_chunk(file)
+    if chunk_type != b"IHDR":
+        raise ValueError("Invalid PNG image.")
+    width, height, bit_depth, color_type, _, _, interlace = \
+        struct.unpack(">IIBBBBB", data)
+    return data, (width, height, bit_depth, color_type, interlace)
+
+
+def read_png_rows(path: str, rows: int) -> np.ndarray:
+    """
+    Reads the first rows of a PNG image, decompressing only the part of
+    the image data that holds them.
+
+    The compressed rows are wrapped in a smaller PNG image, which OpenCV
+    decodes, so pixels are returned in BGR order, as cv2.imread does.
+    Interlaced images are read entirely.
+
+    Parameters:
+    - path: Path of the PNG image.
+    - rows: Number of rows to be read.
+
+    Returns:
+    - The first rows of the image, of shape (rows, width, 3).
+    """
+    with open(path, "rb") as file:
+        header, fields = _read_png_header(file)
+        width, height, bit_depth, color_type, interlace = fields
+        if interlace:
+            return cv2.imread(path)[:rows]
+
+        rows = min(rows, height)
+        row_size = 1 + -(-width * PNG_CHANNELS[color_type] * bit_depth // 8)
+        size = rows * row_size
+        chunks = []
+        decompressor = zlib.decompressobj()
+        data = []
+        length = 0
+        while length < size:
+            chunk_type, chunk = _read_png_chunk(file)
+            if chunk_type == b"IDAT":
+                data.append(decompressor.decompress(chunk, size - length))
+                length += len(data[-1])
+            elif chunk_type == b"IEND":
+                raise ValueError("Truncated PNG image.")
+            elif not data:
+                chunks.append(_write_png_chunk(chunk_type, chunk))
+
+    header = struct.pack(">II", width, rows) + header[8:]
+    chunks.insert(0, _write_png_chunk(b"IHDR", header))
+    data = zlib.compress(b"".join(data), 0)
+    for start in range(0, len(data), PNG_CHUNK_SIZE):
+        chunks.append(_write_png_chunk(
+            b"IDAT", data[start:start + PNG_CHUNK_SIZE]))
+    chunks.append(_write_png_chunk(b"IEND", b""))
+    image = PNG_SIGNATURE + b"".join(chunks)
+    return cv2.imdecode(np.frombuffer(image, dtype=np.uint8),
+                        cv2.IMREAD_COLOR)
+
+
+def decode_png(model, path: str) -> np.ndarray:
+    """
+    Decodes the hidden image, or the hidden bytes, from an encoded PNG
+    image, reading only the rows that hold the header and the payload (all
+    of them for a scattered payload).
+
+    Parameters:
+    - model: A Steganography instance.
+    - path: Path of the encoded PNG image.
+
+    Returns:
+    - The hidden image, or the bytes hidden by encode_bytes.
+    """
+    header = model.peek_header(read_png_rows(path, 1))
+    if header["rows"] is None:
+        # A scattered payload spans all the rows
+        image = read_image(path)
+    else:
+        image = read_png_rows(path, header["rows"])
+    if header["kind"] == "bytes":
+        return model.decode_bytes(image, header)
+    return model.decode_region(image, header)
+
+
+def get_image_shape(path: str) -> tuple:
+    """
+    Reads the shape of an image without loading its pixels.
+
+    Parameters:
+    - path: Path of a PPM, .npy or PNG image.
+
+    Returns:
+    - The image shape (height, width, channels), with 3 channels for PNG
+      images as read by cv2.imread.
+    """
+    if path.lower().endswith(".png"):
+        with open(path, "rb") as file:
+            _, (width, height, _, _, _) = _read_png_header(file)
+        return height, width, 3
+    if _get_format(path) == ".npy":
+        return np.load(path, mmap_mode="r").shape
+    with open(path, "rb") as file:
+        return _read_ppm_header(file)
+
+
+def get_write_params(extension: str,
+                     png_compression: int = None,
+                     png_strategy: str = None,
+                     tiff_compression: str = None) -> list:
+    """
+    Builds the OpenCV parameters writing an image losslessly.
+
+    Parameters:
+    - extension: The lower case extension of the format.
+    - png_compression: PNG zlib level, from 0 (fastest, largest) to 9
+      (slowest, smallest). Default is the OpenCV default.
+    - png_strategy: PNG zlib strategy, a key of PNG_STRATEGIES.
+    - tiff_compression: TIFF compression, a key of TIFF_COMPRESSIONS.
+
+    Returns:
+    - The flat list of parameters of cv2.imwrite and cv2.imencode.
+
+    Raises:
+    - ValueError: If a setting is invalid.
+    """
+    params = []
+    if extension == ".png":
+        if png_compression is not None:
+            if not 0 <= png_compression <= 9:
+                raise ValueError("png_compression must be between 0 and 9.")
+            params += [cv2.IMWRITE_PNG_COMPRESSION, png_compression]
+        if png_strategy is not None:
+            if png_strategy not in PNG_STRATEGIES:
+                raise ValueError(f"Unknown PNG strategy '{png_strategy}', "
+                                 f"expected one of {tuple(PNG_STRATEGIES)}.")
+            params += [cv2.IMWRITE_PNG_STRATEGY,
+                       PNG_STRATEGIES[png_strategy]]
+    elif extension == ".webp":
+        params += [cv2.IMWRITE_WEBP_QUALITY, WEBP_LOSSLESS_QUALITY]
+    elif extension in (".tif", ".tiff") and tiff_compression is not None:
+        if tiff_compression not in TIFF_COMPRESSIONS:
+            raise ValueError(f"Unknown TIFF compression '{tiff_compression}'"
+                             f", expected one of {tuple(TIFF_COMPRESSIONS)}.")
+        params += [cv2.IMWRITE_TIFF_COMPRESSION,
+                   TIFF_COMPRESSIONS[tiff_compression]]
+    return params
+
+
+def read_image(source) -> np.ndarray:
+    """
+    Reads a whole image in BGR order, as cv2.imread does.
+
+    Parameters:
+    - source: Path of the image (.npy files are loaded as saved), its
+      encoded bytes, or a binary file-like object such as a Streamlit
+      upload.
+
+    Returns:
+    - The image, of shape (height, width, 3) unless loaded from .npy.
+
+    Raises:
+    - FileNotFoundError: If the file does not exist.
+    - ValueError: If the file or the bytes are not an image.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        path = os.fspath(source)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No such image '{path}'.")
+        if path.lower().endswith(".npy"):
+            return np.load(path)
+        image = cv2.imread(path)
+        if image is None:
+            raise ValueError(f"Cannot decode image '{path}'.")
+        return image
+    if hasattr(source, "read"):
+        source = source.read()
+    image = cv2.imdecode(np.frombuffer(source, dtype=np.uint8),
+                         cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("Invalid image.")
+    return image
+
+
+def image_to_bytes(image: np.ndarray,
+                   extension: str = ".png",
+                   png_compression: int = None,
+                   png_strategy: str = None,
+                   tiff_compression: str = None) -> bytes:
+    """
+    Encodes an image in memory, e.g. for a download or an HTTP response.
+
+    Parameters:
+    - image: The image in BGR order.
+    - extension: Format of the file, e.g. ".png" or ".webp".
+    - png_compression, png_strategy, tiff_compression: See
+      get_write_params.
+
+    Returns:
+    - The encoded file.
+
+    Raises:
+    - ValueError: If the image cannot be encoded in this format.
+    """
+    extension = extension.lower()
+    params = get_write_params(extension, png_compression, png_strategy,
+                              tiff_compression)
+    success, data = cv2.imencode(extension, image, params)
+    if not success:
+        raise ValueError(f"Cannot encode the image as '{extension}'.")
+    return data.tobytes()
+
+
+def write_image(path: str, image: np.ndarray,
+                png_compression: int = None,
+                png_strategy: str = None,
+                tiff_compression: str = None) -> None:
+    """
+    Writes a whole image, with the format given by the extension of the
+    path. Lossy formats such as JPEG destroy a hidden payload, so encoded
+    images should use one of LOSSLESS_FORMATS.
+
+    Parameters:
+    - path: Path of the image.
+    - image: The image in BGR order.
+    - png_compression, png_strategy, tiff_compression: See
+      get_write_params.
+
+    Raises:
+    - ValueError: If the image cannot be written.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".npy":
+        np.save(path, image)
+        return
+    params = get_write_params(extension, png_compression, png_strategy,
+                              tiff_compression)
+    if not cv2.imwrite(path, image, params):
+        raise ValueError(f"Cannot write image '{path}'.")
+
+
+def iter_bands(path: str, band_rows: int = DEFAULT_BAND_ROWS):
+    """
+    Reads an image as consecutive bands of rows.
+
+    PPM pixels are returned in BGR order, as cv2.imread does.
+
+    Parameters:
+    - path: Path of a PPM or .npy image.
+    - band_rows: Maximum number of rows of each band.
+
+    Yields:
+    - Writable arrays of shape (rows, width, channels).
+    """
+    if band_rows <= 0:
+        raise ValueError("band_rows must be a positive integer.")
+
+    if _get_format(path) == ".npy":
+        image = np.load(path, mmap_mode="r")
+        for row in range(0, image.shape[0], band_rows):
+            yield np.array(image[row:row + band_rows])
+        return
+
+    with open(path, "rb") as file:
+        height, width, channels = _read_ppm_header(file)
+        for row in range(0, height, band_rows):
+            rows = min(band_rows, height - row)
+            band = np.empty((rows, width, channels), dtype=np.uint8)
+            if file.readinto(band) != band.nbytes:
+                raise ValueError("Truncated PPM image.")
+            yield cv2.cvtColor(band, cv2.COLOR_RGB2BGR, dst=band)
+
+
+def map_image(path: str, mode: str = "r",
+              shape: tuple = None) -> np.memmap:
+    """
+    Maps an uncompressed image file in memory, without reading it.
+
+    Pixels are only loaded from disk when accessed and, in "r+" mode,
+    changes are written back to the file. PPM pixels are exposed in BGR
+    order, as cv2.imread does, through a view over the RGB file.
+
+    Parameters:
+    - path: Path of a PPM, .npy or raw image.
+    - mode: "r" for read-only access or "r+" for read-write access.
+    - shape: Shape (height, width, channels) of raw images, which have no
+      header.
+
+    Returns:
+    - A memory-mapped array of shape (height, width, channels).
+    """
+    extension = _get_format(path, MAP_FORMATS)
+    if extension == ".npy":
+        return np.load(path, mmap_mode=mode)
+    if extension == ".raw":
+        if shape is None:
+            raise ValueError("Raw images require their shape.")
+        return np.memmap(path, dtype=np.uint8, mode=mode, shape=shape)
+    with open(path, "rb") as file:
+        shape = _read_ppm_header(file)
+        offset = file.tell()
+    image = np.memmap(path, dtype=np.uint8, mode=mode,
+                      offset=offset, shape=shape)
+    return image[..., ::-1]
+
+
+def create_mapped_image(path: str, shape: tuple) -> np.memmap:
+    """
+    Creates an uncompressed image file and maps it in memory.
+
+    Parameters:
+    - path: Path of the PPM, .npy or raw image to be created.
+    - shape: Shape (height, width, channels) of the image.
+
+    Returns:
+    - A zero-filled, writable memory-mapped array, in BGR order for PPM.
+    """
+    extension = _get_format(path, MAP_FORMATS)
+    if extension == ".npy":
+        return np.lib.format.open_memmap(path, mode="w+", dtype=np.uint8,
+                                         shape=tuple(shape))
+    if extension == ".raw":
+        return np.memmap(path, dtype=np.uint8, mode="w+", shape=shape)
+    BandWriter(path, shape).close()
+    with open(path, "r+b") as file:
+        file.truncate(file.seek(0, os.SEEK_END) + int(np.prod(shape)))
+    return map_image(path, mode="r+")
+
+
+class BandWriter:
+    """
+    Writes an image band by band, as a PPM or .npy file.
+    """
+    def __init__(self, path: str, shape: tuple):
+        """
+        Opens the file and writes its header.
+
+        Parameters:
+        - path: Path of the output PPM or .npy image.
+        - shape: Shape (height, width, channels) of the whole image.
+        """
+        self.format = _get_format(path)
+        self.file = open(path, "wb")
+        height, width, channels = shape
+        if self.format == ".npy":
+            header = {"descr": np.lib.format.dtype_to_descr(
+                          np.dtype(np.uint8)),
+                      "fortran_order": False,
+                      "shape": tuple(shape)}
+            np.lib.format.write_array_header_1_0(self.file, header)
+        else:
+            if channels != 3:
+                raise ValueError("PPM images must have 3 channels.")
+            self.file.write(f"P6\n{width} {height}\n255\n".encode())
+
+    def write(self, band: np.ndarray) -> None:
+        """
+        Appends a band of rows to the image.
+
+        Parameters:
+        - band: Array of shape (rows, width, channels), in BGR order for
+          PPM images.
+        """
+        band = np.ascontiguousarray(band, dtype=np.uint8)
+        if self.format == ".ppm":
+            band = cv2.cvtColor(band, cv2.COLOR_BGR2RGB)
+        self.file.write(band.tobytes())
+
+    def close(self) -> None:
+        """
+        Closes the output file.
+        """
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def encode_file(model, cover_path: str,
+                hidden_image: np.ndarray,
+                output_path: str,
+                band_rows: int = DEFAULT_BAND_ROWS) -> None:
+    """
+    Encodes the hidden image into a cover file, band by band.
+
+    Parameters:
+    - model: A Steganography instance.
+    - cover_path: Path of the PPM or .npy cover image.
+    - hidden_image: Image to be hidden.
+    - output_path: Path of the PPM or .npy encoded image.
+    - band_rows: Maximum number of rows held in memory.
+    """
+    shape = get_image_shape(cover_path)
+    with BandWriter(output_path, shape) as writer:
+        for band in model.encode_stream(iter_bands(cover_path, band_rows),
+                                        hidden_image, shape):
+            writer.write(band)
+
+
+def decode_file(model, path: str,
+                band_rows: int = DEFAULT_BAND_ROWS) -> np.ndarray:
+    """
+    Decodes the hidden image from an encoded file, band by band.
+
+    Parameters:
+    - model: A Steganography instance.
+    - path: Path of the PPM or .npy encoded image.
+    - band_rows: Maximum number of rows held in memory.
+
+    Returns:
+    - The hidden image as uint8.
+    """
+    return model.decode_stream(iter_bands(path, band_rows),
+                               shape=get_image_shape(path))
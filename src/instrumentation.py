@@ -0,0 +1,184 @@
+"""
+Instrumentation.py
+
+This module records the wall time, bytes processed and peak memory
+allocation of each stage of an encode or decode (resizing, header, payload,
+image I/O...), and exports them as a dictionary, structured log lines or
+Prometheus text.
+
+"""
+import contextlib
+import time
+import tracemalloc
+
+PROMETHEUS_PREFIX = "steganography"
+
+
+class Profiler:
+    """
+    Observer passed to Steganography (and used around image I/O) that
+    records one entry per stage.
+    """
+    def __init__(self, trace_memory: bool = True,
+                 callback=None,
+                 logger=None):
+        """
+        Creates an empty profiler.
+
+        Parameters:
+        - trace_memory: Whether the peak allocation of each stage is
+          measured with tracemalloc, which slows down Python allocations.
+        - callback: Function called with each record, when its stage ends.
+        - logger: A logging.Logger where each record is written as a
+          structured log line, at the INFO level.
+        """
+        self.trace_memory = trace_memory
+        self.callback = callback
+        self.logger = logger
+        self.records = []
+        self._stack = []
+
+    @contextlib.contextmanager
+    def stage(self, name: str, nbytes: int = 0):
+        """
+        Context manager recording a stage. Stages can be nested, the peak
+        allocation of a stage including the one of its inner stages.
+
+        Parameters:
+        - name: Name of the stage, e.g. "encode_image".
+        - nbytes: Number of bytes processed by the stage.
+        """
+        started_tracing = False
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                self._stack[-1]["peak"] = max(self._stack[-1]["peak"], peak)
+            tracemalloc.reset_peak()
+            self._stack.append({"start": current, "peak": current})
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record = {"stage": name,
+                      "seconds": time.perf_counter() - start,
+                      "bytes": int(nbytes),
+                      "peak_bytes": None}
+            if self.trace_memory:
+                entry = self._stack.pop()
+                peak = max(tracemalloc.get_traced_memory()[1], entry["peak"])
+                record["peak_bytes"] = peak - entry["start"]
+                if self._stack:
+                    self._stack[-1]["peak"] = max(self._stack[-1]["peak"],
+                                                  peak)
+                if started_tracing:
+                    tracemalloc.stop()
+            self.records.append(record)
+            if self.callback is not None:
+                self.callback(record)
+            if self.logger is not None:
+                self.logger.info(format_log_line(record))
+
+    def reset(self) -> None:
+        """
+        Removes all the records.
+        """
+        self.records = []
+
+    def to_dict(self) -> dict:
+        """
+        Sums the records of each stage.
+
+        Returns:
+        - A dictionary by stage name, in order of first appearance, with
+          the number of "calls", the total "seconds" and "bytes" and the
+          largest "peak_bytes".
+        """
+        stages = {}
+        for record in self.records:
+            summary = stages.setdefault(record["stage"],
+                                        {"calls": 0, "seconds": 0.0,
+                                         "bytes": 0, "peak_bytes": None})
+            summary["calls"] += 1
+            summary["seconds"] += record["seconds"]
+            summary["bytes"] += record["bytes"]
+            if record["peak_bytes"] is not None:
+                summary["peak_bytes"] = max(summary["peak_bytes"] or 0,
+                                            record["peak_bytes"])
+        return stages
+
+    def to_log_lines(self) -> list:
+        """
+        Formats each record as a structured (logfmt) log line.
+
+        Returns:
+        - A list of lines, e.g. "stage=embed_header seconds=0.000120
+          bytes=7500 peak_bytes=1024".
+        """
+        return [format_log_line(record) for record in self.records]
+
+    def to_prometheus(self, prefix: str = PROMETHEUS_PREFIX) -> str:
+        """
+        Formats the summary of each stage in the Prometheus text format.
+
+        Parameters:
+        - prefix: Prefix of the metric names.
+
+        Returns:
+        - The metrics, one line per stage and metric.
+        """
+        metrics = (("calls", "stage_calls_total", "counter",
+                    "Number of times each stage ran."),
+                   ("seconds", "stage_seconds_total", "counter",
+                    "Wall time spent in each stage."),
+                   ("bytes", "stage_bytes_total", "counter",
+                    "Bytes processed by each stage."),
+                   ("peak_bytes", "stage_peak_bytes", "gauge",
+                    "Largest memory allocation peak of each stage."))
+        stages = self.to_dict()
+        lines = []
+        for key, name, metric_type, description in metrics:
+            lines.append(f"# HELP {prefix}_{name} {description}")
+            lines.append(f"# TYPE {prefix}_{name} {metric_type}")
+            for stage, summary in stages.items():
+                if summary[key] is not None:
+                    lines.append(f'{prefix}_{name}{{stage="{stage}"}} '
+                                 f'{summary[key]}')
+        return "\n".join(lines) + "\n"
+
+
+def format_log_line(record: dict) -> str:
+    """
+    Formats a record as a structured (logfmt) log line.
+
+    Parameters:
+    - record: A record of Profiler.records.
+
+    Returns:
+    - The line, with one key=value pair per field.
+    """
+    fields = [f"stage={record['stage']}",
+              f"seconds={record['seconds']:.6f}",
+              f"bytes={record['bytes']}"]
+    if record["peak_bytes"] is not None:
+        fields.append(f"peak_bytes={record['peak_bytes']}")
+    return " ".join(fields)
+
+
+def stage(profiler, name: str, nbytes: int = 0):
+    """
+    Records a stage when a profiler is given.
+
+    Parameters:
+    - profiler: A Profiler, or None.
+    - name: Name of the stage.
+    - nbytes: Number of bytes processed by the stage.
+
+    Returns:
+    - A context manager, which does nothing without profiler.
+    """
+    if profiler is None:
+        return contextlib.nullcontext()
+    return profiler.stage(name, nbytes)
@@ -1,10 +1,168 @@
 """
-This module provides a class to calculate the
-Peak Signal-to-Noise Ratio (PSNR) for comparing the
+This module provides functions to calculate the
+Peak Signal-to-Noise Ratio (PSNR), the mean squared error (MSE)
+and the structural similarity (SSIM) for comparing the
 quality of two images.
+
+Errors are accumulated in float64, chunk by chunk, so uint8 images
+do not wrap around and no full-size temporary array is allocated.
 """
+from concurrent.futures import ThreadPoolExecutor
+import cv2
 import numpy as np
 
+# Number of samples processed at once
+CHUNK_SIZE = 1 << 20
+# Gaussian window of the SSIM, as in Wang et al. (2004)
+SSIM_WINDOW = 11
+SSIM_SIGMA = 1.5
+SSIM_K1 = 0.01
+SSIM_K2 = 0.03
+METRICS = ("mse", "psnr", "channel_psnr", "ssim")
+
+
+def get_data_range(image: np.ndarray) -> float:
+    """
+    Returns the peak value of an image, from its data type.
+
+    Args:
+        image (numpy.ndarray): The image.
+
+    Returns:
+        float: 255 for uint8 images, the largest value of other integer
+        types, and 1.0 for float images.
+    """
+    if np.issubdtype(image.dtype, np.integer):
+        return float(np.iinfo(image.dtype).max)
+    return 1.0
+
+
+def _iter_chunks(image_src: np.ndarray, image_ref: np.ndarray,
+                 chunk_size: int = CHUNK_SIZE):
+    """
+    Splits two images of the same shape into bands of rows.
+
+    Args:
+        image_src (numpy.ndarray): Source image.
+        image_ref (numpy.ndarray): Reference image.
+        chunk_size (int): Approximate number of samples of each band.
+
+    Yields:
+        tuple: Bands of both images, as views when possible.
+    """
+    if image_src.ndim == 0:
+        yield image_src.reshape(1), image_ref.reshape(1)
+        return
+    row_size = max(image_src[:1].size, 1)
+    rows = max(chunk_size // row_size, 1)
+    for row in range(0, image_src.shape[0], rows):
+        yield image_src[row:row + rows], image_ref[row:row + rows]
+
+
+class PSNRAccumulator:
+    """
+    Accumulates the squared error of two images given band by band, e.g.
+    while they are streamed from disk.
+    """
+    def __init__(self, data_range: float = None):
+        """
+        Creates an empty accumulator.
+
+        Args:
+            data_range (float): Peak value of the images. Default is the
+            peak of the data type of the first band.
+        """
+        self.data_range = data_range
+        self.squared_error = None
+        self.count = 0
+
+    def update(self, band_src: np.ndarray, band_ref: np.ndarray) -> None:
+        """
+        Adds a pair of bands.
+
+        Args:
+            band_src (numpy.ndarray): Band of the source image.
+            band_ref (numpy.ndarray): Band of the reference image, of the
+            same shape.
+        """
+        if self.data_range is None:
+            self.data_range = get_data_range(band_src)
+        channels = band_src.shape[-1] if band_src.ndim == 3 else 1
+        if self.squared_error is None:
+            self.squared_error = np.zeros(channels)
+        for chunk_src, chunk_ref in _iter_chunks(band_src, band_ref):
+            difference = np.subtract(chunk_src, chunk_ref,
+                                     dtype=np.float64).reshape(-1, channels)
+            # Strided BLAS dot products are faster than einsum
+            for channel in range(channels):
+                self.squared_error[channel] += np.dot(difference[:, channel],
+                                                      difference[:, channel])
+            self.count += difference.shape[0]
+
+    @property
+    def channel_mse(self) -> np.ndarray:
+        """
+        numpy.ndarray: Mean squared error of each channel.
+        """
+        return self.squared_error / self.count
+
+    @property
+    def mse(self) -> float:
+        """
+        float: Mean squared error over all the samples.
+        """
+        return float(self.squared_error.sum() / (self.count *
+                                                 self.squared_error.size))
+
+    @property
+    def channel_psnr(self) -> np.ndarray:
+        """
+        numpy.ndarray: PSNR of each channel, inf for identical channels.
+        """
+        return np.array([_get_psnr(mse, self.data_range)
+                         for mse in self.channel_mse])
+
+    @property
+    def psnr(self) -> float:
+        """
+        float: PSNR over all the samples, inf for identical images.
+        """
+        return _get_psnr(self.mse, self.data_range)
+
+
+def _get_psnr(mse: float, data_range: float) -> float:
+    """
+    Converts a mean squared error into a PSNR.
+
+    Args:
+        mse (float): The mean squared error.
+        data_range (float): Peak value of the images.
+
+    Returns:
+        float: The PSNR in dB, inf when the error is zero.
+    """
+    if mse == 0:
+        return float('inf')
+    return float(10 * np.log10(data_range ** 2 / mse))
+
+
+def _accumulate(image_src: np.ndarray, image_ref: np.ndarray,
+                data_range: float = None) -> PSNRAccumulator:
+    """
+    Accumulates the squared error of two whole images.
+
+    Args:
+        image_src (numpy.ndarray): Source image.
+        image_ref (numpy.ndarray): Reference image.
+        data_range (float): Peak value of the images.
+
+    Returns:
+        PSNRAccumulator: The accumulated error.
+    """
+    accumulator = PSNRAccumulator(data_range)
+    accumulator.update(image_src, image_ref)
+    return accumulator
+
 
 def compute_mean_squared_error(image_src: np.ndarray,
                                image_ref: np.ndarray) -> float:
@@ -23,37 +181,187 @@ def compute_mean_squared_error(image_src: np.ndarray,
     if image_src.shape != image_ref.shape:
         return float('-inf')
 
-    # Compute the mean squared error
-    mse = np.mean((image_src - image_ref) ** 2)
-    return mse
+    return _accumulate(image_src, image_ref).mse
 
 
-def compute_psnr(image_src: np.ndarray, image_ref: np.ndarray) -> float:
+def compute_psnr(image_src: np.ndarray, image_ref: np.ndarray,
+                 data_range: float = None) -> float:
     """
     Computes the Peak Signal-to-Noise Ratio (PSNR) between two images.
 
     Args:
         image_src (numpy.ndarray): Source image.
         image_ref (numpy.ndarray): Reference image.
+        data_range (float): Peak value of the images. Default is the peak
+        of the data type (255 for uint8 images).
 
     Returns:
-        float: The PSNR value between the two images,
-        or -inf if the images have different shapes.
+        float: The PSNR value between the two images, inf if they
+        are identical, or -inf if the images have different shapes.
     """
     # Check if the images have the same shape
     if image_src.shape != image_ref.shape:
         return float('-inf')
 
-    # Compute the mean squared error between the images
-    mse = compute_mean_squared_error(image_src, image_ref)
+    return _accumulate(image_src, image_ref, data_range).psnr
 
-    # Compute the range of pixel values in the source image
-    pixel_range = np.max(image_src) - np.min(image_src)
 
-    if pixel_range == 0:
-        return float('-inf')
+def compute_channel_psnr(image_src: np.ndarray, image_ref: np.ndarray,
+                         data_range: float = None) -> np.ndarray:
+    """
+    Computes the PSNR of each channel of two images.
+
+    Args:
+        image_src (numpy.ndarray): Source image.
+        image_ref (numpy.ndarray): Reference image, of the same shape.
+        data_range (float): Peak value of the images.
+
+    Returns:
+        numpy.ndarray: The PSNR of each channel.
+
+    Raises:
+        ValueError: If the images have different shapes.
+    """
+    if image_src.shape != image_ref.shape:
+        raise ValueError("The images must have the same shape.")
+    return _accumulate(image_src, image_ref, data_range).channel_psnr
+
+
+def compute_ssim(image_src: np.ndarray, image_ref: np.ndarray,
+                 data_range: float = None,
+                 band_rows: int = 256) -> float:
+    """
+    Computes the mean structural similarity (SSIM) between two images,
+    with an 11x11 Gaussian window, averaged over the channels. The SSIM
+    map is computed band by band, so only a band of float32 temporaries
+    is held in memory.
+
+    Args:
+        image_src (numpy.ndarray): Source image.
+        image_ref (numpy.ndarray): Reference image, of the same shape.
+        data_range (float): Peak value of the images.
+        band_rows (int): Number of rows of each band.
+
+    Returns:
+        float: The SSIM, 1.0 for identical images.
+
+    Raises:
+        ValueError: If the images have different shapes.
+    """
+    if image_src.shape != image_ref.shape:
+        raise ValueError("The images must have the same shape.")
+    if data_range is None:
+        data_range = get_data_range(image_src)
+    c1 = (SSIM_K1 * data_range) ** 2
+    c2 = (SSIM_K2 * data_range) ** 2
+    margin = SSIM_WINDOW // 2
+    height = image_src.shape[0]
+
+    def blur(image):
+        return cv2.GaussianBlur(image, (SSIM_WINDOW, SSIM_WINDOW),
+                                SSIM_SIGMA)
+
+    total = 0.0
+    for row in range(0, height, band_rows):
+        # Extra rows around the band give the window its real neighbours
+        start = max(row - margin, 0)
+        stop = min(row + band_rows + margin, height)
+        x = image_src[start:stop].astype(np.float32)
+        y = image_ref[start:stop].astype(np.float32)
+        mu_x = blur(x)
+        mu_y = blur(y)
+        sigma_x = blur(x * x) - mu_x * mu_x
+        sigma_y = blur(y * y) - mu_y * mu_y
+        sigma_xy = blur(x * y) - mu_x * mu_y
+        ssim_map = ((2 * mu_x * mu_y + c1) * (2 * sigma_xy + c2)) / \
+            ((mu_x * mu_x + mu_y * mu_y + c1) * (sigma_x + sigma_y + c2))
+        interior = ssim_map[row - start:row - start + band_rows]
+        total += float(interior.sum(dtype=np.float64))
+    return total / image_src.size
+
+
+def compute_metrics(image_src: np.ndarray, image_ref: np.ndarray,
+                    metrics: tuple = ("mse", "psnr"),
+                    data_range: float = None) -> dict:
+    """
+    Computes several quality metrics between two images, reading the
+    images once for the MSE based metrics.
 
-    # Compute the PSNR value
-    psnr = 10 * np.log10((pixel_range ** 2) / mse)
+    Args:
+        image_src (numpy.ndarray): Source image.
+        image_ref (numpy.ndarray): Reference image, of the same shape.
+        metrics (tuple): Metrics among "mse", "psnr", "channel_psnr" and
+        "ssim".
+        data_range (float): Peak value of the images.
+
+    Returns:
+        dict: The value of each metric.
+
+    Raises:
+        ValueError: If a metric is unknown or the images have different
+        shapes.
+    """
+    unknown = set(metrics) - set(METRICS)
+    if unknown:
+        raise ValueError(f"Unknown metrics {sorted(unknown)}, "
+                         f"expected some of {METRICS}.")
+    if image_src.shape != image_ref.shape:
+        raise ValueError("The images must have the same shape.")
+    output = {}
+    if {"mse", "psnr", "channel_psnr"} & set(metrics):
+        accumulator = _accumulate(image_src, image_ref, data_range)
+        for metric in {"mse", "psnr", "channel_psnr"} & set(metrics):
+            output[metric] = getattr(accumulator, metric)
+        if "channel_psnr" in output:
+            output["channel_psnr"] = output["channel_psnr"].tolist()
+    if "ssim" in metrics:
+        output["ssim"] = compute_ssim(image_src, image_ref, data_range)
+    return {metric: output[metric] for metric in metrics}
+
+
+def _load_pair(pair) -> tuple:
+    """
+    Loads a pair of images given as arrays or paths.
+
+    Args:
+        pair (tuple): Two images, as numpy arrays or paths.
+
+    Returns:
+        tuple: The two images as numpy arrays.
+
+    Raises:
+        FileNotFoundError: If an image cannot be read.
+    """
+    images = []
+    for image in pair:
+        if isinstance(image, str):
+            path, image = image, cv2.imread(image)
+            if image is None:
+                raise FileNotFoundError(f"Cannot read image '{path}'.")
+        images.append(image)
+    return tuple(images)
+
+
+def compute_batch(pairs, metrics: tuple = ("mse", "psnr"),
+                  workers: int = None,
+                  data_range: float = None) -> list:
+    """
+    Scores many (cover, stego) pairs in a pool of threads; NumPy and
+    OpenCV release the GIL while they compute.
+
+    Args:
+        pairs (iterable): Pairs of images, as numpy arrays or paths.
+        metrics (tuple): Metrics among "mse", "psnr", "channel_psnr" and
+        "ssim".
+        workers (int): Number of threads. Default is chosen by
+        concurrent.futures.
+        data_range (float): Peak value of the images.
+
+    Returns:
+        list: The metrics of each pair, in order.
+    """
+    def score(pair):
+        return compute_metrics(*_load_pair(pair), metrics, data_range)
 
-    return psnr
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(score, pairs))
@@ -0,0 +1,115 @@
+"""
+Scan.py
+
+This module tells which image files of an archive carry a payload. Only
+the first row of each file is read: its header must have the magic
+value, a matching checksum and valid parameters, and the image must be
+large enough for the payload it describes. The payload region itself is
+never read, so thousands of files are classified per second.
+
+Images encoded before the parameters word was recorded (format version
+0) have no magic value and cannot be told apart from images without a
+payload; they are reported as "none".
+
+"""
+import os
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+import image_io
+from steganography import Steganography
+
+SCAN_FIELDS = ("path", "status", "version", "kind", "error")
+# Formats whose first row is read without decoding the whole image
+FIRST_ROW_FORMATS = (".png",) + image_io.STREAM_FORMATS
+
+
+def read_first_row(path: str) -> tuple:
+    """
+    Reads the first row of an image file, decoding as little as possible.
+
+    Parameters:
+    - path: Path of the image. PNG images are partly decompressed, PPM and
+      .npy images are memory-mapped; other formats are read entirely.
+
+    Returns:
+    - The first row, of shape (1, width, channels), and the shape of the
+      whole image.
+
+    Raises:
+    - ValueError: If the image is not a uint8 array with channels, which
+      can hold no payload.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".png":
+        first_row = image_io.read_png_rows(path, 1)
+        shape = image_io.get_image_shape(path)
+    else:
+        if extension in FIRST_ROW_FORMATS:
+            image = image_io.map_image(path)
+        else:
+            image = image_io.read_image(path)
+        first_row, shape = image[:1], image.shape
+    if first_row.ndim != 3 or first_row.dtype != np.uint8:
+        raise ValueError("Not a uint8 image with channels "
+                         f"({first_row.dtype}, {first_row.ndim} "
+                         "dimensions).")
+    return first_row, shape
+
+
+def scan_file(model: Steganography, path: str) -> dict:
+    """
+    Classifies one image file.
+
+    Parameters:
+    - model: The Steganography instance reading the header.
+    - path: Path of the image.
+
+    Returns:
+    - The result, with the keys of SCAN_FIELDS. The status is "payload"
+      when the image holds a valid header, "none" when it does not (the
+      error tells why) and "error" when the file cannot be read.
+    """
+    result = {"path": path, "status": "none", "version": None,
+              "kind": None, "error": None}
+    try:
+        first_row, shape = read_first_row(path)
+    except (OSError, ValueError, struct.error, zlib.error,
+            cv2.error) as error:
+        result.update(status="error", error=str(error))
+        return result
+    try:
+        header = model.peek_header(first_row)
+        if header["version"] == 0:
+            raise ValueError("No header magic value.")
+        model.check_header(header, shape)
+    except ValueError as error:
+        result["error"] = str(error)
+        return result
+    result.update(status="payload", version=header["version"],
+                  kind=header["kind"])
+    return result
+
+
+def scan(paths, model: Steganography = None,
+         workers: int = None) -> list:
+    """
+    Classifies image files by whether they carry a payload, in a pool of
+    threads (reading and decompressing the first rows release the GIL).
+
+    Parameters:
+    - paths: The paths of the images.
+    - model: The Steganography instance reading the headers. Default is
+      a new one.
+    - workers: Number of threads. Default is the number of CPUs.
+
+    Returns:
+    - The results of scan_file, in the order of the paths.
+    """
+    model = model if model is not None else Steganography()
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) \
+            as executor:
+        return list(executor.map(lambda path: scan_file(model, path),
+                                 paths))
@@ -0,0 +1,117 @@
+"""
+Scatter.py
+
+This module provides the keyed permutation spreading the payload samples
+over a cover. A Feistel network over the smallest even number of bits
+covering the index range, restricted to the range by cycle walking, maps
+any payload sample to its cover sample in O(1): positions are computed
+for the samples being embedded only, without storing a shuffled index
+array.
+
+"""
+import hashlib
+import numpy as np
+
+# Number of Feistel rounds
+ROUNDS = 4
+PERSON = b"stego-scatter"
+# Odd multipliers of the round function (from splitmix64)
+MIX_CONSTANTS = (np.uint64(0x9E3779B97F4A7C15), np.uint64(0xBF58476D1CE4E5B9))
+
+
+def normalize_key(key) -> bytes:
+    """
+    Converts a password to bytes.
+
+    Parameters:
+    - key: The password, as text (encoded in UTF-8) or bytes.
+
+    Returns:
+    - The key as bytes.
+
+    Raises:
+    - ValueError: If the key is empty.
+    - TypeError: If the key is neither text nor bytes.
+    """
+    if isinstance(key, str):
+        key = key.encode("utf-8")
+    if not isinstance(key, (bytes, bytearray)):
+        raise TypeError("The key must be text or bytes.")
+    if not key:
+        raise ValueError("The key must not be empty.")
+    return bytes(key)
+
+
+def get_key_id(key: bytes) -> str:
+    """
+    Fingerprints a key, e.g. to tell cached results apart, without
+    revealing it.
+
+    Parameters:
+    - key: The key, from normalize_key.
+
+    Returns:
+    - A hexadecimal digest of the key.
+    """
+    return hashlib.blake2b(key, digest_size=8, person=b"stego-key-id")\
+        .hexdigest()
+
+
+class FeistelPermutation:
+    """
+    Keyed bijection of range(size), evaluated on arrays of indices.
+    """
+    def __init__(self, key: bytes, size: int, tweak: int = 0):
+        """
+        Derives the round keys.
+
+        Parameters:
+        - key: The key, from normalize_key.
+        - size: Number of indices permuted.
+        - tweak: Number selecting an independent permutation for the same
+          key, e.g. the payload stream.
+        """
+        self.size = size
+        self.half_bits = max(1, -(-max(size - 1, 1).bit_length() // 2))
+        self.mask = np.uint64((1 << self.half_bits) - 1)
+        digest = hashlib.blake2b(key, digest_size=8 * ROUNDS, person=PERSON,
+                                 salt=tweak.to_bytes(16, "little")).digest()
+        self.round_keys = [np.uint64(int.from_bytes(digest[8 * index:
+                                                           8 * index + 8],
+                                                    "little"))
+                           for index in range(ROUNDS)]
+
+    def _round(self, half: np.ndarray, round_key: np.uint64) -> np.ndarray:
+        # Multiply-xorshift-multiply of the keyed half, keeping the high
+        # bits of the product, which depend on all the input bits
+        value = (half ^ round_key) * MIX_CONSTANTS[0]
+        value ^= value >> np.uint64(29)
+        value *= MIX_CONSTANTS[1]
+        value >>= np.uint64(64 - self.half_bits)
+        return value
+
+    def _encrypt(self, indices: np.ndarray) -> np.ndarray:
+        shift = np.uint64(self.half_bits)
+        left, right = indices >> shift, indices & self.mask
+        for round_key in self.round_keys:
+            left, right = right, left ^ self._round(right, round_key)
+        return (left << shift) | right
+
+    def permute(self, indices: np.ndarray) -> np.ndarray:
+        """
+        Maps indices to their permuted positions.
+
+        Parameters:
+        - indices: Array of distinct indices in range(size).
+
+        Returns:
+        - The positions, distinct and in range(size), as uint64.
+        """
+        positions = self._encrypt(np.asarray(indices, dtype=np.uint64))
+        # Cycle walking: the network permutes up to 4 * size values, so
+        # outputs past the range are encrypted again, a few times at most
+        outside = np.flatnonzero(positions >= self.size)
+        while outside.size:
+            positions[outside] = self._encrypt(positions[outside])
+            outside = outside[positions[outside] >= self.size]
+        return positions
@@ -0,0 +1,430 @@
+"""
+Service.py
+
+This module provides an asyncio API to encode and decode images in a
+bounded pool of worker threads or processes, with request queuing,
+backpressure and cancellation, and a small HTTP entry point built on
+asyncio streams that accepts PNG uploads.
+
+"""
+import asyncio
+import json
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from email.parser import BytesParser
+from email.policy import HTTP
+import numpy as np
+import image_io
+from steganography import Steganography
+
+EXECUTORS = ("thread", "process")
+DEFAULT_MAX_PENDING = 32
+MAX_BODY_SIZE = 64 << 20
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found",
+               405: "Method Not Allowed", 413: "Payload Too Large",
+               500: "Internal Server Error", 503: "Service Unavailable"}
+
+# Steganography instances of the current worker, by options
+_models = {}
+
+
+class ServiceBusy(RuntimeError):
+    """
+    Raised when a request is refused because the service is full.
+    """
+
+
+class _HTTPError(Exception):
+    """
+    Error answered with an HTTP status code.
+    """
+    def __init__(self, status: int, message: str = ""):
+        super().__init__(message or STATUS_TEXT[status])
+        self.status = status
+
+
+def _get_model(options: tuple) -> Steganography:
+    """
+    Returns the Steganography instance of the worker for some options.
+
+    Parameters:
+    - options: Keyword arguments of the constructor, as sorted items.
+
+    Returns:
+    - A Steganography instance, created on first use.
+    """
+    if options not in _models:
+        _models[options] = Steganography(**dict(options))
+    return _models[options]
+
+
+def _read_png(data: bytes) -> np.ndarray:
+    """
+    Decodes an uploaded image.
+
+    Parameters:
+    - data: The encoded image (PNG, or any format OpenCV reads).
+
+    Returns:
+    - The image in BGR order.
+
+    Raises:
+    - ValueError: If the data is not an image.
+    """
+    return image_io.read_image(data)
+
+
+def _write_png(image: np.ndarray) -> bytes:
+    """
+    Encodes an image as PNG.
+
+    Parameters:
+    - image: The image in BGR order.
+
+    Returns:
+    - The PNG file.
+    """
+    return image_io.image_to_bytes(image)
+
+
+def _encode(options: tuple, cover_image: np.ndarray,
+            secret_image: np.ndarray) -> np.ndarray:
+    """
+    Worker function encoding an image.
+    """
+    return _get_model(options).encode(cover_image, secret_image)
+
+
+def _decode(options: tuple, image: np.ndarray):
+    """
+    Worker function decoding an image.
+    """
+    return _get_model(options).decode(image)
+
+
+def _encode_png(options: tuple, cover_png: bytes,
+                secret_png: bytes) -> bytes:
+    """
+    Worker function encoding uploaded images, PNG compression included.
+    """
+    # The decoded cover is not shared, so it is encoded in place
+    return _write_png(_get_model(options).encode(
+        _read_png(cover_png), _read_png(secret_png), inplace=True))
+
+
+def _decode_png(options: tuple, image_png: bytes) -> tuple:
+    """
+    Worker function decoding an uploaded image.
+
+    Returns:
+    - The secret, as PNG or as the hidden bytes, and its content type.
+    """
+    secret = _decode(options, _read_png(image_png))
+    if isinstance(secret, bytes):
+        return secret, "application/octet-stream"
+    return _write_png(secret), "image/png"
+
+
+class SteganographyService:
+    """
+    Runs encode and decode requests in a bounded pool of workers.
+
+    At most max_pending requests are admitted at once (running or queued
+    in the pool); further requests wait for a slot or, with wait=False,
+    are refused with ServiceBusy. Cancelling a request that has not
+    started yet removes it from the pool queue.
+    """
+    def __init__(self, options: dict = None,
+                 workers: int = None,
+                 max_pending: int = DEFAULT_MAX_PENDING,
+                 executor: str = "thread"):
+        """
+        Creates the service and its pool.
+
+        Parameters:
+        - options: Keyword arguments of the Steganography constructor.
+        - workers: Number of worker threads or processes. Default is
+          chosen by concurrent.futures.
+        - max_pending: Maximum number of admitted requests.
+        - executor: "thread" or "process".
+
+        Raises:
+        - ValueError: If the executor or the options are invalid.
+        """
+        if executor not in EXECUTORS:
+            raise ValueError(f"Unknown executor '{executor}', "
+                             f"expected one of {EXECUTORS}.")
+        if max_pending <= 0:
+            raise ValueError("max_pending must be a positive integer.")
+        self.options = tuple(sorted((options or {}).items()))
+        # Fails early on invalid options
+        Steganography(**dict(self.options))
+        self.max_pending = max_pending
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self._slots = asyncio.Semaphore(max_pending)
+        if executor == "thread":
+            self.executor = ThreadPoolExecutor(max_workers=workers)
+        else:
+            self.executor = ProcessPoolExecutor(max_workers=workers)
+
+    async def run(self, function, *args, wait: bool = True):
+        """
+        Runs a worker function in the pool, as function(options, *args).
+
+        Parameters:
+        - function: A module-level function (picklable for processes).
+        - args: Its arguments after the options.
+        - wait: Whether to wait for a slot when the service is full.
+
+        Returns:
+        - The result of the function.
+
+        Raises:
+        - ServiceBusy: If the service is full and wait is False.
+        """
+        if not wait and self._slots.locked():
+            self.rejected += 1
+            raise ServiceBusy("Too many pending requests.")
+        async with self._slots:
+            self.pending += 1
+            try:
+                loop = asyncio.get_running_loop()
+                result = await loop.run_in_executor(
+                    self.executor, function, self.options, *args)
+            finally:
+                self.pending -= 1
+            self.completed += 1
+            return result
+
+    async def encode(self, cover_image: np.ndarray,
+                     secret_image: np.ndarray,
+                     wait: bool = True) -> np.ndarray:
+        """
+        Encodes the secret image into the cover image.
+
+        Returns:
+        - The encoded image.
+        """
+        return await self.run(_encode, cover_image, secret_image, wait=wait)
+
+    async def decode(self, image: np.ndarray, wait: bool = True):
+        """
+        Decodes the secret image, or bytes, from an encoded image.
+
+        Returns:
+        - The secret image or bytes.
+        """
+        return await self.run(_decode, image, wait=wait)
+
+    async def encode_png(self, cover_png: bytes, secret_png: bytes,
+                         wait: bool = True) -> bytes:
+        """
+        Encodes uploaded images, decoding and compressing them in the
+        pool too.
+
+        Returns:
+        - The encoded image as PNG.
+        """
+        return await self.run(_encode_png, cover_png, secret_png, wait=wait)
+
+    async def decode_png(self, image_png: bytes, wait: bool = True) -> tuple:
+        """
+        Decodes an uploaded encoded image.
+
+        Returns:
+        - The secret as PNG (or the hidden bytes) and its content type.
+        """
+        return await self.run(_decode_png, image_png, wait=wait)
+
+    def get_status(self) -> dict:
+        """
+        Describes the load of the service.
+
+        Returns:
+        - The number of pending, completed and rejected requests and the
+          maximum number of pending requests.
+        """
+        return {"pending": self.pending,
+                "max_pending": self.max_pending,
+                "completed": self.completed,
+                "rejected": self.rejected}
+
+    def close(self) -> None:
+        """
+        Shuts the pool down, dropping the queued requests.
+        """
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        # Waits for the running requests without blocking the event loop
+        await asyncio.to_thread(self.executor.shutdown, True,
+                                cancel_futures=True)
+
+
+async def _read_request(reader: asyncio.StreamReader) -> tuple:
+    """
+    Reads an HTTP/1.1 request.
+
+    Parameters:
+    - reader: The stream of the connection.
+
+    Returns:
+    - The method, path, headers (lower case names) and body.
+
+    Raises:
+    - _HTTPError: If the request is invalid or too large.
+    """
+    try:
+        method, path, _ = (await reader.readline()).decode(
+            "latin-1").split(" ", 2)
+    except ValueError:
+        raise _HTTPError(400)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", 0))
+    if length > MAX_BODY_SIZE:
+        raise _HTTPError(413)
+    body = await reader.readexactly(length)
+    return method, path.split("?")[0], headers, body
+
+
+def _get_files(headers: dict, body: bytes) -> dict:
+    """
+    Extracts the uploaded files of a request.
+
+    Parameters:
+    - headers: Headers of the request.
+    - body: Body of the request, either multipart/form-data or a single
+      raw file.
+
+    Returns:
+    - The files by form field name, or the raw body under "image".
+    """
+    content_type = headers.get("content-type", "")
+    if not content_type.startswith("multipart/form-data"):
+        return {"image": body}
+    message = BytesParser(policy=HTTP).parsebytes(
+        b"Content-Type: " + content_type.encode("latin-1") + b"\r\n\r\n" +
+        body)
+    return {part.get_param("name", header="content-disposition"):
+            part.get_payload(decode=True) for part in message.iter_parts()}
+
+
+async def _route(service: SteganographyService, method: str, path: str,
+                 headers: dict, body: bytes) -> tuple:
+    """
+    Answers a request.
+
+    Returns:
+    - The status, content type and body of the response.
+    """
+    if path == "/health":
+        return 200, "application/json", \
+            json.dumps(service.get_status()).encode()
+    if path not in ("/encode", "/decode"):
+        raise _HTTPError(404)
+    if method != "POST":
+        raise _HTTPError(405)
+    files = _get_files(headers, body)
+    if path == "/encode":
+        if "cover" not in files or "secret" not in files:
+            raise _HTTPError(400, "The cover and secret files are required.")
+        data = await service.encode_png(files["cover"], files["secret"],
+                                        wait=False)
+        return 200, "image/png", data
+    if "image" not in files:
+        raise _HTTPError(400, "The image file is required.")
+    data, content_type = await service.decode_png(files["image"], wait=False)
+    return 200, content_type, data
+
+
+async def _handle(service: SteganographyService,
+                  reader: asyncio.StreamReader,
+                  writer: asyncio.StreamWriter) -> None:
+    """
+    Serves one request per connection.
+    """
+    try:
+        try:
+            status, content_type, data = await _route(
+                service, *await _read_request(reader))
+        except _HTTPError as error:
+            status, content_type, data = error.status, "text/plain", \
+                str(error).encode()
+        except ServiceBusy as error:
+            status, content_type, data = 503, "text/plain", \
+                str(error).encode()
+        except ValueError as error:
+            status, content_type, data = 400, "text/plain", \
+                str(error).encode()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return
+        except Exception as error:
+            status, content_type, data = 500, "text/plain", \
+                f"{type(error).__name__}: {error}".encode()
+        head = (f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(data)}\r\n"
+                "Connection: close\r\n")
+        if status == 503:
+            head += "Retry-After: 1\r\n"
+        writer.write(head.encode("latin-1") + b"\r\n" + data)
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+async def serve(service: SteganographyService,
+                host: str = "127.0.0.1",
+                port: int = 8000) -> asyncio.AbstractServer:
+    """
+    Starts the HTTP entry point of a service.
+
+    Endpoints:
+    - POST /encode: multipart/form-data with the "cover" and "secret"
+      images; answers the encoded PNG image.
+    - POST /decode: the encoded image, raw or as the "image" field of a
+      multipart/form-data body; answers the secret PNG image, or the
+      hidden bytes.
+    - GET /health: the load of the service, as JSON.
+
+    Requests beyond the capacity of the service are answered with 503.
+
+    Parameters:
+    - service: The service running the requests.
+    - host: Address to listen on.
+    - port: Port to listen on, 0 for any free port.
+
+    Returns:
+    - The started asyncio server.
+    """
+    return await asyncio.start_server(
+        lambda reader, writer: _handle(service, reader, writer), host, port)
+
+
+def run_server(host: str = "127.0.0.1", port: int = 8000,
+               **service_options) -> None:
+    """
+    Runs the HTTP entry point until interrupted.
+
+    Parameters:
+    - host: Address to listen on.
+    - port: Port to listen on.
+    - service_options: Keyword arguments of SteganographyService.
+    """
+    async def main():
+        async with SteganographyService(**service_options) as service:
+            server = await serve(service, host, port)
+            async with server:
+                await server.serve_forever()
+
+    asyncio.run(main())
@@ -1,7 +1,48 @@
 """ Module provide a Steganography method for images"""
+import contextlib
+import itertools
+import lzma
 import math
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 import cv2
 import numpy as np
+import backends
+import encryption
+import scatter
+
+RESIZE_MODES = ("square", "capacity")
+LAYOUTS = ("planar", "interleaved")
+PAYLOAD_KINDS = ("image", "bytes")
+CODECS = ("none", "zlib", "lzma")
+MAX_BITS_PER_SAMPLE = 4
+# Smallest number of payload samples of each stream given to a worker
+# thread; smaller payloads are embedded and extracted serially
+PARALLEL_MIN_SAMPLES = 1 << 17
+# Number of scattered payload samples whose positions are computed at once
+SCATTER_BLOCK_SAMPLES = 1 << 16
+# Number of payload samples of a stream embedded or extracted at once,
+# bounding the size of the temporary bit and ciphertext arrays
+BLOCK_SAMPLES = 1 << 18
+
+# The third header word (channel 2) describes how the payload was embedded:
+# bits 31-20 hold HEADER_MAGIC, bits 19-16 the format version and
+# bits 15-14 the number of bits per sample minus one and, from version 2,
+# bit 13 the layout (0 for planar, 1 for interleaved). From version 3,
+# bit 12 holds the payload kind (0 for an image, 1 for bytes) and bits
+# 11-10 the codec of a bytes payload. From version 4, bit 9 is set when the
+# payload samples are scattered over the cover with a key and, from
+# version 5, bit 8 when the payload is encrypted with a password. From
+# version 6, bits 7-0 hold the checksum of the three header words (see
+# get_header_checksum), so that images without payload are rejected after
+# reading the first pixels. A bytes payload stores its length in channel 0
+# and the CRC-32 of the original bytes in channel 1, instead of the height
+# and width of an image.
+HEADER_MAGIC = 0xA53
+HEADER_VERSION = 6
+# Number of set bits of each byte value
+POPCOUNT = np.array([bin(value).count("1") for value in range(256)],
+                    dtype=np.uint8)
 
 
 class Steganography:
@@ -10,7 +51,16 @@ class Steganography:
     """
     def __init__(self, header_size: int = 32,
                  depth: int = 3,
-                 pixel_size: int = 8):
+                 pixel_size: int = 8,
+                 engine: str = "auto",
+                 resize_mode: str = "square",
+                 bits_per_sample: int = 1,
+                 layout: str = "planar",
+                 profiler=None,
+                 workers: int = 1,
+                 key=None,
+                 password=None,
+                 legacy_headers: bool = False):
         """
         Constructor for the Steganography class.
 
@@ -18,10 +68,918 @@ class Steganography:
             header_size (int): Size of the header in bits. Default is 32.
             depth (int): Depth of color channels in the images. Default is 3.
             pixel_size (int): Size of each pixel in bits. Default is 8.
+            engine (str): Implementation used to embed/extract the bits,
+            either "loop" (pixel by pixel, the reference implementation),
+            a backend from backends.get_backends ("numpy", vectorized, or
+            "numba", compiled, when numba is installed) or "auto" (the
+            STEGANOGRAPHY_ENGINE environment variable if set, else the
+            fastest available backend). Default is "auto".
+            resize_mode (str): How the embedded image grows when it is too
+            small, either "square" (width and height multiplied by the
+            missing factor) or "capacity" (smallest aspect-preserving
+            upscale that fits the hidden image). Default is "square".
+            bits_per_sample (int): Number of least significant bits of each
+            cover sample used by the hidden image, from 1 to 4.
+            Default is 1.
+            layout (str): How the hidden image is spread over the embedded
+            image, either "planar" (hidden channel c only in cover channel c)
+            or "interleaved" (the hidden bytes written sequentially over all
+            the cover samples). Default is "planar".
+            profiler (instrumentation.Profiler): Optional observer recording
+            the time, bytes and peak allocation of each stage of encode and
+            decode. Default is None.
+            workers (int): Number of threads splitting the payload of a
+            single image into ranges of rows, embedded and extracted in
+            parallel by a backend engine. The output is identical to the
+            serial path. Default is 1.
+            key (str or bytes): Optional password scattering the payload
+            samples over the whole cover with a keyed permutation (see
+            scatter.py), instead of writing them from the first pixel on.
+            The same key is needed to decode. Scattered payloads are always
+            embedded by a backend and cannot be streamed band by band.
+            Default is None.
+            password (str or bytes): Optional password encrypting the
+            payload (see encryption.py) while it is embedded, chunk by
+            chunk. The same password is needed to decode, and a wrong one
+            is detected by the tag of the payload. Encrypted payloads are
+            always embedded by a backend. Default is None.
+            legacy_headers (bool): Whether to decode images whose header
+            has room for the parameters word but no magic value, as encoded
+            before the parameters were recorded. Such headers cannot be
+            told apart from images without payload, so they are rejected
+            by default. Default is False.
+
+        Raises:
+            ValueError: If the engine, the resize mode or the layout is
+            unknown or unavailable, if bits_per_sample is out of range, if
+            workers is not positive, or if a key or a password is given
+            without a 32 bits header and a pixel size of 8 bits.
         """
+        if engine not in backends.get_engines():
+            raise ValueError(f"Unknown or unavailable engine '{engine}', "
+                             f"expected one of {backends.get_engines()}.")
+        engine = backends.resolve_engine(engine)
+        if resize_mode not in RESIZE_MODES:
+            raise ValueError(f"Unknown resize mode '{resize_mode}', "
+                             f"expected one of {RESIZE_MODES}.")
+        if not 1 <= bits_per_sample <= MAX_BITS_PER_SAMPLE:
+            raise ValueError("bits_per_sample must be between 1 and "
+                             f"{MAX_BITS_PER_SAMPLE}.")
+        if layout not in LAYOUTS:
+            raise ValueError(f"Unknown layout '{layout}', "
+                             f"expected one of {LAYOUTS}.")
+        if (bits_per_sample > 1 or layout != "planar") and header_size != 32:
+            raise ValueError("bits_per_sample greater than 1 and the "
+                             "interleaved layout require a 32 bits header.")
+        if workers < 1:
+            raise ValueError("workers must be at least 1.")
+        if key is not None:
+            key = scatter.normalize_key(key)
+        if password is not None:
+            password = encryption.normalize_password(password)
+        if (key is not None or password is not None) and \
+                (header_size != 32 or pixel_size != 8):
+            raise ValueError("Scattering and encryption require a 32 bits "
+                             "header and a pixel size of 8 bits.")
         self.header_size = header_size
         self.depth = depth
         self.pixel_size = pixel_size
+        self.engine = engine
+        # The loop engine still uses numpy for the paths it does not cover
+        # (bands, bytes payloads, headers of streams)
+        self.backend = backends.get_backend(
+            "numpy" if engine == backends.REFERENCE_ENGINE else engine)
+        self.resize_mode = resize_mode
+        self.bits_per_sample = bits_per_sample
+        self.layout = layout
+        self.profiler = profiler
+        self.workers = workers
+        self.key = key
+        self.key_id = scatter.get_key_id(key) if key is not None else None
+        self.password = password
+        self.legacy_headers = legacy_headers
+
+    def _stage(self, name: str, nbytes: int = 0):
+        """
+        Records a stage in the profiler, if any.
+
+        Args:
+            name (str): Name of the stage.
+            nbytes (int): Number of bytes processed by the stage.
+
+        Returns:
+            A context manager, which does nothing without profiler.
+        """
+        if self.profiler is None:
+            return contextlib.nullcontext()
+        return self.profiler.stage(name, nbytes)
+
+    def _get_output(self, image: np.ndarray,
+                    inplace: bool = False,
+                    out: np.ndarray = None) -> np.ndarray:
+        """
+        Chooses the buffer an encoding method writes into: a copy of the
+        image by default, the image itself when inplace, or out.
+
+        Args:
+            image (numpy.ndarray): The input image.
+            inplace (bool): Whether to modify the input image.
+            out (numpy.ndarray): Preallocated buffer of the same shape and
+            data type as the image, which receives a copy of it.
+
+        Returns:
+            numpy.ndarray: The buffer holding the input image.
+
+        Raises:
+            ValueError: If both inplace and out are given, or out does not
+            match the image.
+        """
+        if inplace and out is not None:
+            raise ValueError("inplace and out are mutually exclusive.")
+        if inplace:
+            return image
+        if out is None:
+            return image.copy()
+        if out.shape != image.shape or out.dtype != image.dtype:
+            raise ValueError(f"out must have the shape {image.shape} and "
+                             f"the data type {image.dtype}.")
+        if out is not image:
+            np.copyto(out, image)
+        return out
+
+    def _get_hidden_buffer(self, shape: tuple,
+                           out: np.ndarray = None) -> np.ndarray:
+        """
+        Allocates the decoded hidden image, or checks the given buffer.
+
+        Args:
+            shape (tuple): Shape (height, width, depth) of the hidden image.
+            out (numpy.ndarray): Optional preallocated buffer.
+
+        Returns:
+            numpy.ndarray: A buffer of that shape, uint8 unless the hidden
+            values need more than 8 bits.
+
+        Raises:
+            ValueError: If out does not match the hidden image.
+        """
+        dtype = np.uint8 if self.pixel_size <= 8 else \
+            np.uint16 if self.pixel_size <= 16 else np.int64
+        if out is None:
+            return np.empty(shape, dtype=dtype)
+        if out.shape != tuple(shape) or out.dtype != dtype or \
+                not out.flags.c_contiguous:
+            raise ValueError(f"out must be a contiguous array of shape "
+                             f"{tuple(shape)} and data type "
+                             f"{np.dtype(dtype)}.")
+        return out
+
+    def _use_numpy(self) -> bool:
+        """
+        Checks whether the vectorized engine can handle the current setup.
+
+        Returns:
+            bool: True if a backend engine is selected and each hidden
+            value fits in one byte.
+        """
+        return self.engine != backends.REFERENCE_ENGINE and \
+            self.pixel_size == 8
+
+    def _embed_bits(self, samples: np.ndarray,
+                    start: int,
+                    bits: np.ndarray,
+                    bits_per_sample: int = 1,
+                    stats: dict = None) -> None:
+        """
+        Writes a sequence of bits into the least significant bits of
+        consecutive samples, most significant bit first.
+
+        Args:
+            samples (numpy.ndarray): 1-D view over the cover samples,
+            modified in place.
+            start (int): Index of the first sample to be modified.
+            bits (numpy.ndarray): Bits (0 or 1) to be written.
+            bits_per_sample (int): Number of bits written in each sample.
+            stats (dict): Counters from _get_stats, updated with the
+            changes made to the samples.
+
+        Raises:
+            ValueError: If the samples cannot hold all the bits.
+        """
+        full_samples, tail_size = divmod(bits.size, bits_per_sample)
+        window = samples[start:start + full_samples + (tail_size > 0)]
+        if window.size < full_samples + (tail_size > 0):
+            raise ValueError("The embedded image is too small to hold "
+                             "the hidden image.")
+
+        values = bits[:full_samples * bits_per_sample]
+        if bits_per_sample > 1:
+            values = np.packbits(values.reshape(-1, bits_per_sample),
+                                 axis=1)[:, 0] >> (8 - bits_per_sample)
+        body = window[:full_samples]
+        if stats is not None:
+            before = body & ((1 << bits_per_sample) - 1)
+        self.backend.embed_values(body, values, bits_per_sample)
+        if stats is not None:
+            self._count_changes(stats, before, values)
+
+        if tail_size:
+            # Last sample only holds the remaining (most significant) bits
+            before = window[-1:].copy()
+            for offset, bit in enumerate(bits[full_samples *
+                                              bits_per_sample:]):
+                position = bits_per_sample - 1 - offset
+                window[-1] = self.modify_bit(window[-1], bit, position)
+            if stats is not None:
+                self._count_changes(stats, before, window[-1:])
+
+    def _get_stats(self) -> dict:
+        """
+        Creates the counters of the changes made while embedding.
+
+        Returns:
+            dict: Number of changed samples, flipped bits and sum of the
+            squared changes, all zero.
+        """
+        return {"changed_samples": 0, "flipped_bits": 0, "squared_error": 0}
+
+    def _add_stats(self, stats: dict, chunk_stats: list) -> None:
+        """
+        Adds the counters of chunks embedded separately to the totals.
+
+        Args:
+            stats (dict): Counters from _get_stats, updated in place, or
+            None when the changes are not counted.
+            chunk_stats (list): Counters of each chunk, or None.
+        """
+        if stats is None:
+            return
+        for counters in chunk_stats:
+            for name, value in counters.items():
+                stats[name] += value
+
+    def _count_changes(self, stats: dict,
+                       before: np.ndarray,
+                       after: np.ndarray) -> None:
+        """
+        Adds the changes between two versions of the same samples, which
+        only differ in their low bits, to the counters.
+
+        Args:
+            stats (dict): Counters from _get_stats, updated in place.
+            before (numpy.ndarray): Samples (or their low bits) before the
+            change.
+            after (numpy.ndarray): The same samples after the change.
+        """
+        flips = (before ^ after).astype(np.uint8)
+        stats["changed_samples"] += int(np.count_nonzero(flips))
+        stats["flipped_bits"] += int(POPCOUNT[flips].sum(dtype=np.int64))
+        delta = before.astype(np.int16) - after.astype(np.int16)
+        stats["squared_error"] += int(np.square(delta, dtype=np.int32)
+                                      .sum(dtype=np.int64))
+
+    def _extract_bits(self, samples: np.ndarray,
+                      start: int,
+                      size: int,
+                      bits_per_sample: int = 1) -> np.ndarray:
+        """
+        Reads the least significant bits of consecutive samples, most
+        significant bit first.
+
+        Args:
+            samples (numpy.ndarray): 1-D view over the cover samples.
+            start (int): Index of the first sample to be read.
+            size (int): Number of bits to be read.
+            bits_per_sample (int): Number of bits read from each sample.
+
+        Returns:
+            numpy.ndarray: Array of bits (0 or 1) as uint8.
+
+        Raises:
+            ValueError: If the samples do not hold enough bits.
+        """
+        count = -(-size // bits_per_sample)
+        window = samples[start:start + count]
+        if window.size < count:
+            raise ValueError("The image is too small to hold the "
+                             "requested bits.")
+        values = self.backend.extract_values(window, bits_per_sample)
+        if bits_per_sample == 1:
+            return values
+        bits = np.unpackbits(values[:, np.newaxis], axis=1)
+        return bits[:, 8 - bits_per_sample:].reshape(-1)[:size]
+
+    def _get_samples(self, image: np.ndarray) -> np.ndarray:
+        """
+        Returns a (pixels, channels) view over the image, with pixels in
+        the same order as get_coordinates_from_position.
+
+        Args:
+            image (numpy.ndarray): The input image.
+
+        Returns:
+            numpy.ndarray: 2-D view (or copy, if the image is not
+            contiguous) over the image samples.
+        """
+        return image.reshape(-1, image.shape[2])
+
+    def _get_payload_streams(self, band: np.ndarray,
+                             first_row: int,
+                             layout: str):
+        """
+        Lists the 1-D sample sequences of a band of rows that carry the
+        payload, one per hidden channel (planar) or a single one
+        (interleaved).
+
+        Args:
+            band (numpy.ndarray): Consecutive rows of the embedded image.
+            first_row (int): Row of the embedded image where the band starts.
+            layout (str): Either "planar" or "interleaved".
+
+        Returns:
+            samples, streams (numpy.ndarray, list): The reshaped band, which
+            is a copy when the band cannot be reshaped as a view, and tuples
+            (stream, first_sample), where first_sample is the payload sample
+            stored in stream[0] (negative inside the header).
+        """
+        width, channels = band.shape[1], band.shape[2]
+        if layout == "interleaved":
+            samples = band.reshape(-1)
+            first_sample = (first_row * width - self.header_size) * channels
+            return samples, [(samples, first_sample)]
+        samples = self._get_samples(band)
+        first_sample = first_row * width - self.header_size
+        return samples, [(samples[:, channel], first_sample)
+                         for channel in range(self.depth)]
+
+    def _get_payload_data(self, hidden_image: np.ndarray) -> list:
+        """
+        Lists the hidden bytes written in each payload stream.
+
+        Args:
+            hidden_image (numpy.ndarray): Image to be hidden.
+
+        Returns:
+            list: 1-D arrays of hidden values, matching _get_payload_streams.
+        """
+        _, _, src_resolution = self.get_resolution(hidden_image)
+        hidden_samples = self._get_samples(hidden_image)
+        hidden_samples = hidden_samples[:src_resolution, :self.depth]
+        if self.layout == "interleaved":
+            return [hidden_samples.reshape(-1)]
+        return [hidden_samples[:, channel] for channel in range(self.depth)]
+
+    def _get_span(self, samples: np.ndarray,
+                  first_sample: int,
+                  total_bits: int,
+                  bits_per_sample: int):
+        """
+        Calculates which payload bits fall into a sequence of samples.
+
+        Args:
+            samples (numpy.ndarray): 1-D view over the cover samples.
+            first_sample (int): Payload sample stored in samples[0].
+            total_bits (int): Size of the payload stream in bits.
+            bits_per_sample (int): Number of bits stored in each sample.
+
+        Returns:
+            start, bit_start, bit_stop (int, int, int): Index of the first
+            payload sample within samples, and the range of payload bits.
+        """
+        total_samples = -(-total_bits // bits_per_sample)
+        low = max(first_sample, 0)
+        high = min(first_sample + samples.size, total_samples)
+        if low >= high:
+            return 0, 0, 0
+        return (low - first_sample, low * bits_per_sample,
+                min(high * bits_per_sample, total_bits))
+
+    def _get_chunks(self, low: int, high: int) -> list:
+        """
+        Splits a range of payload samples between the worker threads.
+        Every boundary inside the range is a multiple of 8 samples, so
+        each chunk but the last one ends on a whole payload byte.
+
+        Args:
+            low (int): First payload sample of the range.
+            high (int): End (exclusive) of the range.
+
+        Returns:
+            list: Ranges (start, stop) covering the range, a single one
+            when it is too small to be split.
+        """
+        count = min(self.workers, (high - low) // PARALLEL_MIN_SAMPLES)
+        if count <= 1:
+            return [(low, high)]
+        step = -(-(high - low) // count)
+        bounds = [low] + [-(-(low + index * step) // 8) * 8
+                          for index in range(1, count)] + [high]
+        return [(start, stop) for start, stop in zip(bounds, bounds[1:])
+                if start < stop]
+
+    def _map_chunks(self, function, chunks: list) -> list:
+        """
+        Calls a function on each chunk, in the worker threads when there
+        are several chunks. The NumPy and numba kernels release the GIL.
+
+        Args:
+            function (callable): Function of (start, stop).
+            chunks (list): Ranges from _get_chunks.
+
+        Returns:
+            list: The results, in the order of the chunks.
+        """
+        if len(chunks) == 1:
+            return [function(*chunks[0])]
+        with ThreadPoolExecutor(len(chunks)) as executor:
+            return list(executor.map(lambda chunk: function(*chunk),
+                                     chunks))
+
+    def _get_sample_range(self, stream: tuple,
+                          total_bits: int,
+                          bits_per_sample: int):
+        """
+        Calculates which payload samples fall into a payload stream.
+
+        Args:
+            stream (tuple): (samples, first_sample), from
+            _get_payload_streams.
+            total_bits (int): Size of the payload stream in bits.
+            bits_per_sample (int): Number of bits stored in each sample.
+
+        Returns:
+            low, high (int, int): The range of payload samples, empty when
+            low >= high.
+        """
+        samples, first_sample = stream
+        total_samples = -(-total_bits // bits_per_sample)
+        return (max(first_sample, 0),
+                min(first_sample + samples.size, total_samples))
+
+    def _get_permutation(self, size: int,
+                         tweak: int) -> scatter.FeistelPermutation:
+        """
+        Creates the keyed permutation of the payload samples of a stream.
+
+        Args:
+            size (int): Number of samples of the stream after the header.
+            tweak (int): Index of the payload stream.
+
+        Returns:
+            scatter.FeistelPermutation: The permutation of range(size).
+
+        Raises:
+            ValueError: If the model has no key.
+        """
+        if self.key is None:
+            raise ValueError("The payload is scattered with a key; pass "
+                             "the key to Steganography.")
+        return scatter.FeistelPermutation(self.key, size, tweak)
+
+    def _embed_scattered(self, samples: np.ndarray,
+                         offset: int,
+                         data: np.ndarray,
+                         bits_per_sample: int,
+                         tweak: int = 0,
+                         stats: dict = None) -> None:
+        """
+        Writes a payload stream into samples chosen by the keyed
+        permutation. Positions are computed block by block, so the extra
+        memory does not grow with the cover.
+
+        Args:
+            samples (numpy.ndarray): 1-D view over the cover samples,
+            modified in place.
+            offset (int): Number of samples before the payload (header).
+            data (numpy.ndarray): The whole payload stream as bytes.
+            bits_per_sample (int): Number of bits stored in each sample.
+            tweak (int): Index of the payload stream, selecting its
+            permutation.
+            stats (dict): Counters of the changes, from _get_stats.
+
+        Raises:
+            ValueError: If the samples cannot hold the payload.
+        """
+        total_samples = -(-data.size * 8 // bits_per_sample)
+        permutation = self._get_permutation(samples.size - offset, tweak)
+        if total_samples > permutation.size:
+            raise ValueError("The embedded image is too small to hold "
+                             "the hidden image.")
+
+        def embed(start: int, stop: int) -> dict:
+            chunk_stats = None if stats is None else self._get_stats()
+            for block in range(start, stop, SCATTER_BLOCK_SAMPLES):
+                indices = np.arange(block, min(block + SCATTER_BLOCK_SAMPLES,
+                                               stop), dtype=np.uint64)
+                positions = permutation.permute(indices) + np.uint64(offset)
+                window = samples[positions]
+                self._embed_span(window, block, data, bits_per_sample,
+                                 chunk_stats)
+                samples[positions] = window
+            return chunk_stats
+
+        self._add_stats(stats, self._map_chunks(
+            embed, self._get_chunks(0, total_samples)))
+
+    def _extract_scattered(self, samples: np.ndarray,
+                           offset: int,
+                           output: np.ndarray,
+                           bits_per_sample: int,
+                           tweak: int = 0) -> np.ndarray:
+        """
+        Reads a payload stream written by _embed_scattered.
+
+        Args:
+            samples (numpy.ndarray): 1-D view over the cover samples.
+            offset (int): Number of samples before the payload (header).
+            output (numpy.ndarray): 1-D uint8 buffer receiving the payload
+            stream, whose size sets the number of bytes read.
+            bits_per_sample (int): Number of bits stored in each sample.
+            tweak (int): Index of the payload stream.
+
+        Returns:
+            numpy.ndarray: The output buffer.
+
+        Raises:
+            ValueError: If the samples do not hold the payload.
+        """
+        total_bits = output.size * 8
+        total_samples = -(-total_bits // bits_per_sample)
+        permutation = self._get_permutation(samples.size - offset, tweak)
+        if total_samples > permutation.size:
+            raise ValueError("The image is too small to hold the "
+                             "hidden image.")
+
+        def extract(start: int, stop: int) -> None:
+            # Blocks start on multiples of 8 samples, hence on whole bytes
+            for block in range(start, stop, SCATTER_BLOCK_SAMPLES):
+                indices = np.arange(block, min(block + SCATTER_BLOCK_SAMPLES,
+                                               stop), dtype=np.uint64)
+                positions = permutation.permute(indices) + np.uint64(offset)
+                bits = self._extract_span(samples[positions], block,
+                                          total_bits, bits_per_sample)
+                byte = block * bits_per_sample // 8
+                output[byte:byte + bits.size // 8] = np.packbits(bits)
+
+        self._map_chunks(extract, self._get_chunks(0, total_samples))
+        return output
+
+    def _embed_span(self, samples: np.ndarray,
+                    first_sample: int,
+                    data: np.ndarray,
+                    bits_per_sample: int,
+                    stats: dict = None) -> None:
+        """
+        Writes the payload bits that fall into a sequence of samples.
+
+        Args:
+            samples (numpy.ndarray): 1-D view over the cover samples,
+            modified in place.
+            first_sample (int): Payload sample stored in samples[0].
+            data (numpy.ndarray): The whole payload stream as bytes.
+            bits_per_sample (int): Number of bits stored in each sample.
+            stats (dict): Counters of the changes, from _get_stats.
+        """
+        start, bit_start, bit_stop = self._get_span(samples, first_sample,
+                                                    data.size * 8,
+                                                    bits_per_sample)
+        if bit_start == bit_stop:
+            return
+        byte_start = bit_start // 8
+        byte_stop = -(-bit_stop // 8)
+        bits = np.unpackbits(data[byte_start:byte_stop].astype(np.uint8))
+        bits = bits[bit_start - byte_start * 8:bit_stop - byte_start * 8]
+        self._embed_bits(samples, start, bits, bits_per_sample, stats)
+
+    def _extract_span(self, samples: np.ndarray,
+                      first_sample: int,
+                      total_bits: int,
+                      bits_per_sample: int) -> np.ndarray:
+        """
+        Reads the payload bits that fall into a sequence of samples.
+
+        Args:
+            samples (numpy.ndarray): 1-D view over the cover samples.
+            first_sample (int): Payload sample stored in samples[0].
+            total_bits (int): Size of the payload stream in bits.
+            bits_per_sample (int): Number of bits stored in each sample.
+
+        Returns:
+            numpy.ndarray: The payload bits stored in the samples.
+        """
+        start, bit_start, bit_stop = self._get_span(samples, first_sample,
+                                                    total_bits,
+                                                    bits_per_sample)
+        return self._extract_bits(samples, start, bit_stop - bit_start,
+                                  bits_per_sample)
+
+    def _get_header_words(self, channels: int,
+                          hidden_image: np.ndarray) -> list:
+        """
+        Lists the header words, one per channel of the embedded image.
+
+        Args:
+            channels (int): Number of channels of the embedded image.
+            hidden_image (numpy.ndarray): Image to be hidden.
+
+        Returns:
+            list: Height and width of the hidden image, followed by the
+            parameters word, with its checksum, when the header has room
+            for it.
+        """
+        src_width, src_height, _ = self.get_resolution(hidden_image)
+        words = [src_height, src_width]
+        if self.header_size == 32 and channels > 2:
+            words.append(self.get_parameters())
+            words[2] |= self.get_header_checksum(words)
+        return words
+
+    def _embed_header_band(self, band: np.ndarray,
+                           first_row: int,
+                           words: list,
+                           stats: dict = None) -> None:
+        """
+        Writes the header bits that fall into a band of rows.
+
+        Args:
+            band (numpy.ndarray): Consecutive rows of the embedded image,
+            modified in place.
+            first_row (int): Row of the embedded image where the band starts.
+            words (list): Header words, one per channel.
+            stats (dict): Counters of the changes, from _get_stats.
+        """
+        first_pixel = first_row * band.shape[1]
+        if first_pixel >= self.header_size:
+            return
+        samples = self._get_samples(band)
+        for channel, word in enumerate(words):
+            binary_value = self.get_binary(word, self.header_size)
+            bits = np.array([int(bit) for bit in
+                             binary_value[:self.header_size]],
+                            dtype=np.uint8)
+            bits = bits[first_pixel:first_pixel + samples.shape[0]]
+            self._embed_bits(samples[:, channel], 0, bits, stats=stats)
+        if not np.may_share_memory(samples, band):
+            band[...] = samples.reshape(band.shape)
+
+    def _embed_payload_band(self, band: np.ndarray,
+                            first_row: int,
+                            data: list,
+                            stats: dict = None) -> None:
+        """
+        Writes the payload bits that fall into a band of rows.
+
+        Args:
+            band (numpy.ndarray): Consecutive rows of the embedded image,
+            modified in place.
+            first_row (int): Row of the embedded image where the band starts.
+            data (list): Payload streams, from _get_payload_data or
+            _encrypt_payload.
+            stats (dict): Counters of the changes, from _get_stats.
+        """
+        samples, streams = self._get_payload_streams(band, first_row,
+                                                     self.layout)
+        low, high = self._get_sample_range(streams[0], data[0].size * 8,
+                                           self.bits_per_sample)
+        if low >= high:
+            return
+
+        def embed(start: int, stop: int) -> dict:
+            # Each chunk counts its own changes, summed afterwards
+            chunk_stats = None if stats is None else self._get_stats()
+            for block in range(start, stop, BLOCK_SAMPLES):
+                block_stop = min(block + BLOCK_SAMPLES, stop)
+                for (stream, first_sample), values in zip(streams, data):
+                    self._embed_span(stream[block - first_sample:
+                                            block_stop - first_sample],
+                                     block, values, self.bits_per_sample,
+                                     chunk_stats)
+            return chunk_stats
+
+        self._add_stats(stats, self._map_chunks(
+            embed, self._get_chunks(low, high)))
+        if not np.may_share_memory(samples, band):
+            band[...] = samples.reshape(band.shape)
+
+    def _embed_scattered_payload(self, image: np.ndarray,
+                                 data: list,
+                                 stats: dict = None) -> None:
+        """
+        Writes the payload streams over the whole image, scattered with
+        the key of the model.
+
+        Args:
+            image (numpy.ndarray): The embedded image, with its header,
+            modified in place.
+            data (list): Payload streams, from _get_payload_data or
+            _encrypt_payload.
+            stats (dict): Counters of the changes, from _get_stats.
+        """
+        samples, streams = self._get_payload_streams(image, 0, self.layout)
+        for tweak, ((stream, first_sample), values) in \
+                enumerate(zip(streams, data)):
+            self._embed_scattered(stream, -first_sample, values,
+                                  self.bits_per_sample, tweak, stats)
+        if not np.may_share_memory(samples, image):
+            image[...] = samples.reshape(image.shape)
+
+    def _get_hidden_outputs(self, image: np.ndarray,
+                            layout: str) -> list:
+        """
+        Lists the 1-D views of the hidden image receiving each payload
+        stream.
+
+        Args:
+            image (numpy.ndarray): The hidden image buffer.
+            layout (str): Either "planar" or "interleaved".
+
+        Returns:
+            list: One view per hidden channel (planar) or a single one
+            (interleaved), matching _get_payload_streams.
+        """
+        if layout == "planar":
+            return [image.reshape(-1, self.depth)[:, channel]
+                    for channel in range(self.depth)]
+        return [image.reshape(-1)]
+
+    def _encrypt_payload(self, data: list) -> list:
+        """
+        Wraps the payload streams so that they are encrypted with the
+        password of the model, slice by slice, while they are embedded.
+
+        Args:
+            data (list): Plaintext payload streams, from _get_payload_data.
+
+        Returns:
+            list: The streams as embedded, unchanged without a password,
+            else encryption.EncryptedStream views prefixed with the salt
+            and the tag.
+        """
+        if self.password is None:
+            return data
+        payload_cipher = encryption.PayloadCipher(self.password)
+        tag = payload_cipher.get_tag(data)
+        return [encryption.EncryptedStream(payload_cipher, values, index,
+                                           tag)
+                for index, values in enumerate(data)]
+
+    def _get_cipher(self, samples: np.ndarray,
+                    first_sample: int,
+                    bits_per_sample: int,
+                    scattered: bool = False):
+        """
+        Reads the salt and the tag prefixing the first payload stream, and
+        derives the keys from the password of the model.
+
+        Args:
+            samples (numpy.ndarray): 1-D view over the samples of the first
+            payload stream.
+            first_sample (int): Payload sample stored in samples[0].
+            bits_per_sample (int): Number of bits stored in each sample.
+            scattered (bool): Whether the payload samples are scattered.
+
+        Returns:
+            payload_cipher, tag (encryption.PayloadCipher, bytes): The
+            cipher of the encoded image and the tag of its payload.
+
+        Raises:
+            ValueError: If the model has no password, or if the samples
+            end before the prefix.
+        """
+        if self.password is None:
+            raise ValueError("The payload is encrypted; pass the password "
+                             "to Steganography.")
+        prefix = np.empty(encryption.PREFIX_SIZE, dtype=np.uint8)
+        if scattered:
+            self._extract_scattered(samples, -first_sample, prefix,
+                                    bits_per_sample)
+        else:
+            bits = self._extract_span(samples, first_sample, prefix.size * 8,
+                                      bits_per_sample)
+            if bits.size < prefix.size * 8:
+                raise ValueError("The image is too small to hold the "
+                                 "hidden image.")
+            prefix = np.packbits(bits)
+        prefix = prefix.tobytes()
+        salt, tag = (prefix[:encryption.SALT_SIZE],
+                     prefix[encryption.SALT_SIZE:])
+        return encryption.PayloadCipher(self.password, salt), tag
+
+    def _extract_payload(self, bands,
+                         shape: tuple,
+                         bits_per_sample: int,
+                         layout: str,
+                         first_row: int = 0,
+                         out: np.ndarray = None,
+                         encrypted: bool = False) -> np.ndarray:
+        """
+        Reads the hidden image from consecutive bands of rows, stopping as
+        soon as all of its bits were read.
+
+        Args:
+            bands (iterable): Bands of rows of the embedded image.
+            shape (tuple): Shape (height, width, depth) of the hidden image.
+            bits_per_sample (int): Number of bits stored in each sample.
+            layout (str): Either "planar" or "interleaved".
+            first_row (int): Row of the embedded image where the first
+            band starts.
+            out (numpy.ndarray): Optional preallocated uint8 buffer of the
+            hidden image.
+            encrypted (bool): Whether the payload is encrypted, in which
+            case it is decrypted while it is read and its tag is checked.
+
+        Returns:
+            numpy.ndarray: The hidden image as uint8.
+
+        Raises:
+            ValueError: If the bands end before the hidden image, or if the
+            payload is encrypted and the password is missing or wrong.
+        """
+        image = self._get_hidden_buffer(shape, out)
+        outputs = self._get_hidden_outputs(image, layout)
+        targets = outputs
+        payload_cipher = tag = None
+        if encrypted:
+            # Reads the first bands until they hold the whole prefix
+            bands, buffered = iter(bands), []
+            prefix_samples = -(-encryption.PREFIX_SIZE * 8 //
+                               bits_per_sample)
+            while True:
+                band = next(bands, None)
+                if band is None:
+                    raise ValueError("The image is too small to hold the "
+                                     "hidden image.")
+                buffered.append(band)
+                head = np.concatenate(buffered) if len(buffered) > 1 \
+                    else band
+                _, streams = self._get_payload_streams(head, first_row,
+                                                       layout)
+                samples, first_sample = streams[0]
+                if first_sample + samples.size >= prefix_samples:
+                    break
+            payload_cipher, tag = self._get_cipher(*streams[0],
+                                                   bits_per_sample)
+            targets = [encryption.DecryptedOutput(payload_cipher, output,
+                                                  index)
+                       for index, output in enumerate(outputs)]
+            bands = itertools.chain(buffered, bands)
+        pending = [np.empty(0, dtype=np.uint8) for _ in targets]
+        written = [0] * len(targets)
+        total_bits = targets[0].size * 8
+
+        for band in bands:
+            _, streams = self._get_payload_streams(band, first_row, layout)
+            low, high = self._get_sample_range(streams[0], total_bits,
+                                               bits_per_sample)
+            chunks = self._get_chunks(low, high)
+            if len(chunks) > 1 and low * bits_per_sample == written[0] * 8:
+                # The band starts on a whole byte, and so do the chunks and
+                # their blocks: each block packs its own bytes and only the
+                # last one leaves pending bits
+                def extract(start: int, stop: int) -> list:
+                    for block in range(start, stop, BLOCK_SAMPLES):
+                        block_stop = min(block + BLOCK_SAMPLES, stop)
+                        remainders = []
+                        for (samples, first_sample), target in \
+                                zip(streams, targets):
+                            bits = self._extract_span(
+                                samples[block - first_sample:
+                                        block_stop - first_sample],
+                                block, total_bits, bits_per_sample)
+                            size = bits.size // 8
+                            byte = block * bits_per_sample // 8
+                            target[byte:byte + size] = \
+                                np.packbits(bits[:size * 8])
+                            remainders.append(bits[size * 8:])
+                    return remainders
+
+                pending = self._map_chunks(extract, chunks)[-1]
+                written = [high * bits_per_sample // 8] * len(targets)
+            else:
+                for block in range(low, high, BLOCK_SAMPLES):
+                    block_stop = min(block + BLOCK_SAMPLES, high)
+                    for index, (samples, first_sample) in \
+                            enumerate(streams):
+                        bits = self._extract_span(
+                            samples[block - first_sample:
+                                    block_stop - first_sample],
+                            block, total_bits, bits_per_sample)
+                        bits = np.concatenate([pending[index], bits])
+                        size = bits.size // 8
+                        targets[index][written[index]:
+                                       written[index] + size] = \
+                            np.packbits(bits[:size * 8])
+                        written[index] += size
+                        pending[index] = bits[size * 8:]
+            first_row += band.shape[0]
+            if all(size == target.size
+                   for size, target in zip(written, targets)):
+                if payload_cipher is not None:
+                    payload_cipher.verify(outputs, tag)
+                return image
+
+        raise ValueError("The image is too small to hold the "
+                         "hidden image.")
 
     def get_coordinates_from_position(self, pixel_position: int = 0,
                                       width: int = 0):
@@ -45,6 +1003,37 @@ class Steganography:
 
         return row, column
 
+    def locate_bit(self, bit_position: int = 0,
+                   channel: int = 0,
+                   channels: int = 3,
+                   bits_per_sample: int = 1,
+                   layout: str = "planar"):
+        """
+        Finds where a bit of the hidden image is stored in the embedded
+        image.
+
+        Args:
+            bit_position (int): Position of the bit in the hidden channel
+            (planar layout) or in the whole hidden image (interleaved
+            layout).
+            channel (int): The hidden channel, used by the planar layout.
+            channels (int): Number of channels of the embedded image.
+            bits_per_sample (int): Number of bits stored in each sample.
+            layout (str): Either "planar" or "interleaved".
+
+        Returns:
+            pixel, channel, bit (int, int, int): The pixel position and
+            channel of the embedded image, and the bit of the sample
+            (0 being the last one).
+        """
+        sample, bit = divmod(bit_position, bits_per_sample)
+        bit = bits_per_sample - 1 - bit
+        if layout == "interleaved":
+            pixel, channel = divmod(self.header_size * channels + sample,
+                                    channels)
+            return pixel, channel, bit
+        return self.header_size + sample, channel, bit
+
     def get_binary(self, pixel_value: int = 0,
                    size: int = 8) -> str:
         """
@@ -97,6 +1086,118 @@ class Steganography:
         output_value = (pixel_value & -2) | (new_last_bit & 1)
         return output_value
 
+    def modify_bit(self, pixel_value: int = 0,
+                   new_bit: int = 0,
+                   bit_position: int = 0) -> int:
+        """
+        Modifies one of the bits of a pixel value.
+
+        Args:
+            pixel_value (int): The original pixel value (0 to 255).
+            new_bit (int): The new value for the bit (0 or 1).
+            bit_position (int): Position of the bit, 0 being the last one.
+
+        Returns:
+            int: The modified pixel value if the new bit is 0 or 1,
+            otherwise returns the original pixel value.
+
+        Example:
+            >>> modify_bit(10, 1, 2)
+            14
+        """
+        new_bit = int(new_bit)
+        if new_bit not in {0, 1}:
+            return pixel_value
+        output_value = (pixel_value & ~(1 << bit_position)) | \
+            (new_bit << bit_position)
+        return output_value
+
+    def get_parameters(self, kind: str = "image",
+                       codec: str = "none") -> int:
+        """
+        Packs the embedding parameters into the third header word.
+
+        Args:
+            kind (str): The payload kind, either "image" or "bytes".
+            codec (str): The codec of a bytes payload.
+
+        Returns:
+            int: The header word with magic, version, bits per sample,
+            layout, payload kind, codec, scattering and encryption.
+        """
+        layout = "interleaved" if kind == "bytes" else self.layout
+        return (HEADER_MAGIC << 20) | (HEADER_VERSION << 16) | \
+            ((self.bits_per_sample - 1) << 14) | \
+            (LAYOUTS.index(layout) << 13) | \
+            (PAYLOAD_KINDS.index(kind) << 12) | \
+            (CODECS.index(codec) << 10) | ((self.key is not None) << 9) | \
+            ((self.password is not None) << 8)
+
+    def read_parameters(self, parameters: int) -> dict:
+        """
+        Unpacks the embedding parameters from the third header word.
+
+        Images encoded before the parameters were recorded do not carry
+        the magic value and are reported as version 0 with one bit per
+        sample in the planar layout, holding an image.
+
+        Args:
+            parameters (int): The third header word.
+
+        Returns:
+            dict: The format version, the number of bits per sample, the
+            layout, the payload kind, the codec and whether the payload is
+            scattered and encrypted.
+        """
+        output = {"version": 0, "bits_per_sample": 1, "layout": "planar",
+                  "kind": "image", "codec": "none", "scattered": False,
+                  "encrypted": False}
+        if parameters >> 20 != HEADER_MAGIC:
+            return output
+        output["version"] = (parameters >> 16) & 0xF
+        output["bits_per_sample"] = ((parameters >> 14) & 0x3) + 1
+        if output["version"] >= 2:
+            output["layout"] = LAYOUTS[(parameters >> 13) & 0x1]
+        if output["version"] >= 3:
+            output["kind"] = PAYLOAD_KINDS[(parameters >> 12) & 0x1]
+            codec = (parameters >> 10) & 0x3
+            output["codec"] = CODECS[codec] if codec < len(CODECS) else None
+        if output["version"] >= 4:
+            output["scattered"] = bool((parameters >> 9) & 0x1)
+        if output["version"] >= 5:
+            output["encrypted"] = bool((parameters >> 8) & 0x1)
+        return output
+
+    def get_header_checksum(self, words: list) -> int:
+        """
+        Calculates the checksum stored in bits 7-0 of the parameters word:
+        the low byte of the CRC-32 of the three header words, with the
+        checksum bits cleared.
+
+        Args:
+            words (list): Height and width of the hidden image (or size and
+            CRC-32 of hidden bytes), and the parameters word.
+
+        Returns:
+            int: The checksum, from 0 to 255.
+        """
+        words = [words[0], words[1], words[2] & ~0xFF]
+        return zlib.crc32(b"".join(word.to_bytes(4, "big")
+                                   for word in words)) & 0xFF
+
+    def has_parameters(self, image: np.ndarray) -> bool:
+        """
+        Checks whether the header of the image has room for the parameters
+        word, which needs a 32 bits header and a third channel.
+
+        Args:
+            image (numpy.ndarray): The embedded image.
+
+        Returns:
+            bool: True if the parameters are stored in channel 2.
+        """
+        return self.header_size == 32 and image.shape[2] > 2
+
     def get_resolution(self, image: np.ndarray):
         """
         Calculates the width, height, and resolution of the input image.
@@ -112,8 +1213,184 @@ class Steganography:
         resolution = height * width
         return width, height, resolution
 
+    def get_required_bits(self, hidden_image: np.ndarray) -> int:
+        """
+        Calculates how many bits each channel of the embedded image must
+        hold to store the header and the hidden image.
+
+        Args:
+            hidden_image (numpy.array): Image to be hidden.
+
+        Returns:
+            int: Number of bits required per channel.
+        """
+        _, _, src_resolution = self.get_resolution(hidden_image)
+        return src_resolution * self.pixel_size + self.header_size
+
+    def get_required_pixels(self, hidden_image: np.ndarray,
+                            channels: int = 3) -> int:
+        """
+        Calculates how many pixels of the embedded image are needed to
+        store the header and the hidden image.
+
+        Args:
+            hidden_image (numpy.array): Image to be hidden.
+            channels (int): Number of channels of the embedded image.
+
+        Returns:
+            int: Number of pixels required.
+        """
+        payload_bits = self.get_required_bits(hidden_image) - \
+            self.header_size
+        return self.count_pixels(payload_bits, self.bits_per_sample,
+                                 self.layout, channels,
+                                 self.password is not None)
+
+    def count_byte_pixels(self, size: int,
+                          bits_per_sample: int = 1,
+                          channels: int = 3,
+                          encrypted: bool = False) -> int:
+        """
+        Calculates how many pixels hold the header and a bytes payload,
+        which is written sequentially over all the samples.
+
+        Args:
+            size (int): Size of the payload in bytes.
+            bits_per_sample (int): Number of bits stored in each sample.
+            channels (int): Number of channels of the embedded image.
+            encrypted (bool): Whether the payload is prefixed with the salt
+            and the tag of its encryption.
+
+        Returns:
+            int: Number of pixels, starting at the first one.
+        """
+        if encrypted:
+            size += encryption.PREFIX_SIZE
+        samples = math.ceil(size * 8 / bits_per_sample)
+        return self.header_size + math.ceil(samples / channels)
+
+    def count_pixels(self, payload_bits: int,
+                     bits_per_sample: int = 1,
+                     layout: str = "planar",
+                     channels: int = 3,
+                     encrypted: bool = False) -> int:
+        """
+        Calculates how many pixels hold the header and a payload.
+
+        Args:
+            payload_bits (int): Size of the payload in bits, per hidden
+            channel.
+            bits_per_sample (int): Number of bits stored in each sample.
+            layout (str): Either "planar" or "interleaved".
+            channels (int): Number of channels of the embedded image.
+            encrypted (bool): Whether each payload stream is prefixed with
+            the salt and the tag of its encryption.
+
+        Returns:
+            int: Number of pixels, starting at the first one.
+        """
+        prefix_bits = encryption.PREFIX_SIZE * 8 if encrypted else 0
+        if layout == "interleaved":
+            samples = math.ceil((payload_bits * self.depth + prefix_bits) /
+                                bits_per_sample)
+            return self.header_size + math.ceil(samples / channels)
+        return self.header_size + math.ceil((payload_bits + prefix_bits) /
+                                            bits_per_sample)
+
+    def check_capacity(self, embedded_image: np.ndarray,
+                       hidden_image: np.ndarray) -> None:
+        """
+        Checks that the embedded image can hold the hidden image without
+        being resized.
+
+        Args:
+            embedded_image (numpy.ndarray): Image used to hide another image.
+            hidden_image (numpy.ndarray): Image to be hidden.
+
+        Raises:
+            ValueError: If the embedded image is too small.
+        """
+        _, _, dst_resolution = self.get_resolution(embedded_image)
+        required_pixels = self.get_required_pixels(hidden_image,
+                                                   embedded_image.shape[2])
+        if required_pixels > dst_resolution:
+            raise ValueError("The embedded image is too small to hold "
+                             "the hidden image.")
+
+    def get_capacity_report(self, embedded_image: np.ndarray,
+                            hidden_image: np.ndarray) -> dict:
+        """
+        Describes how much of the embedded image the hidden image uses.
+
+        Args:
+            embedded_image (numpy.array): Image used to hide another image.
+            hidden_image (numpy.array): Image to be hidden.
+
+        Returns:
+            dict: Width, height, capacity in bits, required bits and
+            utilization (required / capacity) of the embedded image.
+        """
+        width, height, resolution = self.get_resolution(embedded_image)
+        capacity_bits = self.header_size + (resolution - self.header_size) * \
+            self.bits_per_sample
+        if self.layout == "interleaved":
+            capacity_bits *= embedded_image.shape[2]
+        else:
+            capacity_bits *= self.depth
+        required_bits = self.get_required_bits(hidden_image) * self.depth
+        return {"width": width,
+                "height": height,
+                "capacity_bits": capacity_bits,
+                "required_bits": required_bits,
+                "utilization": required_bits / capacity_bits}
+
+    def get_resized_shape(self, embedded_image: np.ndarray,
+                          hidden_image: np.ndarray):
+        """
+        Calculates the width and height the embedded image must have to
+        accommodate the hidden image, according to the resize mode.
+
+        Args:
+            embedded_image (numpy.array): Image used to hide another image.
+            hidden_image (numpy.array): Image to be hidden.
+
+        Returns:
+            width, height (int, int): New dimensions of the embedded image.
+        """
+        return self._get_resized_shape(
+            embedded_image,
+            self.get_required_pixels(hidden_image, embedded_image.shape[2]))
+
+    def _get_resized_shape(self, embedded_image: np.ndarray,
+                           total_bits_required: int):
+        """
+        Calculates the width and height the embedded image must have to
+        hold a number of pixels, according to the resize mode.
+
+        Args:
+            embedded_image (numpy.array): Image used to hide another image.
+            total_bits_required (int): Number of pixels required.
+
+        Returns:
+            width, height (int, int): New dimensions of the embedded image.
+        """
+        dst_width, dst_height, dst_resolution = \
+            self.get_resolution(embedded_image)
+
+        if self.resize_mode == "capacity":
+            if total_bits_required <= dst_resolution:
+                return dst_width, dst_height
+            scale = math.sqrt(total_bits_required / dst_resolution)
+            new_width = math.ceil(dst_width * scale)
+            new_height = math.ceil(total_bits_required / new_width)
+            return new_width, new_height
+
+        proportion_factor = math.ceil(total_bits_required / dst_resolution)
+        return proportion_factor * dst_width, proportion_factor * dst_height
+
     def resize_embedded_image(self, embedded_image: np.ndarray,
-                              hidden_image: np.ndarray) -> np.ndarray:
+                              hidden_image: np.ndarray,
+                              out: np.ndarray = None) -> np.ndarray:
         """
         Resizes the embedded image if necessary to accommodate
         the hidden image.
@@ -121,6 +1398,8 @@ class Steganography:
         Args:
             embedded_image (numpy.array): Image used to hide another image.
             hidden_image (numpy.array): Image to be hidden.
+            out (numpy.ndarray): Optional buffer receiving the resized
+            image, used when its shape and data type match.
 
         Returns:
             numpy.array: Resized embedded image if necessary.
@@ -128,33 +1407,56 @@ class Steganography:
         Raises:
             ValueError: If the hidden image is larger than the embedded image.
         """
-        dst_width, dst_height, dst_resolution = \
-            self.get_resolution(embedded_image)
-        _, _, src_resolution = self.get_resolution(hidden_image)
+        return self._resize_to(
+            embedded_image,
+            self.get_resized_shape(embedded_image, hidden_image), out)
 
-        total_bits_required = src_resolution * self.pixel_size
-        total_bits_required += self.header_size
-        proportion_factor = math.ceil(total_bits_required / dst_resolution)
+    def _resize_to(self, embedded_image: np.ndarray,
+                   shape: tuple,
+                   out: np.ndarray = None) -> np.ndarray:
+        """
+        Resizes the embedded image to the shape from get_resized_shape.
 
-        if proportion_factor < 1:
-            return embedded_image
+        Args:
+            embedded_image (numpy.array): Image used to hide another image.
+            shape (tuple): New width and height of the embedded image.
+            out (numpy.ndarray): Optional buffer receiving the resized
+            image, used when its shape and data type match.
 
-        new_width = proportion_factor * dst_width
-        new_height = proportion_factor * dst_height
+        Returns:
+            numpy.array: Resized embedded image if necessary.
+        """
+        dst_width, dst_height, _ = self.get_resolution(embedded_image)
+        new_width, new_height = shape
+
+        # Resizing to the same shape would only copy the image
+        if new_width < 1 or (new_width, new_height) == (dst_width,
+                                                        dst_height):
+            return embedded_image
 
         embedded_image_resized = cv2.resize(embedded_image,
-                                            dsize=(new_width, new_height))
+                                            dsize=(new_width, new_height),
+                                            dst=out)
 
         return embedded_image_resized
 
     def embed_header(self, embedded_image: np.ndarray,
-                     hidden_image: np.ndarray) -> np.ndarray:
+                     hidden_image: np.ndarray,
+                     stats: dict = None,
+                     inplace: bool = False,
+                     out: np.ndarray = None) -> np.ndarray:
         """
         Embeds information from the hidden image into the embedded image.
 
         Args:
             embedded_image (numpy.array): Image used to hide another image.
             hidden_image (numpy.array): Image to be hidden.
+            stats (dict): Optional counters of the changed samples, flipped
+            bits and squared error, updated in place.
+            inplace (bool): Whether to modify the embedded image instead of
+            a copy. Default is False.
+            out (numpy.ndarray): Optional preallocated buffer receiving the
+            result, of the shape and data type of the embedded image.
 
         Returns:
             numpy.ndarray: Embedded image with hidden information.
@@ -168,8 +1470,19 @@ class Steganography:
         src_width, src_height, _ = self.get_resolution(hidden_image)
         dst_width, _, _ = self.get_resolution(embedded_image)
 
+        dimensions = self._get_header_words(embedded_image.shape[2],
+                                            hidden_image)
+        embedded_image = self._get_output(embedded_image, inplace, out)
+
+        if self._use_numpy():
+            self._embed_header_band(embedded_image, 0, dimensions, stats)
+            return embedded_image
+
+        header_rows = self.header_size // dst_width + 1
+        original_rows = embedded_image[:header_rows].copy()
+
         # Embed header information
-        for dimension, channel in zip([src_height, src_width], [0, 1]):
+        for channel, dimension in enumerate(dimensions):
             binary_value = self.get_binary(dimension, self.header_size)
             for position in range(self.header_size):
                 bit = int(binary_value[position])
@@ -181,16 +1494,30 @@ class Steganography:
                 pixel_value_dst = self.modify_last_bit(pixel_value_dst, bit)
                 embedded_image[row, column, channel] = pixel_value_dst
 
+        if stats is not None:
+            self._count_changes(stats, original_rows,
+                                embedded_image[:header_rows])
         return embedded_image
 
     def encode_image(self, hidden_image: np.ndarray,
-                     embedded_image: np.ndarray) -> np.ndarray:
+                     embedded_image: np.ndarray,
+                     stats: dict = None,
+                     inplace: bool = False,
+                     out: np.ndarray = None) -> np.ndarray:
         """
         Encodes the hidden image into the embedded image.
 
         Args:
             hidden_image (numpy.ndarray): Image to be hidden.
             embedded_image (numpy.ndarray): Image used to hide another image.
+            stats (dict): Optional counters of the changed samples, flipped
+            bits and squared error, updated in place. The backend engines
+            count them while embedding; the loop engine compares the
+            images afterwards.
+            inplace (bool): Whether to modify the embedded image instead of
+            a copy. Default is False.
+            out (numpy.ndarray): Optional preallocated buffer receiving the
+            result, of the shape and data type of the embedded image.
 
         Returns:
             numpy.ndarray: Encoded image with hidden information.
@@ -202,8 +1529,25 @@ class Steganography:
 
         src_width, _, src_resolution = self.get_resolution(hidden_image)
         dst_width, _, _ = self.get_resolution(embedded_image)
-
-        encoded_image = embedded_image.copy()
+        channels = embedded_image.shape[2]
+
+        if self._use_numpy() or self.key is not None or \
+                self.password is not None:
+            encoded_image = self._get_output(embedded_image, inplace, out)
+            self.check_capacity(encoded_image, hidden_image)
+            data = self._encrypt_payload(
+                self._get_payload_data(hidden_image))
+            if self.key is not None:
+                self._embed_scattered_payload(encoded_image, data, stats)
+            else:
+                self._embed_payload_band(encoded_image, 0, data, stats)
+            return encoded_image
+
+        original_image = embedded_image
+        if stats is not None and (inplace or out is embedded_image):
+            # The original samples are needed to count the changes
+            original_image = embedded_image.copy()
+        encoded_image = self._get_output(embedded_image, inplace, out)
 
         for channel in range(self.depth):
             for pixel_position_src in range(src_resolution):
@@ -214,47 +1558,403 @@ class Steganography:
                 pixel_value_src = self.get_binary(pixel_value_src,
                                                   self.pixel_size)
                 jump_size = pixel_position_src * self.pixel_size
+                if self.layout == "interleaved":
+                    jump_size = (pixel_position_src * self.depth + channel) \
+                        * self.pixel_size
 
                 for bit_position in range(self.pixel_size):
-                    dst_position = self.header_size + jump_size + bit_position
+                    dst_position, channel_dst, bit_dst = \
+                        self.locate_bit(jump_size + bit_position, channel,
+                                        channels, self.bits_per_sample,
+                                        self.layout)
                     row_dst, column_dst = \
                         self.get_coordinates_from_position(dst_position,
                                                            dst_width)
-                    pixel_value_dst = embedded_image[row_dst,
-                                                     column_dst,
-                                                     channel]
+                    pixel_value_dst = encoded_image[row_dst,
+                                                    column_dst,
+                                                    channel_dst]
                     pixel_value_dst = \
-                        self.modify_last_bit(pixel_value_dst,
-                                             pixel_value_src[bit_position])
+                        self.modify_bit(pixel_value_dst,
+                                        pixel_value_src[bit_position],
+                                        bit_dst)
                     encoded_image[row_dst,
                                   column_dst,
-                                  channel] = pixel_value_dst
+                                  channel_dst] = pixel_value_dst
 
+        if stats is not None:
+            self._count_changes(stats, original_image, encoded_image)
         return encoded_image
 
     def encode(self, embedded_image: np.ndarray,
-               hidden_image: np.ndarray):
+               hidden_image: np.ndarray,
+               report: bool = False,
+               inplace: bool = False,
+               out: np.ndarray = None):
         """
-        Encodes the hidden image into the embedded image.
+        Encodes the hidden image into the embedded image. The encoded
+        image is the only image-sized allocation: the resized cover, a
+        copy of the cover, or none with inplace or out.
 
         Args:
             embedded_image (numpy.ndarray): Image used to hide another image.
             hidden_image (numpy.ndarray): Image to be hidden.
+            report (bool): Whether to also return the report from
+            get_embedding_report, built from the changes counted while
+            embedding. Default is False.
+            inplace (bool): Whether to hide the image directly in the
+            embedded image. A cover that must be resized is left unchanged.
+            Default is False.
+            out (numpy.ndarray): Optional preallocated buffer receiving the
+            encoded image, of the shape of the (resized) embedded image and
+            of its data type.
 
         Returns:
-            numpy.ndarray: Encoded image with hidden information.
+            numpy.ndarray: Encoded image with hidden information, and the
+            report (dict) when requested.
+
+        Raises:
+            ValueError: If both inplace and out are given, or out does not
+            match the encoded image.
         """
-        embedded_image = \
-            self.resize_embedded_image(embedded_image=embedded_image,
-                                       hidden_image=hidden_image)
+        if inplace and out is not None:
+            raise ValueError("inplace and out are mutually exclusive.")
+        cover_image = embedded_image
+        stats = self._get_stats() if report else None
+        with self._stage("resize_embedded_image", cover_image.nbytes):
+            embedded_image = \
+                self.resize_embedded_image(embedded_image=embedded_image,
+                                           hidden_image=hidden_image,
+                                           out=out)
+        if embedded_image is not cover_image:
+            if out is not None and embedded_image is not out:
+                raise ValueError("out must have the shape "
+                                 f"{embedded_image.shape} and the data "
+                                 f"type {embedded_image.dtype}.")
+            # The resized cover is already a new buffer
+            inplace, out = True, None
+
+        with self._stage("embed_header", self.header_size * self.depth // 8):
+            embedded_image = self.embed_header(embedded_image=embedded_image,
+                                               hidden_image=hidden_image,
+                                               stats=stats,
+                                               inplace=inplace,
+                                               out=out)
+
+        with self._stage("encode_image", hidden_image.nbytes):
+            encoded_image = self.encode_image(hidden_image=hidden_image,
+                                              embedded_image=embedded_image,
+                                              stats=stats,
+                                              inplace=True)
+
+        if report:
+            return encoded_image, self.get_embedding_report(
+                stats, cover_image.shape, encoded_image)
+        return encoded_image
 
-        embedded_image = self.embed_header(embedded_image=embedded_image,
-                                           hidden_image=hidden_image)
+    def get_embedding_report(self, stats: dict,
+                             cover_shape: tuple,
+                             encoded_image: np.ndarray) -> dict:
+        """
+        Derives the quality of the encoded image from the changes counted
+        while embedding, without comparing the images again. Each changed
+        sample differs from the (resized) cover only in its low bits, so
+        the squared error is known exactly.
 
-        encoded_image = self.encode_image(hidden_image=hidden_image,
-                                          embedded_image=embedded_image)
+        Args:
+            stats (dict): Counters of the changed samples, flipped bits and
+            squared error.
+            cover_shape (tuple): Shape of the cover before resizing.
+            encoded_image (numpy.ndarray): The encoded image.
 
-        return encoded_image
+        Returns:
+            dict: The counters, the MSE and PSNR (in dB, inf without
+            change) against the resized cover, and, under "resize", the
+            shape of the cover before and after resizing, the scale of its
+            area and the number of interpolated pixels added, which the
+            MSE and PSNR do not account for.
+        """
+        samples = encoded_image.size
+        mse = stats["squared_error"] / samples
+        peak = 255
+        if np.issubdtype(encoded_image.dtype, np.integer):
+            peak = np.iinfo(encoded_image.dtype).max
+        psnr = math.inf
+        if mse > 0:
+            psnr = 10 * math.log10(peak ** 2 / mse)
+        cover_pixels = cover_shape[0] * cover_shape[1]
+        pixels = encoded_image.shape[0] * encoded_image.shape[1]
+        return {**stats,
+                "samples": samples,
+                "mse": mse,
+                "psnr": psnr,
+                "resize": {"resized": tuple(cover_shape) !=
+                           encoded_image.shape,
+                           "cover_shape": tuple(cover_shape),
+                           "shape": encoded_image.shape,
+                           "scale": pixels / cover_pixels,
+                           "added_pixels": pixels - cover_pixels}}
+
+    def encode_stream(self, bands,
+                      hidden_image: np.ndarray,
+                      shape: tuple):
+        """
+        Encodes the hidden image into an embedded image given as
+        consecutive bands of rows, so only one band is held in memory.
+        The embedded image is not resized and the bits are always written
+        by a backend (numpy for the loop engine); the result is identical
+        to encode.
+
+        Args:
+            bands (iterable): Bands of rows of the embedded image, from top
+            to bottom. Each band is modified in place.
+            hidden_image (numpy.ndarray): Image to be hidden.
+            shape (tuple): Shape (height, width, channels) of the whole
+            embedded image.
+
+        Yields:
+            numpy.ndarray: The encoded bands, in the same order.
+
+        Raises:
+            ValueError: If the embedded image is too small, the hidden
+            values do not fit in one byte, or the model has a key.
+        """
+        if self.pixel_size != 8:
+            raise ValueError("Streaming requires a pixel size of 8 bits.")
+        if self.key is not None:
+            raise ValueError("Scattered payloads span the whole image and "
+                             "cannot be streamed.")
+        height, width, channels = shape
+        required_pixels = self.get_required_pixels(hidden_image, channels)
+        if required_pixels > height * width or self.header_size > width:
+            raise ValueError("The embedded image is too small to hold "
+                             "the hidden image.")
+
+        words = self._get_header_words(channels, hidden_image)
+        data = self._encrypt_payload(self._get_payload_data(hidden_image))
+        first_row = 0
+        for band in bands:
+            self._embed_header_band(band, first_row, words)
+            self._embed_payload_band(band, first_row, data)
+            first_row += band.shape[0]
+            yield band
+
+    def encode_inplace(self, embedded_image: np.ndarray,
+                       hidden_image: np.ndarray,
+                       band_rows: int = 256) -> np.ndarray:
+        """
+        Encodes the hidden image directly into the embedded image, without
+        resizing or copying it. Only the rows holding the header and the
+        hidden image are touched, band by band, so a memory-mapped image
+        (numpy.memmap) is modified on disk without being loaded entirely.
+        With a key, the payload is scattered over the whole image instead.
+
+        Args:
+            embedded_image (numpy.ndarray): Image used to hide another
+            image, modified in place.
+            hidden_image (numpy.ndarray): Image to be hidden.
+            band_rows (int): Maximum number of rows processed at once.
+
+        Returns:
+            numpy.ndarray: The embedded image, now with hidden information.
+
+        Raises:
+            ValueError: If the embedded image is too small.
+        """
+        if self.key is not None:
+            self.check_capacity(embedded_image, hidden_image)
+            self.embed_header(embedded_image, hidden_image, inplace=True)
+            self.encode_image(hidden_image, embedded_image, inplace=True)
+        else:
+            width = embedded_image.shape[1]
+            required_pixels = self.get_required_pixels(
+                hidden_image, embedded_image.shape[2])
+            rows = min(-(-required_pixels // width), embedded_image.shape[0])
+            bands = (embedded_image[row:min(row + band_rows, rows)]
+                     for row in range(0, rows, band_rows))
+            for _ in self.encode_stream(bands, hidden_image,
+                                        embedded_image.shape):
+                pass
+        if isinstance(embedded_image, np.memmap):
+            embedded_image.flush()
+        return embedded_image
+
+    def decode_stream(self, bands,
+                      out: np.ndarray = None,
+                      shape: tuple = None) -> np.ndarray:
+        """
+        Decodes the hidden image from an encoded image given as
+        consecutive bands of rows. Bands after the last one holding the
+        hidden image are not consumed.
+
+        Args:
+            bands (iterable): Bands of rows of the encoded image, from top
+            to bottom. The first band must hold the whole header.
+            out (numpy.ndarray): Optional preallocated buffer receiving the
+            hidden image.
+            shape (tuple): Shape (height, width, channels) of the whole
+            encoded image, checked against the header before the hidden
+            image is allocated. Without it, only the header itself is
+            checked.
+
+        Returns:
+            numpy.ndarray: Decoded hidden image as uint8.
+
+        Raises:
+            ValueError: If the first band is too small to hold the header,
+            the header is not valid or needs more pixels than the shape
+            holds, or the payload is scattered.
+        """
+        bands = iter(bands)
+        band = next(bands)
+        header = self.peek_header(band)
+        if header["kind"] != "image":
+            raise ValueError("The image holds bytes, use decode_bytes.")
+        if header["scattered"]:
+            raise ValueError("Scattered payloads span the whole image and "
+                             "cannot be streamed.")
+        if shape is not None:
+            self.check_header(header, shape)
+
+        return self._extract_payload(itertools.chain([band], bands),
+                                     (header["height"], header["width"],
+                                      self.depth),
+                                     header["bits_per_sample"],
+                                     header["layout"], out=out,
+                                     encrypted=header["encrypted"])
+
+    def peek_header(self, image: np.ndarray) -> dict:
+        """
+        Reads the header of an encoded image, which only needs its first
+        row.
+
+        Args:
+            image (numpy.ndarray): The encoded image, or at least its first
+            row.
+
+        Returns:
+            dict: Height, width and depth of the hidden image (or the
+            "size" in bytes and "crc" of hidden bytes), the format version,
+            bits per sample, layout, payload kind, codec, scattering and
+            encryption, the number of pixels holding the header and the
+            payload, and the number of rows holding them (None for a
+            scattered payload, spread over all the rows).
+
+        Raises:
+            ValueError: If the image is narrower than the header, or if its
+            header is not valid: no magic value (unless legacy_headers is
+            set), a checksum that does not match, a newer format version,
+            an unknown codec or an empty hidden image.
+        """
+        dst_width = image.shape[1]
+        first_row = image[:1]
+
+        words = [self.get_header(first_row, dst_width, channel=channel)
+                 for channel in range(3 if self.has_parameters(first_row)
+                                      else 2)]
+        src_height, src_width = words[:2]
+
+        parameters = self.read_parameters(0)
+        if len(words) == 3:
+            parameters = self.read_parameters(words[2])
+            if parameters["version"] == 0 and not self.legacy_headers:
+                raise ValueError("The image holds no hidden data (no "
+                                 "header magic value).")
+        if parameters["version"] > HEADER_VERSION:
+            raise ValueError("The header has a newer format version "
+                             f"({parameters['version']}).")
+        if parameters["version"] >= 6 and \
+                words[2] & 0xFF != self.get_header_checksum(words):
+            raise ValueError("The image holds no hidden data (header "
+                             "checksum mismatch).")
+        if parameters["codec"] is None:
+            raise ValueError("The image holds no hidden data (unknown "
+                             "codec).")
+
+        if parameters["kind"] == "bytes":
+            pixels = self.count_byte_pixels(src_height,
+                                            parameters["bits_per_sample"],
+                                            image.shape[2],
+                                            parameters["encrypted"])
+            return {"size": src_height,
+                    "crc": src_width,
+                    **parameters,
+                    "pixels": pixels,
+                    "rows": None if parameters["scattered"]
+                    else -(-pixels // dst_width)}
+
+        if src_height == 0 or src_width == 0:
+            raise ValueError("The image holds no hidden data (empty hidden "
+                             "image).")
+        pixels = self.count_pixels(src_width * src_height * self.pixel_size,
+                                   parameters["bits_per_sample"],
+                                   parameters["layout"], image.shape[2],
+                                   parameters["encrypted"])
+        return {"height": src_height,
+                "width": src_width,
+                "depth": self.depth,
+                **parameters,
+                "pixels": pixels,
+                "rows": None if parameters["scattered"]
+                else -(-pixels // dst_width)}
+
+    def check_header(self, header: dict, shape: tuple) -> None:
+        """
+        Checks that an image of the given shape can hold the payload
+        described by its header, before any of the payload is read.
+
+        Args:
+            header (dict): The header from peek_header.
+            shape (tuple): Shape of the encoded image, or of its first
+            rows when the payload is not scattered.
+
+        Raises:
+            ValueError: If the image is too small to hold the payload.
+        """
+        height, width = shape[:2]
+        if header["pixels"] > height * width or \
+                (header["rows"] is not None and height < header["rows"]):
+            raise ValueError("The image is too small to hold the hidden "
+                             + ("image." if header["kind"] == "image"
+                                else "data."))
+
+    def decode_region(self, encoded_image: np.ndarray,
+                      header: dict = None,
+                      out: np.ndarray = None) -> np.ndarray:
+        """
+        Decodes the hidden image reading only the rows that hold it.
+
+        Args:
+            encoded_image (numpy.ndarray): The encoded image, or at least
+            its first header["rows"] rows.
+            header (dict): The header from peek_header. Read from the image
+            when not given.
+            out (numpy.ndarray): Optional preallocated buffer receiving the
+            hidden image.
+
+        Returns:
+            numpy.ndarray: Decoded hidden image as uint8.
+
+        Raises:
+            ValueError: If the header is not valid, or if the image has
+            fewer rows than the header needs.
+        """
+        if header is None:
+            header = self.peek_header(encoded_image)
+        if header["kind"] != "image":
+            raise ValueError("The image holds bytes, use decode_bytes.")
+        self.check_header(header, encoded_image.shape)
+
+        output_image = self.get_hidden_image(
+            embedded_image=encoded_image[:header["rows"]],
+            src_width=header["width"],
+            src_height=header["height"],
+            dst_width=encoded_image.shape[1],
+            bits_per_sample=header["bits_per_sample"],
+            layout=header["layout"],
+            scattered=header["scattered"],
+            out=out,
+            encrypted=header["encrypted"])
+        return output_image
 
     def get_header(self, image: np.ndarray,
                    width: int = 0,
@@ -281,6 +1981,13 @@ class Steganography:
         if channel < 0 or channel >= image.shape[2]:
             raise ValueError("Invalid channel value.")
 
+        if self._use_numpy():
+            rows = self.header_size // image.shape[1] + 1
+            samples = self._get_samples(image[:rows])
+            bits = self._extract_bits(samples[:, channel], 0,
+                                      self.header_size)
+            return int("".join(str(bit) for bit in bits), 2)
+
         dimension = ""
         for position in range(self.header_size):
             row, column = self.get_coordinates_from_position(position, width)
@@ -294,7 +2001,12 @@ class Steganography:
     def get_hidden_image(self, embedded_image: np.ndarray,
                          src_width: int = 0,
                          src_height: int = 0,
-                         dst_width: int = 0) -> np.ndarray:
+                         dst_width: int = 0,
+                         bits_per_sample: int = 1,
+                         layout: str = "planar",
+                         scattered: bool = False,
+                         out: np.ndarray = None,
+                         encrypted: bool = False) -> np.ndarray:
         """
         Retrieves the image channel from the embedded image.
 
@@ -302,36 +2014,89 @@ class Steganography:
             src_width (int): The width of the source image.
             src_height (int): The height of the source image.
             dst_width (int): The width of the destination image.
+            bits_per_sample (int): Number of bits stored in each sample
+            of the destination image.
+            layout (str): Layout of the hidden image, either "planar" or
+            "interleaved".
+            scattered (bool): Whether the payload was scattered with the
+            key of the model, over the whole embedded image.
+            out (numpy.ndarray): Optional preallocated buffer receiving the
+            hidden image.
+            encrypted (bool): Whether the payload was encrypted with the
+            password of the model.
 
         Returns:
-            numpy.ndarray: Image channel extracted from the embedded image.
+            numpy.ndarray: Image channel extracted from the embedded image,
+            as uint8 (uint16 for pixel sizes up to 16 bits).
+
+        Raises:
+            ValueError: If a parameter is invalid, or if the payload is
+            encrypted and the password is missing or wrong.
         """
         if not all(isinstance(param, int) and
                    param > 0 for param in [src_width,
                                            src_height,
                                            dst_width,
+                                           bits_per_sample,
                                            self.depth,
                                            self.header_size,
                                            self.pixel_size]):
             raise ValueError("All parameters must be positive integers.")
 
+        if layout not in LAYOUTS:
+            raise ValueError(f"Unknown layout '{layout}', "
+                             f"expected one of {LAYOUTS}.")
+
         src_resolution = src_width * src_height
         shape = (src_height, src_width, self.depth)
-        image = np.ndarray(shape=shape, dtype=int)
+        channels = embedded_image.shape[2]
+        if scattered:
+            image = self._get_hidden_buffer(shape, out)
+            _, streams = self._get_payload_streams(embedded_image, 0, layout)
+            outputs = targets = self._get_hidden_outputs(image, layout)
+            if encrypted:
+                payload_cipher, tag = self._get_cipher(*streams[0],
+                                                       bits_per_sample,
+                                                       scattered=True)
+                targets = [encryption.DecryptedOutput(payload_cipher,
+                                                      output, index)
+                           for index, output in enumerate(outputs)]
+            for tweak, ((stream, first_sample), target) in enumerate(
+                    zip(streams, targets)):
+                self._extract_scattered(stream, -first_sample, target,
+                                        bits_per_sample, tweak)
+            if encrypted:
+                payload_cipher.verify(outputs, tag)
+            return image
+
+        if self._use_numpy() or encrypted:
+            pixels = self.count_pixels(src_resolution * self.pixel_size,
+                                       bits_per_sample, layout, channels,
+                                       encrypted)
+            rows = -(-pixels // embedded_image.shape[1])
+            return self._extract_payload([embedded_image[:rows]], shape,
+                                         bits_per_sample, layout, out=out,
+                                         encrypted=encrypted)
+
+        image = self._get_hidden_buffer(shape, out)
 
         for channel in range(self.depth):
             for pixel_position in range(src_resolution):
-                pixel_position_dst = pixel_position * self.pixel_size
-                pixel_position_dst += self.header_size
+                jump_size = pixel_position * self.pixel_size
+                if layout == "interleaved":
+                    jump_size = (pixel_position * self.depth + channel) * \
+                        self.pixel_size
                 pixel_value_src = ""
                 for pixel_bit in range(self.pixel_size):
-                    pixel_location = pixel_position_dst + pixel_bit
+                    pixel_location, channel_dst, bit_dst = \
+                        self.locate_bit(jump_size + pixel_bit, channel,
+                                        channels, bits_per_sample, layout)
                     dst_row, dst_column = \
                         self.get_coordinates_from_position(pixel_location,
                                                            dst_width)
                     pixel_value_dst = \
-                        embedded_image[dst_row, dst_column, channel]
-                    last_bit = str(pixel_value_dst % 2)
+                        embedded_image[dst_row, dst_column, channel_dst]
+                    last_bit = str((pixel_value_dst >> bit_dst) % 2)
                     pixel_value_src += last_bit
                 pixel_value_src = int(pixel_value_src, 2)
                 src_row, src_column = \
@@ -341,24 +2106,296 @@ class Steganography:
 
         return image
 
-    def decode(self, encoded_image: np.ndarray):
+    def decode(self, encoded_image: np.ndarray,
+               out: np.ndarray = None):
         """
-        Decodes the hidden image from the encoded image.
+        Decodes the hidden image, or the hidden bytes, from the encoded
+        image.
 
         Args:
             encoded_image (numpy.ndarray): Image with hidden information.
+            out (numpy.ndarray): Optional preallocated buffer receiving the
+            hidden image, e.g. reused across decodes. Ignored for bytes.
 
         Returns:
-            numpy.ndarray: Decoded hidden image.
+            numpy.ndarray or bytes: Decoded hidden image as uint8, or the
+            bytes hidden by encode_bytes.
+        """
+        with self._stage("peek_header"):
+            header = self.peek_header(encoded_image)
+        if header["kind"] == "bytes":
+            return self.decode_bytes(encoded_image, header)
+        with self._stage("decode_region",
+                         header["height"] * header["width"] * self.depth):
+            return self.decode_region(encoded_image, header, out)
+
+    def embed_bytes(self, image: np.ndarray,
+                    data: np.ndarray,
+                    offset: int = 0,
+                    bits_per_sample: int = None,
+                    stats: dict = None,
+                    scattered: bool = False) -> np.ndarray:
         """
-        dst_width = encoded_image.shape[1]
+        Writes arbitrary bytes sequentially over the samples of an image,
+        without header, as the interleaved layout does, block by block.
 
-        src_height = self.get_header(encoded_image, dst_width, channel=0)
+        Args:
+            image (numpy.ndarray): Image used to hide the bytes, modified
+            in place.
+            data (numpy.ndarray): Bytes to be hidden, as a 1-D uint8 array
+            or an encryption.EncryptedStream, encrypted block by block.
+            offset (int): Index of the first sample to be modified, in the
+            flattened image.
+            bits_per_sample (int): Number of bits stored in each sample.
+            Default is the bits per sample of the model.
+            stats (dict): Optional counters of the changed samples, flipped
+            bits and squared error, updated in place.
+            scattered (bool): Whether to scatter the bytes over the samples
+            after offset with the key of the model. Default is False.
 
-        src_width = self.get_header(encoded_image, dst_width, channel=1)
+        Returns:
+            numpy.ndarray: The image, now with hidden information.
 
-        output_image = self.get_hidden_image(embedded_image=encoded_image,
-                                             src_width=src_width,
-                                             src_height=src_height,
-                                             dst_width=dst_width)
-        return output_image
+        Raises:
+            ValueError: If the image is too small to hold the bytes.
+        """
+        bits_per_sample = bits_per_sample or self.bits_per_sample
+        if offset + -(-data.size * 8 // bits_per_sample) > image.size:
+            raise ValueError("The image is too small to hold the "
+                             "hidden data.")
+        samples = image.reshape(-1)
+        if scattered:
+            self._embed_scattered(samples, offset, data, bits_per_sample,
+                                  stats=stats)
+        else:
+            total_samples = -(-data.size * 8 // bits_per_sample)
+            for block in range(0, total_samples, BLOCK_SAMPLES):
+                block_stop = min(block + BLOCK_SAMPLES, total_samples)
+                self._embed_span(samples[offset + block:offset + block_stop],
+                                 block, data, bits_per_sample, stats)
+        if not np.may_share_memory(samples, image):
+            image[...] = samples.reshape(image.shape)
+        return image
+
+    def extract_bytes(self, image: np.ndarray,
+                      size: int,
+                      offset: int = 0,
+                      bits_per_sample: int = None,
+                      scattered: bool = False,
+                      encrypted: bool = False) -> np.ndarray:
+        """
+        Reads bytes written by embed_bytes, block by block.
+
+        Args:
+            image (numpy.ndarray): Image with hidden information.
+            size (int): Number of bytes to be read.
+            offset (int): Index of the first sample to be read, in the
+            flattened image.
+            bits_per_sample (int): Number of bits stored in each sample.
+            Default is the bits per sample of the model.
+            scattered (bool): Whether the bytes were scattered with the key
+            of the model. Default is False.
+            encrypted (bool): Whether the bytes were encrypted with the
+            password of the model, from an encryption.EncryptedStream of
+            size bytes. They are decrypted block by block and their tag is
+            checked. Default is False.
+
+        Returns:
+            numpy.ndarray: The hidden bytes, as a 1-D uint8 array.
+
+        Raises:
+            ValueError: If the image is too small to hold the bytes, or if
+            they are encrypted and the password is missing or wrong.
+        """
+        bits_per_sample = bits_per_sample or self.bits_per_sample
+        stored_size = size + encryption.PREFIX_SIZE if encrypted else size
+        if offset + -(-stored_size * 8 // bits_per_sample) > image.size:
+            raise ValueError("The image is too small to hold the "
+                             "hidden data.")
+        samples = image.reshape(-1)
+        output = target = np.empty(size, dtype=np.uint8)
+        if encrypted:
+            payload_cipher, tag = self._get_cipher(samples, -offset,
+                                                   bits_per_sample,
+                                                   scattered)
+            target = encryption.DecryptedOutput(payload_cipher, output, 0)
+        if scattered:
+            self._extract_scattered(samples, offset, target, bits_per_sample)
+        else:
+            total_samples = -(-stored_size * 8 // bits_per_sample)
+            for block in range(0, total_samples, BLOCK_SAMPLES):
+                # Blocks start on multiples of 8 samples, hence on whole
+                # bytes
+                block_stop = min(block + BLOCK_SAMPLES, total_samples)
+                bits = self._extract_span(
+                    samples[offset + block:offset + block_stop], block,
+                    stored_size * 8, bits_per_sample)
+                byte = block * bits_per_sample // 8
+                target[byte:byte + bits.size // 8] = np.packbits(bits)
+        if encrypted:
+            payload_cipher.verify([output], tag)
+        return output
+
+    def compress(self, data: bytes, codec: str = "none") -> bytes:
+        """
+        Compresses the bytes to be hidden.
+
+        Args:
+            data (bytes): The original bytes.
+            codec (str): Either "none", "zlib" or "lzma".
+
+        Returns:
+            bytes: The compressed bytes.
+
+        Raises:
+            ValueError: If the codec is unknown.
+        """
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec '{codec}', "
+                             f"expected one of {CODECS}.")
+        if codec == "zlib":
+            return zlib.compress(data, 9)
+        if codec == "lzma":
+            return lzma.compress(data)
+        return bytes(data)
+
+    def decompress(self, data: bytes, codec: str = "none") -> bytes:
+        """
+        Decompresses the hidden bytes.
+
+        Args:
+            data (bytes): The compressed bytes.
+            codec (str): Either "none", "zlib" or "lzma".
+
+        Returns:
+            bytes: The original bytes.
+
+        Raises:
+            ValueError: If the bytes cannot be decompressed.
+        """
+        try:
+            if codec == "zlib":
+                return zlib.decompress(data)
+            if codec == "lzma":
+                return lzma.decompress(data)
+        except (zlib.error, lzma.LZMAError) as error:
+            raise ValueError("The hidden data is corrupted (cannot "
+                             f"decompress it: {error}).") from error
+        return data
+
+    def encode_bytes(self, embedded_image: np.ndarray,
+                     data: bytes,
+                     codec: str = "none",
+                     report: bool = False,
+                     inplace: bool = False,
+                     out: np.ndarray = None):
+        """
+        Encodes arbitrary bytes (e.g. a compressed file) into the embedded
+        image, optionally compressing them first. The bytes are written
+        sequentially over all the samples (scattered with the key of the
+        model, if any), after a header holding their length, their CRC-32
+        and the codec. With a password, they are encrypted while they are
+        written and the tag replaces the CRC-32, which is stored as 0. The
+        embedded image is resized as in encode when it is too small.
+
+        Args:
+            embedded_image (numpy.ndarray): Image used to hide the bytes.
+            data (bytes): The bytes to be hidden.
+            codec (str): Either "none", "zlib" or "lzma". Default is "none".
+            report (bool): Whether to also return the report from
+            get_embedding_report. Default is False.
+            inplace (bool): Whether to hide the bytes directly in the
+            embedded image, as in encode. Default is False.
+            out (numpy.ndarray): Optional preallocated buffer receiving the
+            encoded image, as in encode.
+
+        Returns:
+            numpy.ndarray: Encoded image with hidden information, and the
+            report (dict) when requested.
+
+        Raises:
+            ValueError: If the codec is unknown, the header has no room
+            for the parameters word, or out does not match.
+        """
+        if not self.has_parameters(embedded_image):
+            raise ValueError("Bytes payloads require a 32 bits header and "
+                             "an embedded image with 3 channels.")
+        with self._stage("compress", len(data)):
+            stored = np.frombuffer(self.compress(data, codec),
+                                   dtype=np.uint8)
+        channels = embedded_image.shape[2]
+
+        pixels = self.count_byte_pixels(stored.size, self.bits_per_sample,
+                                        channels, self.password is not None)
+        with self._stage("resize_embedded_image", embedded_image.nbytes):
+            if inplace and out is not None:
+                raise ValueError("inplace and out are mutually exclusive.")
+            encoded_image = self._resize_to(
+                embedded_image,
+                self._get_resized_shape(embedded_image, pixels), out)
+            if encoded_image is embedded_image:
+                encoded_image = self._get_output(embedded_image, inplace,
+                                                 out)
+            elif out is not None and encoded_image is not out:
+                raise ValueError("out must have the shape "
+                                 f"{encoded_image.shape} and the data "
+                                 f"type {encoded_image.dtype}.")
+        if pixels > encoded_image.shape[0] * encoded_image.shape[1]:
+            raise ValueError("The embedded image is too small to hold "
+                             "the hidden data.")
+
+        stats = self._get_stats() if report else None
+        words = [stored.size,
+                 zlib.crc32(data) if self.password is None else 0,
+                 self.get_parameters("bytes", codec)]
+        words[2] |= self.get_header_checksum(words)
+        with self._stage("embed_header", self.header_size * channels // 8):
+            self._embed_header_band(encoded_image, 0, words, stats)
+        with self._stage("embed_bytes", stored.size):
+            stored, = self._encrypt_payload([stored])
+            self.embed_bytes(encoded_image, stored,
+                             self.header_size * channels, stats=stats,
+                             scattered=self.key is not None)
+        if report:
+            return encoded_image, self.get_embedding_report(
+                stats, embedded_image.shape, encoded_image)
+        return encoded_image
+
+    def decode_bytes(self, encoded_image: np.ndarray,
+                     header: dict = None) -> bytes:
+        """
+        Decodes the bytes hidden by encode_bytes, reading only the rows
+        that hold them.
+
+        Args:
+            encoded_image (numpy.ndarray): The encoded image, or at least
+            its first header["rows"] rows.
+            header (dict): The header from peek_header. Read from the image
+            when not given.
+
+        Returns:
+            bytes: The original (decompressed) bytes.
+
+        Raises:
+            ValueError: If the image holds no bytes, is too small, if the
+            CRC-32 of the bytes does not match the header, or if the bytes
+            are encrypted and the password is missing or wrong.
+        """
+        if header is None:
+            header = self.peek_header(encoded_image)
+        if header["kind"] != "bytes":
+            raise ValueError("The image holds an image, use decode.")
+        self.check_header(header, encoded_image.shape)
+
+        with self._stage("extract_bytes", header["size"]):
+            stored = self.extract_bytes(
+                encoded_image[:header["rows"]], header["size"],
+                self.header_size * encoded_image.shape[2],
+                header["bits_per_sample"], header["scattered"],
+                header["encrypted"])
+        with self._stage("decompress", header["size"]):
+            data = self.decompress(stored.tobytes(), header["codec"])
+        # The tag already authenticates encrypted bytes
+        if not header["encrypted"] and zlib.crc32(data) != header["crc"]:
+            raise ValueError("The hidden data is corrupted (CRC mismatch).")
+        return data
@@ -4,10 +4,12 @@ Utils.py
 This module provides utility functions for image processing.
 
 """
+import hashlib
 import streamlit as st
 import numpy as np
-from PIL import Image
 import base64
+import image_io
+from steganography import Steganography
 
 
 def load_image(image_object) -> np.ndarray:
@@ -18,12 +20,73 @@ def load_image(image_object) -> np.ndarray:
     - image_object: A file-like object representing the image.
 
     Returns:
-    - An array representation of the loaded image.
+    - An array representation of the loaded image, in BGR order as
+      everywhere else, so it goes through encode and decode unconverted.
 
     """
-    image = Image.open(image_object)
-    image = np.array(image)
-    return image
+    return image_io.read_image(image_object.getvalue())
+
+
+def get_content_hash(image_object) -> str:
+    """
+    Hash the content of an uploaded file.
+
+    Parameters:
+    - image_object: A file-like object with a getvalue method.
+
+    Returns:
+    - A hexadecimal digest identifying the content.
+
+    """
+    return hashlib.blake2b(image_object.getvalue(),
+                           digest_size=16).hexdigest()
+
+
+@st.cache_data
+def read_asset(path: str) -> bytes:
+    """
+    Read a static file (diagram, photo) once per server process.
+
+    Parameters:
+    - path: Path of the file.
+
+    Returns:
+    - The content of the file.
+
+    """
+    with open(path, "rb") as file:
+        return file.read()
+
+
+@st.cache_data
+def encode_logo(path: str) -> str:
+    """
+    Encode a logo once per server process, for inline HTML.
+
+    Parameters:
+    - path: Path of the image.
+
+    Returns:
+    - The image encoded in base64.
+
+    """
+    return base64.b64encode(read_asset(path)).decode()
+
+
+@st.cache_resource
+def get_model(bits_per_sample: int = 1) -> Steganography:
+    """
+    Return a Steganography instance shared by all the sessions.
+
+    Parameters:
+    - bits_per_sample: Number of bits hidden in each sample.
+
+    Returns:
+    - The shared instance.
+
+    """
+    return Steganography(bits_per_sample=bits_per_sample)
+
 
 def get_credentials():
     """
@@ -43,19 +106,19 @@ def get_credentials():
         """<a href="https://www.linkedin.com/in/italo-de-pontes/">
         <img src="data:image/png;base64,{}" width="100">
         </a>""".format(
-            base64.b64encode(open(linkedin_photo, "rb").read()).decode()
+            encode_logo(linkedin_photo)
         ),
         unsafe_allow_html=True,
     )
     st.sidebar.markdown("")
-    st.sidebar.image(personal_photo)
+    st.sidebar.image(read_asset(personal_photo))
     st.sidebar.markdown("Developed by:")
     st.sidebar.markdown("Ítalo de Pontes Oliveira")
     st.sidebar.markdown(
         """<a href="https://github.com/italoPontes/Steganography/">
         <img src="data:image/png;base64,{}" width="100">
         </a>""".format(
-            base64.b64encode(open(github_photo, "rb").read()).decode()
+            encode_logo(github_photo)
         ),
         unsafe_allow_html=True,
     )
@@ -0,0 +1,404 @@
+"""
+Video.py
+
+This module hides a secret (an image or arbitrary bytes) across the frames
+of a lossless video (FFV1 or a PNG sequence). Each frame carries a header
+and the next chunk of the secret. Frames are read, embedded and written by
+a pipeline of threads connected by bounded queues, so only a few frames are
+held in memory regardless of the length of the video.
+
+"""
+import queue
+import struct
+import threading
+import cv2
+import numpy as np
+
+FRAME_MAGIC = b"STGV"
+FRAME_VERSION = 1
+# Magic, version, kind, bits per sample, frame index, chunk size, total
+# size and shape (height, width, depth) of an image secret
+FRAME_HEADER = struct.Struct(">4sBBBxIIQIII")
+FRAME_HEADER_SAMPLES = FRAME_HEADER.size * 8
+KIND_BYTES = 0
+KIND_IMAGE = 1
+DEFAULT_QUEUE_SIZE = 4
+DEFAULT_FPS = 25.0
+LOSSLESS_FOURCC = "FFV1"
+
+
+class FrameWriter:
+    """
+    Writes frames as a lossless FFV1 video or, when the path holds a
+    printf-style pattern (e.g. "frames/%05d.png"), as a PNG sequence.
+    """
+    def __init__(self, path: str, fps: float, size: tuple):
+        """
+        Opens the output video.
+
+        Parameters:
+        - path: Path of the video (.avi or .mkv) or pattern of the frames.
+        - fps: Frames per second of the video.
+        - size: Frame size (width, height).
+
+        Raises:
+        - ValueError: If the video cannot be created.
+        """
+        self.path = path
+        self.index = 0
+        self.video = None
+        if "%" not in path:
+            self.video = cv2.VideoWriter(
+                path, cv2.VideoWriter_fourcc(*LOSSLESS_FOURCC), fps, size)
+            if not self.video.isOpened():
+                raise ValueError(f"Cannot create video '{path}'.")
+
+    def write(self, frame: np.ndarray) -> None:
+        """
+        Appends a frame to the video.
+
+        Parameters:
+        - frame: Frame in BGR order.
+        """
+        if self.video is not None:
+            self.video.write(frame)
+        elif not cv2.imwrite(self.path % self.index, frame):
+            raise ValueError(f"Cannot write frame '{self.path % self.index}'.")
+        self.index += 1
+
+    def release(self) -> None:
+        """
+        Closes the output video.
+        """
+        if self.video is not None:
+            self.video.release()
+
+
+def _open_capture(path: str) -> cv2.VideoCapture:
+    """
+    Opens a video or a PNG sequence for reading.
+
+    Parameters:
+    - path: Path of the video or printf-style pattern of the frames.
+
+    Returns:
+    - The opened capture.
+
+    Raises:
+    - FileNotFoundError: If the video cannot be opened.
+    """
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise FileNotFoundError(f"Cannot open video '{path}'.")
+    return capture
+
+
+def _put(frames: queue.Queue, item, stop: threading.Event) -> bool:
+    """
+    Puts an item into a bounded queue, giving up when the pipeline stops.
+
+    Parameters:
+    - frames: The queue.
+    - item: A frame, or None to mark the end of the video.
+    - stop: Event set when the pipeline stops.
+
+    Returns:
+    - True if the item was queued.
+    """
+    while not stop.is_set():
+        try:
+            frames.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(frames: queue.Queue, stop: threading.Event):
+    """
+    Gets an item from a queue, giving up when the pipeline stops and the
+    queue is empty, as the producer may have stopped before queuing None.
+
+    Parameters:
+    - frames: The queue.
+    - stop: Event set when the pipeline stops.
+
+    Returns:
+    - The next frame, or None at the end of the video or on stop.
+    """
+    while True:
+        try:
+            return frames.get(timeout=0.1)
+        except queue.Empty:
+            if stop.is_set():
+                return None
+
+
+def _read_frames(capture: cv2.VideoCapture, frames: queue.Queue,
+                 stop: threading.Event, errors: list) -> None:
+    """
+    Producer thread: decodes the frames of a video into a queue, followed
+    by None.
+
+    Parameters:
+    - capture: The opened video.
+    - frames: Bounded queue of the decoded frames.
+    - stop: Event set when the pipeline stops.
+    - errors: List collecting the exceptions of the thread.
+    """
+    try:
+        while not stop.is_set():
+            ok, frame = capture.read()
+            if not ok or not _put(frames, frame, stop):
+                break
+    except Exception as error:
+        errors.append(error)
+    finally:
+        capture.release()
+        _put(frames, None, stop)
+
+
+def _write_frames(writer: FrameWriter, frames: queue.Queue,
+                  stop: threading.Event, errors: list) -> None:
+    """
+    Consumer thread: encodes the frames of a queue into a video, until
+    None.
+
+    Parameters:
+    - writer: The output video.
+    - frames: Bounded queue of the frames to be written.
+    - stop: Event set when the pipeline stops.
+    - errors: List collecting the exceptions of the thread.
+    """
+    try:
+        while (frame := frames.get()) is not None:
+            writer.write(frame)
+    except Exception as error:
+        errors.append(error)
+        stop.set()
+    finally:
+        writer.release()
+
+
+def _serialize(secret) -> tuple:
+    """
+    Converts a secret into bytes.
+
+    Parameters:
+    - secret: An image (numpy array) or a bytes-like object.
+
+    Returns:
+    - The bytes as a 1-D uint8 array, the kind of secret and its shape
+      (height, width, depth), with depth 0 for grayscale images.
+    """
+    if isinstance(secret, np.ndarray):
+        shape = secret.shape + (0,) * (3 - secret.ndim)
+        data = np.ascontiguousarray(secret, dtype=np.uint8).reshape(-1)
+        return data, KIND_IMAGE, shape
+    return np.frombuffer(secret, dtype=np.uint8), KIND_BYTES, (0, 0, 0)
+
+
+def _deserialize(data: np.ndarray, header: dict):
+    """
+    Converts the bytes read from a video back into the secret.
+
+    Parameters:
+    - data: The bytes as a 1-D uint8 array.
+    - header: The header of the last frame.
+
+    Returns:
+    - The image or the bytes.
+    """
+    if header["kind"] == KIND_BYTES:
+        return data.tobytes()
+    height, width, depth = header["shape"]
+    return data.reshape((height, width, depth) if depth else (height, width))
+
+
+def get_frame_capacity(model, frame: np.ndarray) -> int:
+    """
+    Calculates how many secret bytes fit in one frame, after its header.
+
+    Parameters:
+    - model: A Steganography instance.
+    - frame: A frame of the video.
+
+    Returns:
+    - The capacity of the frame in bytes.
+    """
+    samples = max(frame.size - FRAME_HEADER_SAMPLES, 0)
+    return samples * model.bits_per_sample // 8
+
+
+def embed_frame(model, frame: np.ndarray, chunk: np.ndarray,
+                header: dict) -> np.ndarray:
+    """
+    Writes the header and a chunk of the secret into a frame. The header
+    uses 1 bit per sample, so that it can be read without knowing the
+    bits per sample of the chunk.
+
+    Parameters:
+    - model: A Steganography instance.
+    - frame: The frame, modified in place.
+    - chunk: The bytes of the secret held by the frame.
+    - header: The "index", "size", "kind" and "shape" of the secret.
+
+    Returns:
+    - The frame, now with hidden information.
+    """
+    words = FRAME_HEADER.pack(FRAME_MAGIC, FRAME_VERSION, header["kind"],
+                              model.bits_per_sample, header["index"],
+                              chunk.size, header["size"], *header["shape"])
+    model.embed_bytes(frame, np.frombuffer(words, dtype=np.uint8),
+                      bits_per_sample=1)
+    return model.embed_bytes(frame, chunk, FRAME_HEADER_SAMPLES)
+
+
+def read_frame_header(model, frame: np.ndarray) -> dict:
+    """
+    Reads the header of a frame.
+
+    Parameters:
+    - model: A Steganography instance.
+    - frame: A frame of the encoded video.
+
+    Returns:
+    - The "index", "chunk" size, total "size", "kind", "bits_per_sample"
+      and "shape" of the secret.
+
+    Raises:
+    - ValueError: If the frame holds no header.
+    """
+    words = model.extract_bytes(frame, FRAME_HEADER.size, bits_per_sample=1)
+    magic, version, kind, bits_per_sample, index, chunk, size, \
+        *shape = FRAME_HEADER.unpack(words.tobytes())
+    if magic != FRAME_MAGIC or version != FRAME_VERSION:
+        raise ValueError("The frame holds no hidden data.")
+    return {"index": index, "chunk": chunk, "size": size, "kind": kind,
+            "bits_per_sample": bits_per_sample, "shape": tuple(shape)}
+
+
+def encode_video(model, input_path: str, output_path: str, secret,
+                 queue_size: int = DEFAULT_QUEUE_SIZE) -> int:
+    """
+    Hides a secret across the frames of a video. Frames are decoded,
+    embedded and encoded concurrently; frames after the secret are copied
+    unchanged.
+
+    Parameters:
+    - model: A Steganography instance.
+    - input_path: Path of the cover video or pattern of its frames.
+    - output_path: Path of the lossless output video (.avi or .mkv) or
+      pattern of its PNG frames.
+    - secret: An image (numpy array) or a bytes-like object.
+    - queue_size: Maximum number of frames waiting between two stages.
+
+    Returns:
+    - The number of frames holding the secret.
+
+    Raises:
+    - ValueError: If the video is too short to hold the secret.
+    """
+    data, kind, shape = _serialize(secret)
+    capture = _open_capture(input_path)
+    fps = capture.get(cv2.CAP_PROP_FPS) or DEFAULT_FPS
+    size = (int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    try:
+        writer = FrameWriter(output_path, fps, size)
+    except ValueError:
+        capture.release()
+        raise
+
+    stop = threading.Event()
+    errors = []
+    decoded = queue.Queue(queue_size)
+    embedded = queue.Queue(queue_size)
+    threads = [threading.Thread(target=_read_frames,
+                                args=(capture, decoded, stop, errors)),
+               threading.Thread(target=_write_frames,
+                                args=(writer, embedded, stop, errors))]
+    for thread in threads:
+        thread.start()
+
+    offset = 0
+    index = 0
+    try:
+        while (frame := _get(decoded, stop)) is not None:
+            if index == 0 or offset < data.size:
+                capacity = get_frame_capacity(model, frame)
+                chunk = data[offset:offset + capacity]
+                embed_frame(model, frame, chunk,
+                            {"index": index, "size": data.size,
+                             "kind": kind, "shape": shape})
+                offset += chunk.size
+                index += 1
+            if not _put(embedded, frame, stop):
+                break
+    finally:
+        _put(embedded, None, stop)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    if errors:
+        raise errors[0]
+    if offset < data.size:
+        raise ValueError("The video is too short to hold the secret.")
+    return index
+
+
+def decode_video(model, path: str,
+                 queue_size: int = DEFAULT_QUEUE_SIZE):
+    """
+    Retrieves a secret hidden by encode_video. Frames after the secret
+    are not decoded.
+
+    Parameters:
+    - model: A Steganography instance.
+    - path: Path of the encoded video or pattern of its frames.
+    - queue_size: Maximum number of decoded frames waiting.
+
+    Returns:
+    - The secret image (numpy array) or bytes.
+
+    Raises:
+    - ValueError: If a frame is missing or the video ends before the
+      secret.
+    """
+    capture = _open_capture(path)
+    stop = threading.Event()
+    errors = []
+    decoded = queue.Queue(queue_size)
+    thread = threading.Thread(target=_read_frames,
+                              args=(capture, decoded, stop, errors))
+    thread.start()
+
+    data = None
+    header = None
+    offset = 0
+    index = 0
+    try:
+        while (frame := _get(decoded, stop)) is not None:
+            header = read_frame_header(model, frame)
+            if header["index"] != index:
+                raise ValueError(f"Expected frame {index}, "
+                                 f"found frame {header['index']}.")
+            if data is None:
+                data = np.empty(header["size"], dtype=np.uint8)
+            data[offset:offset + header["chunk"]] = model.extract_bytes(
+                frame, header["chunk"], FRAME_HEADER_SAMPLES,
+                header["bits_per_sample"])
+            offset += header["chunk"]
+            index += 1
+            if offset >= data.size:
+                break
+    finally:
+        stop.set()
+        thread.join()
+
+    if errors:
+        raise errors[0]
+    if data is None or offset < data.size:
+        raise ValueError("The video ends before the secret.")
+    return _deserialize(data, header)
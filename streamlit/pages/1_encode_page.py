@@ -5,20 +5,71 @@ This module provides a Streamlit web application for demonstrating
 steganography techniques.
 
 """
-import cv2
 import streamlit as st
 import utils
+import image_io
 from steganography import Steganography
+from instrumentation import Profiler, stage
 
 utils.get_credentials()
 
-OUTPUT_FILE_NAME = "data/steganography_image.png"
+OUTPUT_FILE_NAME = "steganography_image.png"
 ENCODE_DIAGRAM_FILE_NAME = "data/Diagrams/encode.png"
 
-model = Steganography()
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def encode_images(secret_hash: str, cover_hash: str, bits_per_sample: int,
+                  png_compression: int,
+                  _secret_image_name, _cover_image_name,
+                  _profiler=None) -> tuple:
+    """
+    Encode the uploaded images into an in-memory PNG. Results are cached
+    by the content hash of both uploads, so reruns of the page (and
+    other sessions uploading the same files) return instantly.
+
+    Parameters:
+    - secret_hash: Content hash of the secret image.
+    - cover_hash: Content hash of the cover image.
+    - bits_per_sample: Number of bits hidden in each sample.
+    - png_compression: PNG zlib level, from 0 (fastest) to 9 (smallest).
+    - _secret_image_name: The uploaded secret image (not hashed).
+    - _cover_image_name: The uploaded cover image (not hashed).
+    - _profiler: Optional Profiler timing a cache miss (not hashed).
+
+    Returns:
+    - The encoded PNG file and the embedding report.
+    """
+    if _profiler is None:
+        model = utils.get_model(bits_per_sample)
+    else:
+        # The shared model has no profiler
+        model = Steganography(bits_per_sample=bits_per_sample,
+                              profiler=_profiler)
+    with stage(_profiler, "load_image"):
+        embedded_image = utils.load_image(_cover_image_name)
+        hidden_image = utils.load_image(_secret_image_name)
+
+    encoded_image, report = model.encode(embedded_image, hidden_image,
+                                         report=True, inplace=True)
+    with stage(_profiler, "imencode", encoded_image.nbytes):
+        data = image_io.image_to_bytes(encoded_image,
+                                       png_compression=png_compression)
+    return data, report
+
 
 st.title("Steganography Demo")
-st.image(ENCODE_DIAGRAM_FILE_NAME)
+st.image(utils.read_asset(ENCODE_DIAGRAM_FILE_NAME))
+
+bits_per_sample = st.select_slider("Bits per sample",
+                                   options=[1, 2, 3, 4],
+                                   value=1)
+
+png_compression = st.select_slider("PNG compression (faster to smaller)",
+                                   options=list(range(10)),
+                                   value=1)
+
+show_profile = st.checkbox("Show stage timings")
+profiler = Profiler() if show_profile else None
 
 secret_image_name = st.file_uploader("Choose the Secret Image",
                                      accept_multiple_files=False)
@@ -28,15 +79,20 @@ cover_image_name = st.file_uploader("Choose the Cover Image",
 
 if (secret_image_name is not None) and (cover_image_name is not None):
     with st.spinner("Running... Please, wait a few seconds."):
-        embedded_image = utils.load_image(cover_image_name)
-        hidden_image = utils.load_image(secret_image_name)
-
-        encoded_image = model.encode(embedded_image, hidden_image)
-        encoded_image = cv2.cvtColor(encoded_image, cv2.COLOR_RGB2BGR)
-        cv2.imwrite(OUTPUT_FILE_NAME, encoded_image)
-
-        with open(OUTPUT_FILE_NAME, "rb") as file:
-            btn = st.download_button(label="Download image",
-                                     data=file,
-                                     file_name=OUTPUT_FILE_NAME,
-                                     mime="image/png")
+        encoded_png, report = encode_images(
+            utils.get_content_hash(secret_image_name),
+            utils.get_content_hash(cover_image_name),
+            bits_per_sample, png_compression, secret_image_name,
+            cover_image_name, profiler)
+        st.metric("PSNR", f"{report['psnr']:.2f} dB")
+
+        if profiler is not None:
+            if profiler.records:
+                st.json(profiler.to_dict())
+            else:
+                st.caption("Cached result, no stage was run.")
+
+        btn = st.download_button(label="Download image",
+                                 data=encoded_png,
+                                 file_name=OUTPUT_FILE_NAME,
+                                 mime="image/png")
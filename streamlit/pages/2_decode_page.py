@@ -8,23 +8,62 @@ decoding steganography images.
 import streamlit as st
 import utils
 from steganography import Steganography
+from instrumentation import Profiler, stage
 
 utils.get_credentials()
 
 DECODE_DIAGRAM_FILE_NAME = "data/Diagrams/decode.png"
 
-model = Steganography()
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def decode_image(encoded_hash: str, _encoded_image_name, _profiler=None):
+    """
+    Decode an uploaded image. Results are cached by the content hash of
+    the upload, so reruns of the page return instantly.
+
+    Parameters:
+    - encoded_hash: Content hash of the encoded image.
+    - _encoded_image_name: The uploaded encoded image (not hashed).
+    - _profiler: Optional Profiler timing a cache miss (not hashed).
+
+    Returns:
+    - The secret image, or the hidden bytes.
+    """
+    if _profiler is None:
+        model = utils.get_model()
+    else:
+        # The shared model has no profiler
+        model = Steganography(profiler=_profiler)
+    with stage(_profiler, "load_image"):
+        encoded_image = utils.load_image(_encoded_image_name)
+    return model.decode(encoded_image)
+
 
 st.title("Steganography Demo")
-st.image(DECODE_DIAGRAM_FILE_NAME)
+st.image(utils.read_asset(DECODE_DIAGRAM_FILE_NAME))
+
+show_profile = st.checkbox("Show stage timings")
+profiler = Profiler() if show_profile else None
 
 encoded_image_name = st.file_uploader("Choose the Steganography Image",
                                       accept_multiple_files=False)
 
 if encoded_image_name is not None:
     with st.spinner("Running... Please, wait a few seconds."):
-        encoded_image = utils.load_image(encoded_image_name)
-        retrieved_image = model.decode(encoded_image)
+        retrieved = decode_image(utils.get_content_hash(encoded_image_name),
+                                 encoded_image_name, profiler)
+
+        if isinstance(retrieved, bytes):
+            st.download_button(label="Download hidden file",
+                               data=retrieved,
+                               file_name="secret.bin",
+                               mime="application/octet-stream")
+        else:
+            st.markdown("Decoded image:")
+            st.image(retrieved, channels="BGR")
 
-        st.markdown("Decoded image:")
-        st.image(retrieved_image)
+        if profiler is not None:
+            if profiler.records:
+                st.json(profiler.to_dict())
+            else:
+                st.caption("Cached result, no stage was run.")
@@ -22,8 +22,8 @@ left_column, right_column = st.columns(2)
 
 with left_column:
     st.page_link("pages/1_encode_page.py", label="Encode Page", icon="1️⃣")
-    st.image(ENCODE_FULL_DIAGRAM_FILE_NAME)
+    st.image(utils.read_asset(ENCODE_FULL_DIAGRAM_FILE_NAME))
 
 with right_column:
     st.page_link("pages/2_decode_page.py", label="Decode Page", icon="2️⃣")
-    st.image(DECODE_FULL_DIAGRAM_FILE_NAME)
+    st.image(utils.read_asset(DECODE_FULL_DIAGRAM_FILE_NAME))
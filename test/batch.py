@@ -0,0 +1,115 @@
+import unittest
+import tempfile
+import cv2
+import numpy as np
+import sys
+import os
+# Add the "src" directory to the Python module search path
+src_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../src'))
+sys.path.insert(0, src_path)
+# Now you can import the batch and steganography modules
+import batch
+from steganography import Steganography
+
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        # Create test images
+        self.directory = tempfile.TemporaryDirectory()
+        self.embedded_image = np.random.randint(0, 256, (100, 100, 3),
+                                                dtype=np.uint8)
+        cv2.imwrite(self.get_path('cover.png'), self.embedded_image)
+        self.hidden_images = []
+        for index in range(3):
+            hidden_image = np.random.randint(0, 256, (20, 20, 3),
+                                             dtype=np.uint8)
+            cv2.imwrite(self.get_path(f'secret{index}.png'), hidden_image)
+            self.hidden_images.append(hidden_image)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def get_path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def test_glob_jobs(self):
+        jobs = batch.glob_jobs('encode', self.get_path('cover.png'),
+                               self.get_path('out'),
+                               self.get_path('secret*.png'))
+        self.assertEqual(len(jobs), 3)
+        self.assertEqual(jobs[1]['cover'], self.get_path('cover.png'))
+        self.assertEqual(jobs[1]['output'],
+                         os.path.join(self.get_path('out'), 'secret1.png'))
+        # Covers and secrets that do not pair up are not dropped silently
+        with self.assertRaises(ValueError):
+            batch.glob_jobs('encode', self.get_path('secret[01].png'),
+                            self.get_path('out'),
+                            self.get_path('secret*.png'))
+
+    def test_run_batch(self):
+        output_dir = self.get_path('out')
+        os.makedirs(output_dir)
+        jobs = batch.glob_jobs('encode', self.get_path('cover.png'),
+                               output_dir, self.get_path('secret*.png'))
+        results = list(batch.run_batch(jobs, 'encode', workers=2))
+        self.assertEqual([result['status'] for result in results],
+                         ['ok'] * 3)
+
+        decoded_dir = self.get_path('decoded')
+        os.makedirs(decoded_dir)
+        jobs = batch.glob_jobs('decode', os.path.join(output_dir, '*.png'),
+                               decoded_dir)
+        jobs.append({'image': self.get_path('missing.png'),
+                     'output': self.get_path('missing-secret.png')})
+        path = self.get_path('results.jsonl')
+        results = batch.write_results(batch.run_batch(jobs, 'decode',
+                                                      workers=2), path)
+        self.assertEqual([result['status'] for result in results],
+                         ['ok'] * 3 + ['error'])
+        self.assertEqual(batch.load_manifest(path), results)
+        for index, hidden_image in enumerate(self.hidden_images):
+            secret_image = cv2.imread(os.path.join(decoded_dir,
+                                                   f'secret{index}.png'))
+            self.assertTrue(np.array_equal(secret_image, hidden_image))
+
+    def test_run_batch_with_cache(self):
+        cache_dir = self.get_path('cache')
+        output_dir = self.get_path('out')
+        os.makedirs(output_dir)
+        jobs = batch.glob_jobs('encode', self.get_path('cover.png'),
+                               output_dir,
+                               self.get_path('secret*.png'))
+        for _ in range(2):
+            results = list(batch.run_batch(jobs, 'encode', workers=2,
+                                           cache_dir=cache_dir))
+            self.assertEqual([result['status'] for result in results],
+                             ['ok'] * 3)
+        # One entry per distinct job, reused by the second batch
+        self.assertEqual(len(os.listdir(cache_dir)), 3)
+
+    def test_run_batch_bytes(self):
+        data = b'secret file ' * 100
+        encoded_image = Steganography().encode_bytes(
+            cv2.imread(self.get_path('cover.png')), data, codec='zlib')
+        cv2.imwrite(self.get_path('encoded.png'), encoded_image)
+        jobs = [{'image': self.get_path('encoded.png'),
+                 'output': self.get_path('secret.bin')}]
+        results = list(batch.run_batch(jobs, 'decode', workers=1))
+        self.assertEqual(results[0]['status'], 'ok')
+        with open(self.get_path('secret.bin'), 'rb') as file:
+            self.assertEqual(file.read(), data)
+        # Outputs named by glob_jobs get the extension of the payload
+        decoded_dir = self.get_path('decoded')
+        os.makedirs(decoded_dir)
+        jobs = batch.glob_jobs('decode', self.get_path('encoded.png'),
+                               decoded_dir)
+        results = list(batch.run_batch(jobs, 'decode', workers=1))
+        self.assertEqual(results[0]['output'],
+                         os.path.join(decoded_dir, 'encoded.bin'))
+        with open(results[0]['output'], 'rb') as file:
+            self.assertEqual(file.read(), data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import unittest
+import tempfile
+import numpy as np
+import sys
+import os
+# Add the "src" directory to the Python module search path
+src_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../src'))
+sys.path.insert(0, src_path)
+# Now you can import the cache and Steganography modules
+from cache import CachedSteganography, ResultCache, get_key
+from steganography import Steganography
+
+
+class TestCache(unittest.TestCase):
+
+    def setUp(self):
+        # Create test images
+        self.directory = tempfile.TemporaryDirectory()
+        self.embedded_image = np.random.randint(0, 256, (100, 100, 3),
+                                                dtype=np.uint8)
+        self.hidden_image = np.random.randint(0, 256, (20, 20, 3),
+                                              dtype=np.uint8)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_get_key(self):
+        options = {'header_size': 32, 'bits_per_sample': 1}
+        key = get_key('encode', (self.embedded_image,), options)
+        self.assertEqual(key, get_key('encode',
+                                      (self.embedded_image.copy(),),
+                                      options))
+        self.assertNotEqual(key, get_key('encode', (self.embedded_image,),
+                                         {**options, 'bits_per_sample': 2}))
+        self.assertNotEqual(key, get_key('decode', (self.embedded_image,),
+                                         options))
+        # Same bytes in another shape
+        self.assertNotEqual(key, get_key('encode',
+                                         (self.embedded_image.reshape(
+                                             50, 200, 3),), options))
+
+    def test_encode_n_decode_hits(self):
+        model = CachedSteganography(Steganography(bits_per_sample=2))
+        encoded_image = model.encode(self.embedded_image, self.hidden_image)
+        again = model.encode(self.embedded_image, self.hidden_image)
+        self.assertTrue(np.array_equal(encoded_image, again))
+        # Callers get copies
+        again[0, 0] = 0
+        self.assertTrue(np.array_equal(
+            model.encode(self.embedded_image, self.hidden_image),
+            encoded_image))
+        secret_image = model.decode(encoded_image)
+        self.assertTrue(np.array_equal(secret_image, self.hidden_image))
+        # Hits honour the buffer options of Steganography.encode
+        cover_image = self.embedded_image.copy()
+        model.encode(cover_image, self.hidden_image, inplace=True)
+        self.assertTrue(np.array_equal(cover_image, encoded_image))
+        stats = model.cache.get_stats()
+        self.assertEqual(stats['memory_hits'], 3)
+        self.assertEqual(stats['misses'], 2)
+        # Options of the wrapped model are part of the key
+        other = CachedSteganography(Steganography(), model.cache)
+        other.encode(self.embedded_image, self.hidden_image)
+        self.assertEqual(model.cache.misses, 3)
+        # A strict model does not reuse the decodes of a legacy one
+        legacy = CachedSteganography(Steganography(legacy_headers=True),
+                                     model.cache)
+        self.assertNotEqual(legacy._get_options(),
+                            CachedSteganography()._get_options())
+
+    def test_memory_lru_eviction(self):
+        image_bytes = self.hidden_image.nbytes
+        cache = ResultCache(max_bytes=2 * image_bytes)
+        for key in ('a', 'b'):
+            cache.put(key, self.hidden_image)
+        cache.get('a')
+        cache.put('c', self.hidden_image)
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('a'))
+        self.assertEqual(cache.get_stats()['evictions'], 1)
+
+    def test_disk_tier(self):
+        directory = self.directory.name
+        model = CachedSteganography(cache=ResultCache(directory=directory))
+        encoded_image, report = model.encode(self.embedded_image,
+                                             self.hidden_image, report=True)
+        model.encode_bytes(self.embedded_image, b'secret')
+        # A new process finds the results on disk
+        cache = ResultCache(max_bytes=0, directory=directory)
+        model = CachedSteganography(cache=cache)
+        cached_image, cached_report = model.encode(self.embedded_image,
+                                                   self.hidden_image,
+                                                   report=True)
+        self.assertTrue(np.array_equal(cached_image, encoded_image))
+        self.assertEqual(cached_report['psnr'], report['psnr'])
+        self.assertEqual(cache.get_stats()['disk_hits'], 1)
+        self.assertEqual(cache.get_stats()['disk_entries'], 1)
+
+        cache.put('data', b'secret')
+        self.assertEqual(cache.get('data'), b'secret')
+        # Entries beyond the bound are removed, oldest first
+        cache.max_disk_bytes = 1
+        cache.put('last', b'last')
+        self.assertEqual(os.listdir(directory), ['last.npz'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import unittest
+import tempfile
+import cv2
+import numpy as np
+import sys
+import os
+# Add the "src" directory to the Python module search path
+src_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../src'))
+sys.path.insert(0, src_path)
+# Now you can import the cover_index and Steganography modules
+from cover_index import CoverIndex, read_shape
+from steganography import Steganography
+
+
+class TestCoverIndex(unittest.TestCase):
+
+    def setUp(self):
+        # Create a library of covers of different sizes and formats
+        self.directory = tempfile.TemporaryDirectory()
+        self.covers = {}
+        for name, size in [('small.png', 40), ('medium.jpg', 80),
+                           ('large.png', 160), ('huge.npy', 320)]:
+            image = np.random.randint(0, 256, (size, size, 3),
+                                      dtype=np.uint8)
+            path = self.get_path(name)
+            if name.endswith('.npy'):
+                np.save(path, image)
+            else:
+                cv2.imwrite(path, image)
+            self.covers[name] = path
+        flat = np.full((160, 200, 3), 128, dtype=np.uint8)
+        cv2.imwrite(self.get_path('flat.png'), flat)
+        self.hidden_image = np.random.randint(0, 256, (40, 40, 3),
+                                              dtype=np.uint8)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def get_path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def test_read_shape(self):
+        self.assertEqual(read_shape(self.covers['medium.jpg']), (80, 80, 3))
+        self.assertEqual(read_shape(self.covers['huge.npy']), (320, 320, 3))
+
+    def test_build_n_select(self):
+        database = self.get_path('covers.db')
+        with CoverIndex(database) as index:
+            self.assertEqual(index.build(self.directory.name), 5)
+            # Unchanged files are not indexed again
+            self.assertEqual(index.build(self.directory.name), 0)
+            self.assertEqual(len(index), 5)
+            # 40x40x8 bits + header need more than 80x80 pixels
+            cover = index.select_cover(self.hidden_image)
+            self.assertEqual(os.path.basename(cover['path']), 'large.png')
+            self.assertEqual(cover['capacity_2'],
+                             (160 * 160 - 32) * 3 * 2)
+            self.assertEqual(os.path.basename(
+                index.select_cover((40, 40, 3), min_texture=1)['path']),
+                'large.png')
+            self.assertIsNone(index.select_cover((400, 400, 3)))
+
+        # The index persists, and removed covers are forgotten
+        os.remove(self.covers['large.png'])
+        model = Steganography(bits_per_sample=2)
+        with CoverIndex(database, model) as index:
+            index.build(self.directory.name)
+            cover = index.select_cover(self.hidden_image)
+            self.assertEqual(os.path.basename(cover['path']), 'flat.png')
+            self.assertEqual(cover['texture'], 0)
+            cover = index.select_cover(self.hidden_image, min_texture=1)
+            self.assertEqual(os.path.basename(cover['path']), 'huge.npy')
+
+            # The selected cover is used without resizing
+            cover_image = cv2.imread(self.get_path('flat.png'))
+            model.check_capacity(cover_image, self.hidden_image)
+            encoded_image = model.encode(cover_image, self.hidden_image)
+            self.assertEqual(encoded_image.shape, cover_image.shape)
+
+    def test_select_skips_narrow_covers(self):
+        # Enough pixels for the secret, but narrower than the header
+        np.save(self.get_path('narrow.npy'),
+                np.zeros((1000, 16, 3), dtype=np.uint8))
+        with CoverIndex() as index:
+            index.build(self.directory.name)
+            cover = index.select_cover(self.hidden_image)
+            self.assertEqual(os.path.basename(cover['path']), 'large.png')
+
+    def test_build_skips_unreadable_files(self):
+        with open(self.get_path('corrupt.jpg'), 'wb') as file:
+            file.write(b'not an image')
+        with CoverIndex() as index:
+            self.assertEqual(index.build(self.directory.name), 5)
+            self.assertEqual(len(index), 5)
+            self.assertEqual([os.path.basename(path)
+                              for path, _ in index.skipped], ['corrupt.jpg'])
+
+
+if __name__ == '__main__':
+    unittest.main()
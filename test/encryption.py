@@ -0,0 +1,69 @@
+import unittest
+import numpy as np
+import sys
+import os
+# Add the "src" directory to the Python module search path
+src_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../src'))
+sys.path.insert(0, src_path)
+# Now you can import the encryption module
+from encryption import (PREFIX_SIZE, DecryptedOutput, EncryptedStream,
+                        PayloadCipher, normalize_password)
+
+
+class TestEncryption(unittest.TestCase):
+
+    def setUp(self):
+        self.cipher = PayloadCipher(b'password')
+        self.data = np.random.randint(0, 256, 40000, dtype=np.uint8)
+
+    def test_keystream(self):
+        keystream = self.cipher.get_keystream(0, 0, 40000)
+        self.assertEqual(keystream.size, 40000)
+        # Any range matches the slice of the whole keystream
+        for start, stop in [(0, 1), (100, 16384), (16383, 16385),
+                            (20000, 40000)]:
+            self.assertTrue(np.array_equal(
+                self.cipher.get_keystream(0, start, stop),
+                keystream[start:stop]))
+        self.assertLess(np.mean(self.cipher.get_keystream(1, 0, 40000) ==
+                                keystream), 0.05)
+        # The same salt and password give the same keys
+        other = PayloadCipher(normalize_password('password'),
+                              self.cipher.salt)
+        self.assertTrue(np.array_equal(other.get_keystream(0, 0, 40000),
+                                       keystream))
+
+    def test_streams(self):
+        tag = self.cipher.get_tag([self.data])
+        stream = EncryptedStream(self.cipher, self.data, 0, tag)
+        self.assertEqual(stream.size, PREFIX_SIZE + self.data.size)
+        whole = stream[0:stream.size]
+        self.assertEqual(whole[:PREFIX_SIZE].tobytes(),
+                         self.cipher.salt + tag)
+        self.assertFalse(np.array_equal(whole[PREFIX_SIZE:], self.data))
+        self.assertTrue(np.array_equal(stream[10:5000], whole[10:5000]))
+        # Written slice by slice, the ciphertext is decrypted
+        output = np.empty_like(self.data)
+        target = DecryptedOutput(self.cipher, output, 0)
+        for start in range(0, target.size, 7000):
+            target[start:start + 7000] = whole[start:start + 7000]
+        self.assertTrue(np.array_equal(output, self.data))
+        self.cipher.verify([output], tag)
+        output[0] ^= 1
+        with self.assertRaises(ValueError):
+            self.cipher.verify([output], tag)
+        with self.assertRaises(ValueError):
+            PayloadCipher(b'wrong', self.cipher.salt).verify([self.data],
+                                                             tag)
+
+    def test_passwords(self):
+        self.assertEqual(normalize_password('pässword'),
+                         'pässword'.encode('utf-8'))
+        with self.assertRaises(ValueError):
+            normalize_password('')
+        with self.assertRaises(TypeError):
+            normalize_password(42)
+
+
+if __name__ == '__main__':
+    unittest.main()
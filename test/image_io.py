@@ -0,0 +1,155 @@
+import unittest
+import tempfile
+import cv2
+import numpy as np
+import sys
+import os
+# Add the "src" directory to the Python module search path
+src_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../src'))
+sys.path.insert(0, src_path)
+# Now you can import the image_io and steganography modules
+import image_io
+from steganography import Steganography
+
+
+class TestImageIO(unittest.TestCase):
+
+    def setUp(self):
+        # Create an instance of the Steganography class
+        self.steganography = Steganography()
+
+        # Create test images
+        self.directory = tempfile.TemporaryDirectory()
+        self.embedded_image = np.random.randint(0, 256,
+                                                (120, 90, 3),
+                                                dtype=np.uint8)
+        self.hidden_image = np.random.randint(0, 256,
+                                              (30, 20, 3),
+                                              dtype=np.uint8)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def get_path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def write_image(self, name, image):
+        path = self.get_path(name)
+        with image_io.BandWriter(path, image.shape) as writer:
+            writer.write(image)
+        return path
+
+    def test_read_write_bands(self):
+        for name in ['cover.ppm', 'cover.npy']:
+            path = self.write_image(name, self.embedded_image)
+            self.assertEqual(image_io.get_image_shape(path), (120, 90, 3))
+            bands = list(image_io.iter_bands(path, band_rows=50))
+            self.assertEqual([band.shape[0] for band in bands], [50, 50, 20])
+            self.assertTrue(np.array_equal(np.concatenate(bands),
+                                           self.embedded_image))
+
+    def test_encode_n_decode_file(self):
+        for name in ['cover.ppm', 'cover.npy']:
+            cover_path = self.write_image(name, self.embedded_image)
+            output_path = self.get_path('encoded' + name[-4:])
+            image_io.encode_file(self.steganography, cover_path,
+                                 self.hidden_image, output_path,
+                                 band_rows=7)
+            # The streaming path matches the in-memory one
+            encoded_image = np.concatenate(list(
+                image_io.iter_bands(output_path)))
+            expected_image = self.steganography.encode(self.embedded_image,
+                                                       self.hidden_image)
+            self.assertTrue(np.array_equal(encoded_image, expected_image))
+            secret_image = image_io.decode_file(self.steganography,
+                                                output_path, band_rows=3)
+            self.assertTrue(np.array_equal(secret_image, self.hidden_image))
+
+    def test_encode_n_decode_mapped_image(self):
+        for name in ['cover.ppm', 'cover.npy', 'cover.raw']:
+            path = self.get_path(name)
+            mapped_image = image_io.create_mapped_image(
+                path, self.embedded_image.shape)
+            mapped_image[...] = self.embedded_image
+            self.steganography.encode_inplace(mapped_image,
+                                              self.hidden_image,
+                                              band_rows=4)
+            del mapped_image
+            mapped_image = image_io.map_image(path,
+                                              shape=self.embedded_image.shape)
+            expected_image = self.steganography.encode(self.embedded_image,
+                                                       self.hidden_image)
+            self.assertTrue(np.array_equal(mapped_image, expected_image))
+            secret_image = self.steganography.decode(mapped_image)
+            self.assertTrue(np.array_equal(secret_image, self.hidden_image))
+
+    def test_read_png_rows_n_decode_png(self):
+        encoded_image = self.steganography.encode(self.embedded_image,
+                                                  self.hidden_image)
+        path = self.get_path('encoded.png')
+        cv2.imwrite(path, encoded_image)
+        self.assertEqual(image_io.get_image_shape(path), (120, 90, 3))
+        rows = image_io.read_png_rows(path, 10)
+        self.assertTrue(np.array_equal(rows, encoded_image[:10]))
+        secret_image = image_io.decode_png(self.steganography, path)
+        self.assertTrue(np.array_equal(secret_image, self.hidden_image))
+        # Bytes payloads are decoded from the first rows as well
+        cv2.imwrite(path, self.steganography.encode_bytes(
+            self.embedded_image, b'secret' * 100, codec='zlib'))
+        self.assertEqual(image_io.decode_png(self.steganography, path),
+                         b'secret' * 100)
+
+    def test_read_n_write_image(self):
+        encoded_image = self.steganography.encode(self.embedded_image,
+                                                  self.hidden_image)
+        settings = [('a.png', {'png_compression': 9, 'png_strategy': 'rle'}),
+                    ('b.webp', {}),
+                    ('c.tiff', {'tiff_compression': 'lzw'}),
+                    ('d.npy', {})]
+        for name, options in settings:
+            path = self.get_path(name)
+            image_io.write_image(path, encoded_image, **options)
+            image = image_io.read_image(path)
+            self.assertTrue(np.array_equal(image, encoded_image))
+            secret_image = self.steganography.decode(image)
+            self.assertTrue(np.array_equal(secret_image, self.hidden_image))
+        # Higher levels give smaller files, unless the image is noise
+        gradient = np.broadcast_to(np.arange(90, dtype=np.uint8)[:, None],
+                                   (120, 90, 3))
+        sizes = [len(image_io.image_to_bytes(gradient,
+                                             png_compression=level))
+                 for level in (0, 9)]
+        self.assertGreater(sizes[0], sizes[1])
+        # In-memory buffers and uploads are read in BGR order too
+        data = image_io.image_to_bytes(encoded_image)
+        with open(self.get_path('a.png'), 'rb') as file:
+            self.assertTrue(np.array_equal(image_io.read_image(file),
+                                           cv2.imread(self.get_path('a.png'))))
+        self.assertTrue(np.array_equal(image_io.read_image(data),
+                                       encoded_image))
+
+        with self.assertRaises(ValueError):
+            image_io.image_to_bytes(encoded_image, png_compression=10)
+        with self.assertRaises(ValueError):
+            image_io.image_to_bytes(encoded_image, '.tiff',
+                                    tiff_compression='jpeg')
+        with self.assertRaises(ValueError):
+            image_io.read_image(b'not an image')
+        with self.assertRaises(FileNotFoundError):
+            image_io.read_image(self.get_path('missing.png'))
+        # An existing file that is not an image
+        with open(self.get_path('text.png'), 'w') as file:
+            file.write('not an image')
+        with self.assertRaises(ValueError):
+            image_io.read_image(self.get_path('text.png'))
+
+    def test_encode_file_too_small(self):
+        cover_path = self.write_image('cover.ppm', self.embedded_image[:10])
+        with self.assertRaises(ValueError):
+            image_io.encode_file(self.steganography, cover_path,
+                                 self.hidden_image,
+                                 self.get_path('encoded.ppm'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+import logging
+import numpy as np
+import sys
+import os
+# Add the "src" directory to the Python module search path
+src_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../src'))
+sys.path.insert(0, src_path)
+# Now you can import the instrumentation and Steganography modules
+from instrumentation import Profiler, stage
+from steganography import Steganography
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def setUp(self):
+        # Create test images
+        self.embedded_image = np.random.randint(0, 256, (100, 100, 3),
+                                                dtype=np.uint8)
+        self.hidden_image = np.random.randint(0, 256, (50, 50, 3),
+                                              dtype=np.uint8)
+
+    def test_encode_n_decode_stages(self):
+        profiler = Profiler()
+        model = Steganography(profiler=profiler)
+        encoded_image = model.encode(self.embedded_image, self.hidden_image)
+        model.decode(encoded_image)
+        stages = profiler.to_dict()
+        self.assertEqual(list(stages), ['resize_embedded_image',
+                                        'embed_header', 'encode_image',
+                                        'peek_header', 'decode_region'])
+        self.assertEqual(stages['encode_image']['bytes'],
+                         self.hidden_image.nbytes)
+        # Resizing to 300x300 allocates the resized cover
+        self.assertGreaterEqual(stages['resize_embedded_image']['peak_bytes'],
+                                300 * 300 * 3)
+
+    def test_nested_stages(self):
+        profiler = Profiler()
+        with profiler.stage('outer'):
+            with profiler.stage('inner', nbytes=10):
+                data = np.ones(10 ** 6, dtype=np.uint8)
+            del data
+        inner, outer = profiler.records
+        self.assertGreaterEqual(inner['peak_bytes'], 10 ** 6)
+        self.assertGreaterEqual(outer['peak_bytes'], inner['peak_bytes'])
+
+    def test_exports(self):
+        records = []
+        profiler = Profiler(trace_memory=False, callback=records.append,
+                            logger=logging.getLogger('steganography'))
+        with stage(profiler, 'imread', 1000):
+            pass
+        with stage(None, 'ignored'):
+            pass
+        self.assertEqual(records, profiler.records)
+        self.assertTrue(profiler.to_log_lines()[0].startswith(
+            'stage=imread seconds='))
+        text = profiler.to_prometheus()
+        self.assertIn('steganography_stage_bytes_total{stage="imread"} 1000',
+                      text)
+        self.assertNotIn('peak_bytes{', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+import tempfile
+import cv2
+import numpy as np
+import sys
+import os
+# Add the "src" directory to the Python module search path
+src_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../src'))
+sys.path.insert(0, src_path)
+# Now you can import the psnr module
+import psnr
+
+
+class TestPSNR(unittest.TestCase):
+
+    def setUp(self):
+        # Create test images differing in their least significant bits
+        self.image_src = np.random.randint(0, 256, (120, 90, 3),
+                                           dtype=np.uint8)
+        self.image_ref = self.image_src ^ np.random.randint(
+            0, 2, self.image_src.shape, dtype=np.uint8)
+
+    def get_reference_mse(self, image_src, image_ref):
+        difference = image_src.astype(np.float64) - image_ref
+        return np.mean(difference ** 2)
+
+    def test_mse_does_not_overflow(self):
+        image_ref = 255 - self.image_src
+        mse = psnr.compute_mean_squared_error(self.image_src, image_ref)
+        self.assertAlmostEqual(mse, self.get_reference_mse(self.image_src,
+                                                           image_ref))
+        self.assertEqual(psnr.compute_mean_squared_error(
+            self.image_src, self.image_src[:10]), float('-inf'))
+
+    def test_psnr(self):
+        mse = self.get_reference_mse(self.image_src, self.image_ref)
+        self.assertAlmostEqual(psnr.compute_psnr(self.image_src,
+                                                 self.image_ref),
+                               10 * np.log10(255 ** 2 / mse))
+        self.assertEqual(psnr.compute_psnr(self.image_src, self.image_src),
+                         float('inf'))
+
+    def test_chunks_n_accumulator(self):
+        expected = psnr.compute_psnr(self.image_src, self.image_ref)
+        # Small chunks and bands give the same result
+        accumulator = psnr.PSNRAccumulator()
+        for row in range(0, 120, 7):
+            accumulator.update(self.image_src[row:row + 7],
+                               self.image_ref[row:row + 7])
+        self.assertAlmostEqual(accumulator.psnr, expected)
+        channel_psnr = psnr.compute_channel_psnr(self.image_src,
+                                                 self.image_ref)
+        for channel in range(3):
+            self.assertAlmostEqual(channel_psnr[channel], psnr.compute_psnr(
+                self.image_src[:, :, channel], self.image_ref[:, :, channel]))
+
+    def test_ssim(self):
+        self.assertAlmostEqual(psnr.compute_ssim(self.image_src,
+                                                 self.image_src), 1.0)
+        ssim = psnr.compute_ssim(self.image_src, self.image_ref)
+        self.assertLess(ssim, 1.0)
+        # Bands overlap by the window radius, so they match a single pass
+        self.assertAlmostEqual(psnr.compute_ssim(self.image_src,
+                                                 self.image_ref,
+                                                 band_rows=16), ssim,
+                               places=5)
+
+    def test_compute_batch(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'stego.png')
+            cv2.imwrite(path, self.image_ref)
+            pairs = [(self.image_src, self.image_ref), (self.image_src, path)]
+            results = psnr.compute_batch(pairs, ('psnr', 'ssim'), workers=2)
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(list(results[0]), ['psnr', 'ssim'])
+        with self.assertRaises(ValueError):
+            psnr.compute_metrics(self.image_src, self.image_ref, ('lpips',))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+import tempfile
+import cv2
+import numpy as np
+import sys
+import os
+# Add the "src" directory to the Python module search path
+src_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../src'))
+sys.path.insert(0, src_path)
+# Now you can import the scan and steganography modules
+import scan
+from steganography import Steganography
+
+
+class TestScan(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cover_image = np.random.randint(0, 256, (80, 90, 3),
+                                             dtype=np.uint8)
+        self.hidden_image = np.random.randint(0, 256, (20, 20, 3),
+                                              dtype=np.uint8)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def get_path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def test_scan(self):
+        model = Steganography()
+        encoded_image = model.encode(self.cover_image, self.hidden_image)
+        cv2.imwrite(self.get_path('image.png'), encoded_image)
+        np.save(self.get_path('bytes.npy'),
+                model.encode_bytes(self.cover_image, b'secret'))
+        cv2.imwrite(self.get_path('cover.png'), self.cover_image)
+        cv2.imwrite(self.get_path('cover.bmp'), self.cover_image)
+        # A flipped header bit breaks the checksum
+        corrupted_image = encoded_image.copy()
+        corrupted_image[0, 20, 0] ^= 1
+        cv2.imwrite(self.get_path('corrupted.png'), corrupted_image)
+        # The payload does not fit in the cropped image
+        cv2.imwrite(self.get_path('cropped.png'), encoded_image[:30])
+        with open(self.get_path('broken.png'), 'wb') as file:
+            file.write(b'not an image')
+        # Arrays that are not images are reported without stopping the scan
+        np.save(self.get_path('gray.npy'), self.cover_image[:, :, 0])
+        np.save(self.get_path('vector.npy'), np.arange(100, dtype=np.uint8))
+        np.save(self.get_path('float.npy'),
+                self.cover_image.astype(np.float32))
+        with open(self.get_path('cover.png'), 'rb') as file:
+            data = file.read()
+        with open(self.get_path('truncated.png'), 'wb') as file:
+            file.write(data[:40])
+        names = ['image.png', 'bytes.npy', 'cover.png', 'cover.bmp',
+                 'corrupted.png', 'cropped.png', 'broken.png', 'gray.npy',
+                 'vector.npy', 'float.npy', 'truncated.png']
+        results = scan.scan([self.get_path(name) for name in names],
+                            workers=2)
+        self.assertEqual([result['status'] for result in results],
+                         ['payload', 'payload', 'none', 'none', 'none',
+                          'none', 'error', 'error', 'error', 'error',
+                          'error'])
+        self.assertEqual([result['kind'] for result in results[:2]],
+                         ['image', 'bytes'])
+        self.assertIn('checksum', results[4]['error'])
+        self.assertIn('too small', results[5]['error'])
+        self.assertEqual(set(results[0]), set(scan.SCAN_FIELDS))
+
+    def test_read_first_row(self):
+        cv2.imwrite(self.get_path('cover.png'), self.cover_image)
+        first_row, shape = scan.read_first_row(self.get_path('cover.png'))
+        self.assertEqual(shape, self.cover_image.shape)
+        self.assertTrue(np.array_equal(first_row, self.cover_image[:1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+import numpy as np
+import sys
+import os
+# Add the "src" directory to the Python module search path
+src_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../src'))
+sys.path.insert(0, src_path)
+# Now you can import the scatter module
+from scatter import FeistelPermutation, get_key_id, normalize_key
+
+
+class TestScatter(unittest.TestCase):
+
+    def test_permutation(self):
+        for size in [1, 2, 7, 1000, 4097]:
+            permutation = FeistelPermutation(b'key', size)
+            positions = permutation.permute(np.arange(size))
+            self.assertEqual(sorted(positions.tolist()), list(range(size)))
+        # Positions are computed for any subset of the indices
+        permutation = FeistelPermutation(b'key', 10 ** 6)
+        indices = np.array([0, 123456, 999999])
+        positions = permutation.permute(np.arange(10 ** 6))
+        self.assertTrue(np.array_equal(permutation.permute(indices),
+                                       positions[indices]))
+        # Consecutive indices are spread over the range
+        self.assertGreater(np.ptp(positions[:100].astype(np.int64)),
+                           10 ** 5)
+
+    def test_keys_n_tweaks(self):
+        indices = np.arange(1000)
+        positions = FeistelPermutation(b'key', 1000).permute(indices)
+        self.assertTrue(np.array_equal(
+            FeistelPermutation(normalize_key('key'), 1000).permute(indices),
+            positions))
+        for other in [FeistelPermutation(b'other', 1000),
+                      FeistelPermutation(b'key', 1000, tweak=1)]:
+            self.assertLess(np.mean(other.permute(indices) == positions),
+                            0.05)
+        self.assertNotEqual(get_key_id(b'key'), get_key_id(b'other'))
+        with self.assertRaises(ValueError):
+            normalize_key('')
+        with self.assertRaises(TypeError):
+            normalize_key(42)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+import unittest
+import asyncio
+import http.client
+import json
+import threading
+import time
+import cv2
+import numpy as np
+import sys
+import os
+# Add the "src" directory to the Python module search path
+src_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../src'))
+sys.path.insert(0, src_path)
+# Now you can import the service module
+import service
+from service import SteganographyService, ServiceBusy
+
+
+def wait_for(options, event):
+    # Worker function blocking until the test releases it
+    event.wait(5)
+    return 'done'
+
+
+def record(options, calls):
+    calls.append(options)
+
+
+class TestService(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        # Create test images
+        self.embedded_image = np.random.randint(0, 256, (100, 100, 3),
+                                                dtype=np.uint8)
+        self.hidden_image = np.random.randint(0, 256, (20, 20, 3),
+                                              dtype=np.uint8)
+
+    async def test_encode_n_decode(self):
+        async with SteganographyService({'bits_per_sample': 2},
+                                        workers=2) as steganography:
+            encoded_images = await asyncio.gather(*[
+                steganography.encode(self.embedded_image, self.hidden_image)
+                for _ in range(4)])
+            secret_image = await steganography.decode(encoded_images[0])
+            self.assertTrue(np.array_equal(secret_image, self.hidden_image))
+            self.assertEqual(steganography.get_status()['completed'], 5)
+
+    async def test_backpressure_n_cancellation(self):
+        event = threading.Event()
+        calls = []
+        async with SteganographyService(workers=1,
+                                        max_pending=2) as steganography:
+            running = asyncio.create_task(steganography.run(wait_for, event))
+            queued = asyncio.create_task(steganography.run(record, calls))
+            await asyncio.sleep(0.1)
+            # Both slots are taken
+            with self.assertRaises(ServiceBusy):
+                await steganography.run(record, calls, wait=False)
+            waiting = asyncio.create_task(steganography.run(record, calls))
+            queued.cancel()
+            await asyncio.sleep(0.1)
+            event.set()
+            self.assertEqual(await running, 'done')
+            await waiting
+            with self.assertRaises(asyncio.CancelledError):
+                await queued
+        # The cancelled request never ran
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(steganography.rejected, 1)
+
+    async def test_exit_does_not_block_the_loop(self):
+        event = threading.Event()
+
+        async def release():
+            await asyncio.sleep(0.1)
+            event.set()
+
+        start = time.monotonic()
+        async with SteganographyService(workers=1) as steganography:
+            running = asyncio.create_task(steganography.run(wait_for, event))
+            await asyncio.sleep(0.1)
+            releasing = asyncio.create_task(release())
+        # The running request is released while the pool shuts down
+        self.assertTrue(releasing.done())
+        self.assertEqual(await running, 'done')
+        self.assertLess(time.monotonic() - start, 2)
+
+    async def test_http_entry_point(self):
+        async with SteganographyService() as steganography:
+            server = await service.serve(steganography, port=0)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                cover_png = cv2.imencode('.png', self.embedded_image)[1]
+                secret_png = cv2.imencode('.png', self.hidden_image)[1]
+                boundary = 'boundary'
+                body = b''
+                for name, data in [('cover', cover_png),
+                                   ('secret', secret_png)]:
+                    body += (f'--{boundary}\r\nContent-Disposition: '
+                             f'form-data; name="{name}"; filename="{name}'
+                             '.png"\r\nContent-Type: image/png\r\n\r\n'
+                             ).encode() + data.tobytes() + b'\r\n'
+                body += f'--{boundary}--\r\n'.encode()
+                content_type = f'multipart/form-data; boundary={boundary}'
+
+                status, encoded_png = await asyncio.to_thread(
+                    self.request, port, '/encode', body, content_type)
+                self.assertEqual(status, 200)
+                status, secret_png = await asyncio.to_thread(
+                    self.request, port, '/decode', encoded_png, 'image/png')
+                self.assertEqual(status, 200)
+                secret_image = cv2.imdecode(np.frombuffer(secret_png,
+                                                          np.uint8),
+                                            cv2.IMREAD_COLOR)
+                self.assertTrue(np.array_equal(secret_image,
+                                               self.hidden_image))
+
+                status, data = await asyncio.to_thread(
+                    self.request, port, '/decode', b'not an image',
+                    'image/png')
+                self.assertEqual(status, 400)
+                status, data = await asyncio.to_thread(
+                    self.request, port, '/health', None, None, 'GET')
+                self.assertEqual(json.loads(data)['completed'], 2)
+
+    def request(self, port, path, body, content_type, method='POST'):
+        connection = http.client.HTTPConnection('127.0.0.1', port,
+                                                timeout=10)
+        headers = {'Content-Type': content_type} if content_type else {}
+        connection.request(method, path, body, headers)
+        response = connection.getresponse()
+        data = response.read()
+        connection.close()
+        return response.status, data
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,12 +1,16 @@
+import math
 import unittest
+from unittest import mock
 import numpy as np
 import sys
 import os
 # Add the "src" directory to the Python module search path
 src_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../src'))
 sys.path.insert(0, src_path)
-# Now you can import the steganography module
+# Now you can import the steganography and backends modules
 from steganography import Steganography
+import backends
+from psnr import compute_psnr
 
 
 class TestSteganography(unittest.TestCase):
@@ -55,6 +59,26 @@ class TestSteganography(unittest.TestCase):
                                                      self.hidden_image)
         self.assertEqual(resized_image.shape[:2], (300, 300))
 
+    def test_resize_embedded_image_capacity(self):
+        model = Steganography(resize_mode="capacity")
+        resized_image = model.resize_embedded_image(self.embedded_image,
+                                                    self.hidden_image)
+        self.assertEqual(resized_image.shape[:2], (142, 142))
+        report = model.get_capacity_report(resized_image, self.hidden_image)
+        self.assertEqual(report["capacity_bits"], 142 * 142 * 3)
+        self.assertEqual(report["required_bits"], (50 * 50 * 8 + 32) * 3)
+        self.assertLessEqual(report["utilization"], 1)
+        encoded_image = model.encode(self.embedded_image, self.hidden_image)
+        secret_image = model.decode(encoded_image)
+        self.assertTrue(np.array_equal(self.hidden_image, secret_image))
+
+    def test_resize_embedded_image_capacity_fits(self):
+        model = Steganography(resize_mode="capacity")
+        hidden_image = self.hidden_image[:10, :10]
+        resized_image = model.resize_embedded_image(self.embedded_image,
+                                                    hidden_image)
+        self.assertIs(resized_image, self.embedded_image)
+
     def test_embed_header(self):
         steganography_image = \
             self.steganography.embed_header(self.embedded_image,
@@ -71,6 +95,21 @@ class TestSteganography(unittest.TestCase):
         secret_image = self.steganography.decode(encoded_image)
         self.assertTrue(np.array_equal(self.hidden_image, secret_image))
 
+    def test_peek_header_n_decode_region(self):
+        model = Steganography(bits_per_sample=2)
+        embedded_image = np.random.randint(0, 256, (400, 100, 3),
+                                           dtype=np.uint8)
+        encoded_image = model.encode(embedded_image, self.hidden_image)
+        header = model.peek_header(encoded_image[:1])
+        self.assertEqual((header["height"], header["width"]), (50, 50))
+        self.assertEqual(header["bits_per_sample"], 2)
+        self.assertEqual(header["rows"], math.ceil((50 * 50 * 4 + 32) / 100))
+        secret_image = model.decode_region(encoded_image[:header["rows"]],
+                                           header)
+        self.assertTrue(np.array_equal(self.hidden_image, secret_image))
+        with self.assertRaises(ValueError):
+            model.decode_region(encoded_image[:header["rows"] - 1])
+
     def test_get_hidden_image(self):
         encoded_image = \
             self.steganography.encode(self.embedded_image,
@@ -79,6 +118,402 @@ class TestSteganography(unittest.TestCase):
                                                            50, 50, 300)
         self.assertTrue(np.array_equal(self.hidden_image, hidden_image))
 
+    def test_buffer_policy(self):
+        for engine in ('numpy', 'loop'):
+            model = Steganography(engine=engine, bits_per_sample=2)
+            embedded_image = np.random.randint(0, 256, (120, 120, 3),
+                                               dtype=np.uint8)
+            original_image = embedded_image.copy()
+            encoded_image = model.encode(embedded_image, self.hidden_image)
+            self.assertTrue(np.array_equal(embedded_image, original_image))
+            # The header alone is written into a copy by default
+            header_image = model.embed_header(embedded_image,
+                                              self.hidden_image)
+            self.assertTrue(np.array_equal(embedded_image, original_image))
+            self.assertFalse(np.array_equal(header_image, original_image))
+
+            out = np.empty_like(embedded_image)
+            self.assertIs(model.encode(embedded_image, self.hidden_image,
+                                       out=out), out)
+            self.assertTrue(np.array_equal(out, encoded_image))
+            result, report = model.encode(embedded_image, self.hidden_image,
+                                          report=True, inplace=True)
+            self.assertIs(result, embedded_image)
+            self.assertTrue(np.array_equal(embedded_image, encoded_image))
+            self.assertGreater(report['changed_samples'], 0)
+
+            secret_image = model.decode(encoded_image)
+            self.assertEqual(secret_image.dtype, np.uint8)
+            out = np.empty_like(self.hidden_image)
+            self.assertIs(model.decode(encoded_image, out=out), out)
+            self.assertTrue(np.array_equal(out, self.hidden_image))
+        with self.assertRaises(ValueError):
+            model.decode(encoded_image, out=np.empty((50, 50, 3)))
+        with self.assertRaises(ValueError):
+            model.encode(embedded_image, self.hidden_image,
+                         out=np.empty_like(embedded_image), inplace=True)
+        # A resized cover is a new image, written into out when it fits
+        small_image = np.random.randint(0, 256, (60, 60, 3), dtype=np.uint8)
+        resized_image = model.encode(small_image, self.hidden_image)
+        out = np.empty_like(resized_image)
+        self.assertIs(model.encode(small_image, self.hidden_image,
+                                   inplace=False, out=out), out)
+        self.assertTrue(np.array_equal(out, resized_image))
+        with self.assertRaises(ValueError):
+            model.encode(small_image, self.hidden_image,
+                         out=np.empty_like(small_image))
+
+    def test_numpy_engine_matches_loop(self):
+        loop_model = Steganography(engine="loop")
+        numpy_model = Steganography(engine="numpy")
+        embedded_image = np.random.randint(0, 256, (90, 110, 3),
+                                           dtype=np.uint8)
+        loop_image = loop_model.encode(embedded_image, self.hidden_image)
+        numpy_image = numpy_model.encode(embedded_image, self.hidden_image)
+        self.assertTrue(np.array_equal(loop_image, numpy_image))
+        self.assertTrue(np.array_equal(loop_model.decode(loop_image),
+                                       numpy_model.decode(numpy_image)))
+
+    def test_backends_match_loop(self):
+        embedded_image = np.random.randint(0, 256, (60, 70, 3),
+                                           dtype=np.uint8)
+        hidden_image = self.hidden_image[:20, :30]
+        for layout, bits_per_sample in [('planar', 1), ('interleaved', 3)]:
+            loop_model = Steganography(engine='loop', layout=layout,
+                                       bits_per_sample=bits_per_sample)
+            loop_image = loop_model.encode(embedded_image, hidden_image)
+            for engine in backends.get_backends():
+                model = Steganography(engine=engine, layout=layout,
+                                      bits_per_sample=bits_per_sample)
+                encoded_image = model.encode(embedded_image, hidden_image)
+                self.assertTrue(np.array_equal(loop_image, encoded_image))
+                self.assertTrue(np.array_equal(model.decode(loop_image),
+                                               hidden_image))
+
+    def test_engine_selection(self):
+        fastest = backends.get_backends()[0]
+        variable = os.environ.pop(backends.ENGINE_VARIABLE, None)
+        try:
+            self.assertEqual(Steganography().engine, fastest)
+            os.environ[backends.ENGINE_VARIABLE] = 'loop'
+            self.assertEqual(Steganography().engine, 'loop')
+            # An explicit engine wins over the variable
+            self.assertEqual(Steganography(engine='numpy').engine, 'numpy')
+            os.environ[backends.ENGINE_VARIABLE] = 'gpu'
+            with self.assertRaises(ValueError):
+                Steganography()
+        finally:
+            os.environ.pop(backends.ENGINE_VARIABLE, None)
+            if variable is not None:
+                os.environ[backends.ENGINE_VARIABLE] = variable
+
+    def test_parallel_matches_serial(self):
+        embedded_image = np.random.randint(0, 256, (100, 130, 3),
+                                           dtype=np.uint8)
+        hidden_image = self.hidden_image[:40, :45]
+        # Split payloads of a few thousand samples between the threads
+        with mock.patch('steganography.PARALLEL_MIN_SAMPLES', 500):
+            for layout, bits_per_sample in [('planar', 1), ('planar', 3),
+                                            ('interleaved', 2)]:
+                options = {'layout': layout,
+                           'bits_per_sample': bits_per_sample}
+                serial_model = Steganography(**options)
+                parallel_model = Steganography(workers=4, **options)
+                self.assertGreater(len(parallel_model._get_chunks(
+                    0, 40 * 45 * 8 // bits_per_sample)), 1)
+                serial_image, serial_report = serial_model.encode(
+                    embedded_image, hidden_image, report=True)
+                parallel_image, parallel_report = parallel_model.encode(
+                    embedded_image, hidden_image, report=True)
+                self.assertTrue(np.array_equal(serial_image,
+                                               parallel_image))
+                self.assertEqual(serial_report, parallel_report)
+                self.assertTrue(np.array_equal(
+                    parallel_model.decode(serial_image), hidden_image))
+                # Bands are split too, unless they start inside a byte
+                bands = [serial_image[row:row + 30]
+                         for row in range(0, 100, 30)]
+                self.assertTrue(np.array_equal(
+                    parallel_model.decode_stream(bands), hidden_image))
+        with self.assertRaises(ValueError):
+            Steganography(workers=0)
+
+    def test_scattered_payload(self):
+        embedded_image = np.random.randint(0, 256, (100, 130, 3),
+                                           dtype=np.uint8)
+        hidden_image = self.hidden_image[:30, :30]
+        for layout, bits_per_sample in [('planar', 1), ('interleaved', 3)]:
+            options = {'layout': layout, 'bits_per_sample': bits_per_sample}
+            model = Steganography(key='password', **options)
+            encoded_image = model.encode(embedded_image, hidden_image)
+            header = model.peek_header(encoded_image)
+            self.assertTrue(header['scattered'])
+            self.assertIsNone(header['rows'])
+            self.assertTrue(np.array_equal(model.decode(encoded_image),
+                                           hidden_image))
+            # The changes reach the last rows, unlike sequential placement
+            sequential_image = Steganography(**options).encode(
+                embedded_image, hidden_image)
+            self.assertTrue(np.array_equal(sequential_image[70:],
+                                           embedded_image[70:]))
+            self.assertFalse(np.array_equal(encoded_image[70:],
+                                            embedded_image[70:]))
+            # Same result with the loop engine and with threads
+            loop_model = Steganography(engine='loop', key='password',
+                                       **options)
+            self.assertTrue(np.array_equal(
+                loop_model.encode(embedded_image, hidden_image),
+                encoded_image))
+            with mock.patch('steganography.PARALLEL_MIN_SAMPLES', 500), \
+                    mock.patch('steganography.SCATTER_BLOCK_SAMPLES', 1000):
+                parallel_model = Steganography(key='password', workers=3,
+                                               **options)
+                self.assertTrue(np.array_equal(
+                    parallel_model.encode(embedded_image, hidden_image),
+                    encoded_image))
+                self.assertTrue(np.array_equal(
+                    parallel_model.decode(encoded_image), hidden_image))
+            # Decoding needs the key
+            with self.assertRaises(ValueError):
+                Steganography().decode(encoded_image)
+            self.assertFalse(np.array_equal(
+                Steganography(key='wrong').decode(encoded_image),
+                hidden_image))
+            with self.assertRaises(ValueError):
+                model.decode_stream([encoded_image[:50], encoded_image[50:]])
+        encoded_image = model.encode_bytes(embedded_image, b'secret' * 100,
+                                           codec='zlib')
+        self.assertEqual(model.decode(encoded_image), b'secret' * 100)
+        with self.assertRaises(ValueError):
+            Steganography(key='password', header_size=16)
+
+    def test_encrypted_payload(self):
+        embedded_image = np.random.randint(0, 256, (100, 130, 3),
+                                           dtype=np.uint8)
+        hidden_image = self.hidden_image[:30, :30]
+        for options in [{}, {'layout': 'interleaved', 'bits_per_sample': 3},
+                        {'key': 'key'}, {'engine': 'loop'}]:
+            model = Steganography(password='password', **options)
+            encoded_image = model.encode(embedded_image, hidden_image)
+            self.assertTrue(model.peek_header(encoded_image)['encrypted'])
+            self.assertTrue(np.array_equal(model.decode(encoded_image),
+                                           hidden_image))
+            # Decoding needs the password, and detects a wrong one
+            with self.assertRaises(ValueError):
+                Steganography(**options).decode(encoded_image)
+            with self.assertRaises(ValueError):
+                Steganography(password='wrong', **options).decode(
+                    encoded_image)
+            if 'key' in options:
+                continue
+            # Bands of one row, small blocks and threads give the same
+            # result
+            self.assertTrue(np.array_equal(
+                model.decode_stream(encoded_image[row:row + 1]
+                                    for row in range(100)),
+                hidden_image))
+            with mock.patch('steganography.PARALLEL_MIN_SAMPLES', 500), \
+                    mock.patch('steganography.BLOCK_SAMPLES', 64):
+                parallel_model = Steganography(password='password',
+                                               workers=3, **options)
+                self.assertTrue(np.array_equal(
+                    parallel_model.decode(encoded_image), hidden_image))
+                self.assertTrue(np.array_equal(
+                    parallel_model.decode(parallel_model.encode(
+                        embedded_image, hidden_image)), hidden_image))
+        data = b'secret' * 100
+        for model in [Steganography(password='password'),
+                      Steganography(password='password', key='key')]:
+            encoded_image = model.encode_bytes(embedded_image, data)
+            header = model.peek_header(encoded_image)
+            self.assertEqual(header['crc'], 0)
+            self.assertEqual(model.decode(encoded_image), data)
+            # The salt and the tag precede the ciphertext
+            offset = model.header_size * 3
+            stored = model.extract_bytes(encoded_image, header['size'] + 32,
+                                         offset, scattered=header['scattered'])
+            self.assertNotEqual(stored[32:].tobytes(), data)
+            with self.assertRaises(ValueError):
+                Steganography(password='wrong', key=model.key).decode(
+                    encoded_image)
+        with self.assertRaises(ValueError):
+            Steganography(password='password', pixel_size=16)
+
+    def test_bits_per_sample(self):
+        embedded_image = np.random.randint(0, 256, (60, 70, 3),
+                                           dtype=np.uint8)
+        hidden_image = self.hidden_image[:20, :30]
+        for bits_per_sample in range(1, 5):
+            loop_model = Steganography(engine="loop",
+                                       bits_per_sample=bits_per_sample)
+            numpy_model = Steganography(engine="numpy",
+                                        bits_per_sample=bits_per_sample)
+            loop_image = loop_model.encode(embedded_image, hidden_image)
+            numpy_image = numpy_model.encode(embedded_image, hidden_image)
+            self.assertTrue(np.array_equal(loop_image, numpy_image))
+            # Decoding reads bits_per_sample from the header
+            for model in [Steganography(engine="loop"), Steganography()]:
+                secret_image = model.decode(numpy_image)
+                self.assertTrue(np.array_equal(hidden_image, secret_image))
+
+    def test_interleaved_layout(self):
+        embedded_image = np.random.randint(0, 256, (40, 50, 3),
+                                           dtype=np.uint8)
+        hidden_image = self.hidden_image[:20, :30]
+        for bits_per_sample in [1, 3]:
+            loop_model = Steganography(engine="loop", layout="interleaved",
+                                       bits_per_sample=bits_per_sample)
+            numpy_model = Steganography(engine="numpy", layout="interleaved",
+                                        bits_per_sample=bits_per_sample)
+            loop_image = loop_model.encode(embedded_image, hidden_image)
+            numpy_image = numpy_model.encode(embedded_image, hidden_image)
+            self.assertTrue(np.array_equal(loop_image, numpy_image))
+            for model in [Steganography(engine="loop"), Steganography()]:
+                secret_image = model.decode(numpy_image)
+                self.assertTrue(np.array_equal(hidden_image, secret_image))
+
+    def test_interleaved_layout_capacity(self):
+        # A single channel secret spreads over the three cover channels
+        hidden_image = self.hidden_image[:, :, :1]
+        planar_model = Steganography(depth=1)
+        interleaved_model = Steganography(depth=1, layout="interleaved")
+        self.assertEqual(planar_model.get_required_pixels(hidden_image),
+                         50 * 50 * 8 + 32)
+        self.assertEqual(interleaved_model.get_required_pixels(hidden_image),
+                         math.ceil(50 * 50 * 8 / 3) + 32)
+        encoded_image = interleaved_model.encode(self.embedded_image,
+                                                 hidden_image)
+        self.assertEqual(encoded_image.shape[:2], (100, 100))
+        secret_image = interleaved_model.decode(encoded_image)
+        self.assertTrue(np.array_equal(hidden_image, secret_image))
+
+    def test_parameters_word(self):
+        model = Steganography(bits_per_sample=3)
+        parameters = model.read_parameters(model.get_parameters())
+        self.assertEqual(parameters["bits_per_sample"], 3)
+        parameters = model.read_parameters(0)
+        self.assertEqual(parameters, {"version": 0, "bits_per_sample": 1,
+                                      "layout": "planar", "kind": "image",
+                                      "codec": "none", "scattered": False,
+                                      "encrypted": False})
+        parameters = model.read_parameters(model.get_parameters("bytes",
+                                                                "lzma"))
+        self.assertEqual((parameters["kind"], parameters["codec"]),
+                         ("bytes", "lzma"))
+        with self.assertRaises(ValueError):
+            Steganography(bits_per_sample=5)
+
+    def test_header_checksum(self):
+        model = Steganography()
+        encoded_image = model.encode(self.embedded_image,
+                                     self.hidden_image[:20, :20])
+        header = model.peek_header(encoded_image[:1])
+        self.assertEqual(header["version"], 6)
+        self.assertEqual(header["pixels"], 20 * 20 * 8 + 32)
+        # Flipped header bits are detected before the payload is read,
+        # unless they clear the magic value (legacy headers have none)
+        for position, channel in [(0, 0), (31, 0), (5, 1), (31, 1),
+                                  (20, 2), (31, 2)]:
+            corrupted_image = encoded_image.copy()
+            corrupted_image[0, position, channel] ^= 1
+            with self.assertRaises(ValueError):
+                model.decode(corrupted_image)
+        # The header does not fit in a cropped image
+        with self.assertRaises(ValueError):
+            model.decode(encoded_image[:10])
+        with self.assertRaises(ValueError):
+            model.check_header(header, (10, 100))
+        # Images without payload are rejected before any buffer is
+        # allocated, by the whole-image and the streaming paths
+        cover_image = np.random.randint(0, 256, (100, 100, 3),
+                                        dtype=np.uint8)
+        for image in [cover_image, np.zeros((100, 100, 3), dtype=np.uint8)]:
+            with self.assertRaises(ValueError):
+                model.decode(image)
+            with self.assertRaises(ValueError):
+                model.decode_stream([image[:50], image[50:]])
+        with self.assertRaises(ValueError):
+            model.decode_stream([encoded_image[:10]], shape=(10, 100, 3))
+        # Headers without magic value are only read on request
+        legacy_image = encoded_image.copy()
+        legacy_image[0, :32, 2] &= 0xFE
+        with self.assertRaises(ValueError):
+            model.decode(legacy_image)
+        self.assertTrue(np.array_equal(
+            Steganography(legacy_headers=True).decode(legacy_image),
+            self.hidden_image[:20, :20]))
+        # Unknown codecs are reported, and rejected by peek_header
+        parameters = model.read_parameters((0xA53 << 20) | (3 << 16) |
+                                           (3 << 10))
+        self.assertIsNone(parameters["codec"])
+
+    def test_encode_n_decode_bytes(self):
+        data = b"steganography " * 500
+        for codec in ["none", "zlib", "lzma"]:
+            model = Steganography(bits_per_sample=2)
+            encoded_image = model.encode_bytes(self.embedded_image, data,
+                                               codec)
+            self.assertEqual(encoded_image.shape, self.embedded_image.shape)
+            header = Steganography().peek_header(encoded_image)
+            self.assertEqual((header["kind"], header["codec"]),
+                             ("bytes", codec))
+            self.assertEqual(Steganography().decode(encoded_image), data)
+        # Compression shrinks the rows holding the payload
+        self.assertLess(header["rows"], math.ceil(len(data) * 4 / 300))
+        with self.assertRaises(ValueError):
+            model.decode_region(encoded_image)
+
+    def test_encode_bytes_resize_n_crc(self):
+        model = Steganography(resize_mode="capacity")
+        data = os.urandom(5000)
+        encoded_image = model.encode_bytes(self.embedded_image, data)
+        self.assertGreater(encoded_image.shape[0] * encoded_image.shape[1],
+                           math.ceil(5000 * 8 / 3) + 32)
+        # Flip one payload bit
+        encoded_image[0, 40, 0] ^= 1
+        with self.assertRaises(ValueError):
+            model.decode_bytes(encoded_image)
+        # Corrupted compressed bytes fail to decompress before the CRC
+        for codec in ["zlib", "lzma"]:
+            encoded_image = model.encode_bytes(self.embedded_image,
+                                               b"steganography" * 100, codec)
+            encoded_image[0, 32:40, :] ^= 1
+            with self.assertRaisesRegex(ValueError, "corrupted"):
+                model.decode_bytes(encoded_image)
+
+    def test_embedding_report(self):
+        embedded_image = np.random.randint(0, 256, (90, 110, 3),
+                                           dtype=np.uint8)
+        for engine in ["loop", "numpy"]:
+            for bits_per_sample in [1, 3]:
+                model = Steganography(engine=engine,
+                                      bits_per_sample=bits_per_sample)
+                encoded_image, report = model.encode(embedded_image,
+                                                     self.hidden_image,
+                                                     report=True)
+                resized_image = model.resize_embedded_image(
+                    embedded_image, self.hidden_image)
+                difference = encoded_image.astype(int) - resized_image
+                self.assertEqual(report["changed_samples"],
+                                 np.count_nonzero(difference))
+                self.assertEqual(report["squared_error"],
+                                 np.sum(difference ** 2))
+                self.assertAlmostEqual(report["psnr"],
+                                       compute_psnr(resized_image,
+                                                    encoded_image))
+                self.assertEqual(report["resize"]["cover_shape"],
+                                 (90, 110, 3))
+                self.assertEqual(report["resize"]["resized"],
+                                 bits_per_sample == 1)
+        _, report = model.encode_bytes(self.embedded_image, b"\xff" * 100,
+                                       report=True)
+        self.assertFalse(report["resize"]["resized"])
+        self.assertLessEqual(report["flipped_bits"], 100 * 8 + 96)
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            Steganography(engine="gpu")
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,115 @@
+import unittest
+import tempfile
+import threading
+import time
+from unittest import mock
+import cv2
+import numpy as np
+import sys
+import os
+# Add the "src" directory to the Python module search path
+src_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../src'))
+sys.path.insert(0, src_path)
+# Now you can import the video and Steganography modules
+import video
+from steganography import Steganography
+
+
+class TestVideo(unittest.TestCase):
+
+    def setUp(self):
+        # Create a short PNG sequence as the cover video
+        self.directory = tempfile.TemporaryDirectory()
+        self.frames = [np.random.randint(0, 256, (48, 64, 3), dtype=np.uint8)
+                       for _ in range(6)]
+        self.cover_path = self.get_path('cover%03d.png')
+        for index, frame in enumerate(self.frames):
+            cv2.imwrite(self.cover_path % index, frame)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def get_path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def test_embed_bytes(self):
+        model = Steganography(bits_per_sample=3)
+        image = self.frames[0].copy()
+        data = np.random.randint(0, 256, 1000, dtype=np.uint8)
+        model.embed_bytes(image, data, offset=7)
+        np.testing.assert_array_equal(image.reshape(-1)[:7],
+                                      self.frames[0].reshape(-1)[:7])
+        np.testing.assert_array_equal(model.extract_bytes(image, 1000, 7),
+                                      data)
+        with self.assertRaises(ValueError):
+            model.embed_bytes(image, np.zeros(image.size, dtype=np.uint8))
+
+    def test_encode_decode_image(self):
+        model = Steganography(bits_per_sample=2)
+        secret = np.random.randint(0, 256, (40, 50, 3), dtype=np.uint8)
+        output_path = self.get_path('encoded.avi')
+        frames = video.encode_video(model, self.cover_path, output_path,
+                                    secret, queue_size=2)
+        # 6000 bytes at 2 bits per sample need 3 frames of 2232 bytes
+        self.assertEqual(frames, 3)
+        decoded = video.decode_video(Steganography(), output_path)
+        np.testing.assert_array_equal(decoded, secret)
+
+    def test_encode_decode_bytes(self):
+        model = Steganography()
+        secret = os.urandom(2000)
+        output_path = self.get_path('encoded%03d.png')
+        video.encode_video(model, self.cover_path, output_path, secret)
+        self.assertTrue(os.path.exists(output_path % 5))
+        self.assertEqual(video.decode_video(model, output_path), secret)
+
+    def test_writer_failure(self):
+        # The writer stops the pipeline, and its error is raised instead
+        # of the encoder waiting for frames forever
+        errors = []
+        open_capture = video._open_capture
+
+        class SlowCapture:
+            # Slow reads keep the encoder waiting for decoded frames
+            def __init__(self, path):
+                self.capture = open_capture(path)
+
+            def __getattr__(self, name):
+                return getattr(self.capture, name)
+
+            def read(self):
+                time.sleep(0.05)
+                return self.capture.read()
+
+        def encode():
+            try:
+                video.encode_video(Steganography(), self.cover_path,
+                                   self.get_path('missing/%03d.png'),
+                                   b'x' * 100, queue_size=1)
+            except Exception as error:
+                errors.append(error)
+
+        with mock.patch('video._open_capture', SlowCapture):
+            for _ in range(5):
+                thread = threading.Thread(target=encode, daemon=True)
+                thread.start()
+                thread.join(timeout=10)
+                self.assertFalse(thread.is_alive())
+        self.assertEqual(len(errors), 5)
+        self.assertTrue(all(isinstance(error, ValueError)
+                            for error in errors))
+
+    def test_video_too_short(self):
+        model = Steganography()
+        with self.assertRaises(ValueError):
+            video.encode_video(model, self.cover_path,
+                               self.get_path('encoded.avi'),
+                               bytes(10 ** 5))
+
+    def test_frame_without_header(self):
+        with self.assertRaises(ValueError):
+            video.decode_video(Steganography(), self.cover_path)
+
+
+if __name__ == '__main__':
+    unittest.main()